@@ -0,0 +1,222 @@
+"""Latency and throughput of the ipc transports between a producer and a consumer process
+
+Run from the repository root:
+
+    python -m benchmarks.transport --output bench.json
+
+For every transport and message size, a ping-pong exchange measures one-way latency (the consumer's receive time
+minus the message's send time) and round-trip latency (measured by the producer), and a flood of messages sent as
+fast as the transport allows measures throughput. Results are printed as a table (to stderr) and as JSON (to stdout
+or --output), so they can be compared between versions.
+"""
+import argparse
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import ipc
+
+# message sizes (in bytes), from a motor command (an int) up to a full RGB frame
+MESSAGE_SIZES = [8, 1024, 64 * 1024, 256 * 192 * 3, 1024 * 768 * 3]
+
+TRANSPORTS = ['queue', 'queue-batch', 'ring']
+
+N_ROUND_TRIPS = 500
+N_WARMUP = 20
+THROUGHPUT_BYTES = 256 * 1024 * 1024  # data sent per throughput measurement, within the message limits below
+MIN_MESSAGES = 50
+MAX_MESSAGES = 20000
+
+QUEUE_SIZE = 5
+RING_SLOTS = 8
+RECV_TIMEOUT = 30  # seconds; a consumer that waits longer has lost messages
+
+context = multiprocessing.get_context('spawn')
+
+
+def make_channel(transport, size):
+    """A channel over a new transport, lossless (blocking when full, never dropping stale messages)"""
+    if transport == 'ring':
+        # room for the payload and its encoding headers
+        queue = ipc.RingBuffer(n_slots=RING_SLOTS, slot_size=size + 1024, context=context)
+    else:
+        queue = context.Queue(maxsize=QUEUE_SIZE)
+
+    return ipc.Channel(queue, on_full=ipc.BLOCK, stale_after=None, batched=transport != 'queue')
+
+
+def close_channel(channel):
+    if isinstance(channel.queue, ipc.RingBuffer):
+        channel.queue.close()
+    else:
+        channel.queue.close()
+        channel.queue.join_thread()
+
+
+def make_payload(size):
+    # motor commands are ints; everything larger is a flat uint8 array (e.g., a frame)
+    return 1 if size <= 8 else np.ones(size, dtype=np.uint8)
+
+
+def _recv_one(channel):
+    msgs = channel.recv(max=1, block=True, timeout=RECV_TIMEOUT)
+    if not msgs:
+        raise TimeoutError('no message within {} s'.format(RECV_TIMEOUT))
+
+    return msgs[0]
+
+
+def _echo(requests, replies, n_msgs, results):
+    """Consumer of the ping-pong exchange: records each request's one-way latency and replies to it"""
+    one_way = []
+    for _ in range(n_msgs):
+        msg = _recv_one(requests)
+        one_way.append(ipc.current_time_in_nanos() - msg.time)
+        replies.send([0])
+
+    results.put(one_way)
+
+
+def _drain(channel, n_msgs, results):
+    """Consumer of the flood: receives n_msgs messages and reports when the last one arrived"""
+    results.put(None)
+
+    received = 0
+    while received < n_msgs:
+        msgs = channel.recv(block=True, timeout=RECV_TIMEOUT)
+        if not msgs:
+            raise TimeoutError('received {} of {} messages'.format(received, n_msgs))
+        received += len(msgs)
+
+    results.put(ipc.current_time_in_nanos())
+
+
+def measure_latency(transport, size, n_round_trips=N_ROUND_TRIPS, n_warmup=N_WARMUP):
+    """One-way and round-trip latencies (in us) of ping-pong exchanges
+
+    :return: (one_way, round_trip) arrays, excluding the warm-up exchanges
+    """
+    requests, replies = make_channel(transport, size), make_channel('queue-batch', 8)
+    results = context.Queue()
+    payload = make_payload(size)
+
+    n_msgs = n_warmup + n_round_trips
+    consumer = context.Process(target=_echo, args=(requests, replies, n_msgs, results))
+    consumer.start()
+
+    try:
+        round_trip = []
+        for _ in range(n_msgs):
+            start = ipc.current_time_in_nanos()
+            requests.send([payload])
+            _recv_one(replies)
+            round_trip.append(ipc.current_time_in_nanos() - start)
+
+        one_way = results.get(timeout=RECV_TIMEOUT)
+        consumer.join()
+    finally:
+        close_channel(requests)
+        close_channel(replies)
+
+    return np.array(one_way[n_warmup:]) / 1000, np.array(round_trip[n_warmup:]) / 1000
+
+
+def measure_throughput(transport, size, n_msgs):
+    """Messages per second sent from one process and received by another"""
+    channel = make_channel(transport, size)
+    results = context.Queue()
+    payload = make_payload(size)
+
+    consumer = context.Process(target=_drain, args=(channel, n_msgs, results))
+    consumer.start()
+
+    try:
+        # process start-up is not timed
+        results.get(timeout=RECV_TIMEOUT)
+
+        start = ipc.current_time_in_nanos()
+        for _ in range(n_msgs):
+            channel.send([payload])
+
+        end = results.get(timeout=RECV_TIMEOUT)
+        consumer.join()
+    finally:
+        close_channel(channel)
+
+    return n_msgs / ((end - start) / 1e9)
+
+
+def summarize(values):
+    return {'p50': float(np.percentile(values, 50)), 'p99': float(np.percentile(values, 99)),
+            'mean': float(values.mean())}
+
+
+def run(transports=TRANSPORTS, sizes=MESSAGE_SIZES, n_round_trips=N_ROUND_TRIPS, throughput_bytes=THROUGHPUT_BYTES):
+    """Benchmarks every transport at every message size
+
+    :return: list of result dicts
+    """
+    results = []
+    for size in sizes:
+        n_msgs = int(min(MAX_MESSAGES, max(MIN_MESSAGES, throughput_bytes // size)))
+
+        for transport in transports:
+            one_way, round_trip = measure_latency(transport, size, n_round_trips)
+            results.append({
+                'transport': transport,
+                'size': size,
+                'one_way_us': summarize(one_way),
+                'round_trip_us': summarize(round_trip),
+                'msgs_per_sec': measure_throughput(transport, size, n_msgs),
+            })
+
+    return results
+
+
+def environment():
+    """What the results were measured on and with"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError) as e:
+        commit = None
+
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'cpu_count': multiprocessing.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--transports', nargs='+', choices=TRANSPORTS, default=TRANSPORTS)
+    parser.add_argument('--sizes', nargs='+', type=int, default=MESSAGE_SIZES, help='message sizes (in bytes)')
+    parser.add_argument('--round-trips', type=int, default=N_ROUND_TRIPS)
+    parser.add_argument('--throughput-bytes', type=int, default=THROUGHPUT_BYTES)
+    parser.add_argument('--output', help='JSON results file (default: stdout only)')
+    args = parser.parse_args(argv)
+
+    results = run(args.transports, args.sizes, args.round_trips, args.throughput_bytes)
+
+    # the table goes to stderr, so stdout holds only the JSON report
+    print('{:<12} {:>9} {:>12} {:>12} {:>12} {:>12} {:>12}'.format(
+        'transport', 'size', 'one-way p50', 'one-way p99', 'rtt p50', 'rtt p99', 'msgs/s'), file=sys.stderr)
+    for result in results:
+        print('{:<12} {:>9} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.1f} {:>12.0f}'.format(
+            result['transport'], result['size'], result['one_way_us']['p50'], result['one_way_us']['p99'],
+            result['round_trip_us']['p50'], result['round_trip_us']['p99'], result['msgs_per_sec']), file=sys.stderr)
+
+    report = {'environment': environment(), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,399 @@
 import collections
+import json
+import logging
 import os
+import pickle
+import struct
 import time
 import multiprocessing
+import multiprocessing.shared_memory
 from queue import Empty, Full
 
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# channel activity is logged at INFO/DEBUG level, so it is only shown once logging is configured to show it
+logger.addHandler(logging.NullHandler())
+
+# time is when the message was sent (see current_time_in_nanos)
 Message = collections.namedtuple('Message', ['pid', 'time', 'content'])
 
+# Shared memory ring buffers (see RingBuffer)
+RING_SLOTS = 8
+RING_SLOT_SIZE = 1024 * 768 * 3  # a full RGB frame
+
+# payload kinds of ring buffer slots and batched messages
+PICKLED = 0
+BYTES = 1
+ARRAY = 2
+INT = 3
+FLOAT = 4
+STR = 5
+BATCH = 6
+
+# ring buffer layout: the write sequence number, each subscriber's read and release sequence numbers, then each
+# slot's header and payload
+_RING_HEADER = struct.Struct('<q')
+_SUBSCRIBER_HEADER = struct.Struct('<qq')
+_SLOT_HEADER = struct.Struct('<qiqBQ')  # seq, pid, time, kind, length
+
+# batch layout: the number of messages, then each message's header and payload; array payloads (here and in ring
+# buffer slots) start with their dtype and shape
+_MAX_DIMS = 4
+_BATCH_HEADER = struct.Struct('<I')
+_MSG_HEADER = struct.Struct('<iqBI')  # pid, time, kind, length
+_ARRAY_HEADER = struct.Struct('<16sB4q')  # dtype, ndim, shape
+_INT = struct.Struct('<q')
+_FLOAT = struct.Struct('<d')
+_INT_RANGE = range(-2 ** 63, 2 ** 63)
+
+# Channel backpressure policies: what sending to a full queue does
+DROP_NEWEST = 'drop newest'
+DROP_OLDEST = 'drop oldest'
+KEEP_LATEST = 'keep latest'
+BLOCK = 'block'
+
+STALE_AFTER = 20 * 1000 * 1000  # age (in ns) at which received messages are stale
+EVICT_TIMEOUT = .01  # how long eviction waits for a full multiprocessing.Queue's oldest item (in seconds)
+
+# Channel metrics
+LATENCY_BUCKETS = 24  # power-of-two latency buckets, from under 1 us to over 2 ** 22 us (about 4 s)
+LOG_INTERVAL = 1.0  # least time between a channel's drop log records (in seconds)
+METRICS_INTERVAL = 5.0  # default time between MetricsReporter reports (in seconds)
+
 
 def get_msg_queue():
     return multiprocessing.Queue(maxsize=5)
 
+
+def get_ring_buffer(n_slots=RING_SLOTS, slot_size=RING_SLOT_SIZE, n_subscribers=1):
+    return RingBuffer(n_slots, slot_size, n_subscribers=n_subscribers)
+
+
+class RingBuffer(object):
+    def __init__(self, n_slots=RING_SLOTS, slot_size=RING_SLOT_SIZE, context=multiprocessing, n_subscribers=1):
+        """A single producer message channel over shared memory, with fixed-size slots
+
+        It has the put/get interface of multiprocessing.Queue (raising queue.Full and queue.Empty), so send_msgs
+        and recv_msgs work with either. Message contents are encoded as by encode_batch and copied once, into a slot
+        (arrays need not be contiguous). NumPy arrays and bytes-like contents are received zero-copy, as arrays and
+        memoryviews of the slot; they stay valid until release() is called (recv_msgs releases the previous batch
+        when it is called again).
+
+        With several subscribers, every message is broadcast: each subscriber (see subscriber()) receives every
+        message, from the same slot, and a slot is reused once all of them have released it.
+
+        Like a multiprocessing.Queue, a buffer is shared by passing it to a new process, where it re-attaches to the
+        shared memory and its semaphores and locks. A buffer cannot be attached to by name alone, since its
+        semaphores and locks would not be shared.
+
+        :param n_slots (int): number of messages the buffer holds
+        :param slot_size (int): largest payload (in bytes)
+        :param context: the multiprocessing context of the processes sharing the buffer
+        :param n_subscribers (int): number of consumers
+        """
+        self.n_slots = n_slots
+        self.slot_size = slot_size
+        self.n_subscribers = n_subscribers
+
+        # room for an array's dtype and shape, so a slot holds an array of slot_size bytes
+        self._capacity = _ARRAY_HEADER.size + slot_size
+        self._slot_stride = _SLOT_HEADER.size + self._capacity
+        self._slots_offset = _RING_HEADER.size + n_subscribers * _SUBSCRIBER_HEADER.size
+        size = self._slots_offset + n_slots * self._slot_stride
+
+        self._owner = True
+        self._shm = multiprocessing.shared_memory.SharedMemory(create=True, size=size)
+
+        # per subscriber: counts of unread messages and of free slots
+        self._messages = [context.Semaphore(0) for _ in range(n_subscribers)]
+        self._free_slots = [context.Semaphore(n_slots) for _ in range(n_subscribers)]
+
+        # guards a subscriber's read and release sequence numbers, which the producer advances when it evicts a
+        # message
+        self._read_locks = [context.Lock() for _ in range(n_subscribers)]
+
+        # the subscriber that this handle receives as
+        self.index = 0
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    def __getstate__(self):
+        # the shared memory is re-attached by name in the receiving process
+        state = self.__dict__.copy()
+        state['_shm'] = self._shm.name
+        state['_owner'] = False
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._shm = multiprocessing.shared_memory.SharedMemory(name=state['_shm'])
+
+    def subscriber(self, index):
+        """A handle on the buffer that receives as the given subscriber (to pass to that subscriber's process)"""
+        if not 0 <= index < self.n_subscribers:
+            raise IndexError('subscriber {} of a buffer with {} subscribers'.format(index, self.n_subscribers))
+
+        handle = RingBuffer.__new__(RingBuffer)
+        handle.__setstate__(dict(self.__getstate__(), index=index))
+        return handle
+
+    def put(self, msg, block=True, timeout=None):
+        kind, parts = _encode_content(msg.content)
+        self._write(parts, msg.pid, msg.time, kind, block, timeout)
+
+    def put_nowait(self, msg):
+        self.put(msg, block=False)
+
+    def put_batch(self, msgs, block=True, timeout=None):
+        """Puts a list of messages in a single slot (in the format of encode_batch)"""
+        self._write(_batch_parts(msgs), os.getpid(), current_time_in_nanos(), BATCH, block, timeout)
+
+    def get(self, block=True, timeout=None):
+        return self._read(block, timeout)[1]
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def get_batch(self, block=True, timeout=None):
+        """Gets the next slot's messages: the list put by put_batch, or the single message put by put"""
+        kind, msg = self._read(block, timeout)
+        return msg.content if kind == BATCH else [msg]
+
+    def _acquire_slot(self, block, timeout):
+        """Acquires a free slot from every subscriber; all or none"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for i, free_slots in enumerate(self._free_slots):
+            remaining = None if deadline is None else max(0, deadline - time.monotonic())
+            if not free_slots.acquire(block, remaining):
+                for acquired in self._free_slots[:i]:
+                    acquired.release()
+                return False
+
+        return True
+
+    def _write(self, parts, pid, msg_time, kind, block, timeout):
+        length = sum(_part_size(part) for part in parts)
+        if length > self._capacity:
+            raise ValueError('message of {} bytes does not fit in a {} byte slot'.format(length, self.slot_size))
+
+        if not self._acquire_slot(block, timeout):
+            raise Full
+
+        write_seq, = _RING_HEADER.unpack_from(self._shm.buf, 0)
+        offset = self._slot_offset(write_seq)
+
+        _write_parts(self._shm.buf, offset + _SLOT_HEADER.size, parts)
+        _SLOT_HEADER.pack_into(self._shm.buf, offset, write_seq, pid, msg_time, kind, length)
+
+        # published only once the slot is complete
+        _RING_HEADER.pack_into(self._shm.buf, 0, write_seq + 1)
+        for messages in self._messages:
+            messages.release()
+
+    def _read(self, block, timeout):
+        if not self._messages[self.index].acquire(block, timeout):
+            raise Empty
+
+        with self._read_locks[self.index]:
+            read_seq, release_seq = self._subscriber_seqs(self.index)
+            offset = self._slot_offset(read_seq)
+
+            seq, pid, msg_time, kind, length = _SLOT_HEADER.unpack_from(self._shm.buf, offset)
+            if seq != read_seq:
+                raise RuntimeError('ring buffer slot {} holds message {}, expected {}'.format(offset, seq, read_seq))
+
+            self._set_subscriber_seqs(self.index, read_seq + 1, release_seq)
+
+        payload = self._shm.buf[offset + _SLOT_HEADER.size:offset + _SLOT_HEADER.size + length]
+
+        content = decode_batch(payload) if kind == BATCH else _decode_content(kind, payload)
+        return kind, Message(pid=pid, time=msg_time, content=content)
+
+    def release(self):
+        """Frees the slots of every message received so far, invalidating their contents"""
+        with self._read_locks[self.index]:
+            read_seq, release_seq = self._subscriber_seqs(self.index)
+            self._set_subscriber_seqs(self.index, read_seq, read_seq)
+
+        for _ in range(read_seq - release_seq):
+            self._free_slots[self.index].release()
+
+    def evict(self):
+        """Discards the oldest unread slot of every subscriber without a free slot, to make room for a new one
+        (called by the producer)
+
+        Slots are freed in order, so nothing is evicted for a subscriber that still holds received contents.
+
+        :return: the number of messages discarded (counted once per subscriber)
+        """
+        write_seq, = _RING_HEADER.unpack_from(self._shm.buf, 0)
+
+        n_evicted = 0
+        for i in range(self.n_subscribers):
+            if write_seq - self._subscriber_seqs(i)[1] < self.n_slots or not self._messages[i].acquire(False):
+                continue
+
+            with self._read_locks[i]:
+                read_seq, release_seq = self._subscriber_seqs(i)
+                if read_seq != release_seq:
+                    self._messages[i].release()
+                    continue
+
+                offset = self._slot_offset(read_seq)
+                kind = _SLOT_HEADER.unpack_from(self._shm.buf, offset)[3]
+                n_evicted += (_BATCH_HEADER.unpack_from(self._shm.buf, offset + _SLOT_HEADER.size)[0]
+                              if kind == BATCH else 1)
+
+                self._set_subscriber_seqs(i, read_seq + 1, read_seq + 1)
+
+            self._free_slots[i].release()
+
+        return n_evicted
+
+    def qsize(self):
+        """The number of messages this handle's subscriber has not received"""
+        write_seq, = _RING_HEADER.unpack_from(self._shm.buf, 0)
+        return write_seq - self._subscriber_seqs(self.index)[0]
+
+    def close(self):
+        # received arrays and memoryviews must no longer be referenced
+        self._shm.close()
+
+        if self._owner:
+            self._shm.unlink()
+
+    def _subscriber_seqs(self, index):
+        return _SUBSCRIBER_HEADER.unpack_from(self._shm.buf, _RING_HEADER.size + index * _SUBSCRIBER_HEADER.size)
+
+    def _set_subscriber_seqs(self, index, read_seq, release_seq):
+        _SUBSCRIBER_HEADER.pack_into(self._shm.buf, _RING_HEADER.size + index * _SUBSCRIBER_HEADER.size, read_seq,
+                                     release_seq)
+
+    def _slot_offset(self, seq):
+        return self._slots_offset + (seq % self.n_slots) * self._slot_stride
+
+
+def _encode_content(content):
+    """The payload kind of a message's content and its payload, as a list of parts (bytes-like objects and arrays)
+
+    Arrays are passed on as they are, so they are copied only when they are written (see _write_parts).
+    """
+    if type(content) is int and content in _INT_RANGE:
+        return INT, [_INT.pack(content)]
+
+    if type(content) is float:
+        return FLOAT, [_FLOAT.pack(content)]
+
+    if isinstance(content, str):
+        return STR, [content.encode('utf-8')]
+
+    if (isinstance(content, np.ndarray) and content.ndim <= _MAX_DIMS and not content.dtype.hasobject
+            and content.dtype.fields is None):
+        shape = content.shape + (0,) * (_MAX_DIMS - content.ndim)
+        header = _ARRAY_HEADER.pack(content.dtype.str.encode('ascii'), content.ndim, *shape)
+        return ARRAY, [header, content]
+
+    if isinstance(content, (bytes, bytearray, memoryview)):
+        return BYTES, [memoryview(content).cast('B')]
+
+    return PICKLED, [pickle.dumps(content, protocol=pickle.HIGHEST_PROTOCOL)]
+
+
+def _decode_content(kind, payload):
+    if kind == INT:
+        return _INT.unpack(payload)[0]
+
+    if kind == FLOAT:
+        return _FLOAT.unpack(payload)[0]
+
+    if kind == STR:
+        return str(payload, 'utf-8')
+
+    if kind == ARRAY:
+        dtype, ndim, *shape = _ARRAY_HEADER.unpack_from(payload)
+        dtype = np.dtype(dtype.rstrip(b'\0').decode('ascii'))
+        return np.frombuffer(payload[_ARRAY_HEADER.size:], dtype=dtype).reshape(shape[:ndim])
+
+    if kind == BYTES:
+        return payload
+
+    return pickle.loads(payload)
+
+
+def _batch_parts(msgs):
+    """The encoding of a list of messages (see encode_batch), as a list of bytes-like parts"""
+    parts = [_BATCH_HEADER.pack(len(msgs))]
+    for msg in msgs:
+        kind, payload = _encode_content(msg.content)
+        parts.append(_MSG_HEADER.pack(msg.pid, msg.time, kind, sum(_part_size(part) for part in payload)))
+        parts.extend(payload)
+
+    return parts
+
+
+def _part_size(part):
+    return part.nbytes if isinstance(part, np.ndarray) else len(part)
+
+
+def _write_parts(buffer, offset, parts):
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            # strided arrays are copied straight into the buffer, without a contiguous intermediate copy
+            np.copyto(np.ndarray(part.shape, dtype=part.dtype, buffer=buffer, offset=offset), part)
+        else:
+            part = memoryview(part).cast('B')
+            buffer[offset:offset + len(part)] = part
+        offset += _part_size(part)
+
+
+def encode_batch(msgs):
+    """Encodes a list of messages for a single transfer
+
+    Each message has a struct-packed header (pid, time, payload kind, length). Integers, floats, strings, bytes and
+    NumPy arrays are packed as they are; other contents are pickled.
+
+    :param msgs (list): the messages
+    :return: bytes
+    """
+    return b''.join(np.ascontiguousarray(part).reshape(-1).view(np.uint8) if isinstance(part, np.ndarray) else part
+                    for part in _batch_parts(msgs))
+
+
+def decode_batch(data):
+    """Decodes a list of messages encoded by encode_batch
+
+    Array and bytes contents are views of data, not copies.
+
+    :param data (bytes-like): the encoded messages
+    :return: list of Messages
+    """
+    data = memoryview(data)
+    n_msgs, = _BATCH_HEADER.unpack_from(data, 0)
+    offset = _BATCH_HEADER.size
+
+    msgs = []
+    for _ in range(n_msgs):
+        pid, msg_time, kind, length = _MSG_HEADER.unpack_from(data, offset)
+        offset += _MSG_HEADER.size
+
+        msgs.append(Message(pid=pid, time=msg_time, content=_decode_content(kind, data[offset:offset + length])))
+        offset += length
+
+    return msgs
+
+
+def current_time_in_nanos():
+    """Monotonic time (in ns); unaffected by clock adjustments and comparable between processes on one machine"""
+    return time.monotonic_ns()
+
+
 def current_time_in_millis():
-    return int(round(time.time() * 1000))
+    """Monotonic time (in ms); message times are in ns (see current_time_in_nanos)"""
+    return current_time_in_nanos() // 1000000
 
 
 def display_process_info():
@@ -19,29 +401,297 @@ def display_process_info():
     print('parent process id: ', os.getppid())
 
 
-def is_stale_msg(msg, threshold_in_millis=20):
-    return current_time_in_millis() - msg.time > threshold_in_millis
+def is_stale_msg(msg, threshold_in_millis=None, threshold_in_nanos=None):
+    """Whether a message is older than the threshold, given in ms or ns (defaults to STALE_AFTER)"""
+    if threshold_in_nanos is None:
+        threshold_in_nanos = STALE_AFTER if threshold_in_millis is None else threshold_in_millis * 1000000
 
+    return current_time_in_nanos() - msg.time > threshold_in_nanos
 
-def recv_msgs(queue, max=5):
-    msgs = []
-    try:
-        while len(msgs) < max:
-            msg = queue.get(block=False)
-            if is_stale_msg(msg):
-                print('dropping stale message: {}'.format(msg))
+
+class RateLimiter(object):
+    def __init__(self, interval):
+        """Allows an action at most once per interval (in seconds)"""
+        self.interval = interval
+        self._next = 0
+
+    def ready(self):
+        """True, at most once per interval"""
+        now = time.monotonic()
+        if now < self._next:
+            return False
+
+        self._next = now + self.interval
+        return True
+
+
+class Histogram(object):
+    def __init__(self, n_buckets=LATENCY_BUCKETS):
+        """Counts of non-negative integers in power-of-two buckets: bucket 0 holds 0, bucket i holds
+        [2 ** (i - 1), 2 ** i), and the last bucket holds everything larger"""
+        self.counts = [0] * n_buckets
+
+    def add(self, value):
+        self.counts[min(max(int(value), 0).bit_length(), len(self.counts) - 1)] += 1
+
+    def percentile(self, q):
+        """An upper bound on the q-th percentile (the upper end of its bucket, or the lower end of the last bucket);
+        None if nothing was added
+
+        :param q (float): the percentile (0-100)
+        """
+        total = sum(self.counts)
+        if not total:
+            return None
+
+        rank, cumulative = q / 100 * total, 0
+        for i, count in enumerate(self.counts):
+            cumulative += count
+            if cumulative >= rank and count:
+                return 2 ** i - 1 if i < len(self.counts) - 1 else 2 ** (i - 1)
+
+
+class ChannelMetrics(object):
+    def __init__(self):
+        """Activity of one end of a Channel
+
+        counts holds the number of messages sent, received, dropped_full, evicted, coalesced and dropped_stale;
+        latency is a Histogram of the age (in us) of received messages; depth is the queue's size when last sent to
+        or received from (None if the queue cannot report it).
+        """
+        self.counts = collections.Counter()
+        self.latency = Histogram()
+        self.depth = None
+        self.max_depth = 0
+
+    def observe_depth(self, queue):
+        try:
+            self.depth = queue.qsize()
+        except NotImplementedError as e:
+            # multiprocessing.Queue.qsize is not available on macOS
+            return
+
+        self.max_depth = max(self.max_depth, self.depth)
+
+    def observe_latency(self, msgs, now):
+        for msg in msgs:
+            self.latency.add((now - msg.time) // 1000)
+
+    def as_dict(self):
+        return {
+            'counts': dict(self.counts),
+            'depth': self.depth,
+            'max_depth': self.max_depth,
+            'latency_us': {'p50': self.latency.percentile(50), 'p99': self.latency.percentile(99),
+                           'buckets': list(self.latency.counts)},
+        }
+
+
+class Channel(object):
+    def __init__(self, queue, on_full=DROP_NEWEST, timeout=None, stale_after=STALE_AFTER, batched=True,
+                 name='channel'):
+        """A message queue (a multiprocessing.Queue or RingBuffer) with a backpressure and a staleness policy
+
+        When the queue is full, send either drops the new messages (DROP_NEWEST), evicts the oldest queued messages
+        to make room for them (DROP_OLDEST), or blocks for up to timeout seconds and then drops them (BLOCK).
+        KEEP_LATEST evicts like DROP_OLDEST, and recv also coalesces everything it receives into the latest message,
+        for streams where only the latest state matters (e.g., frames).
+
+        Every outcome is counted in metrics (see ChannelMetrics), and drops are logged at most once per LOG_INTERVAL.
+        A channel passed to another process is copied, so each process measures its own end of the channel.
+
+        :param queue: the underlying queue
+        :param on_full (str): the backpressure policy
+        :param timeout (float): how long BLOCK waits for room (in seconds); None waits indefinitely
+        :param stale_after (int): age (in ns) at which received messages are dropped as stale; None keeps them all
+        :param batched (bool): sends the messages of each send in a single transfer (see encode_batch)
+        :param name (str): identifies the channel in logs and metric reports
+        """
+        if on_full not in (DROP_NEWEST, DROP_OLDEST, KEEP_LATEST, BLOCK):
+            raise ValueError('unknown backpressure policy: {}'.format(on_full))
+
+        self.queue = queue
+        self.on_full = on_full
+        self.timeout = timeout
+        self.stale_after = stale_after
+        self.batched = batched
+        self.name = name
+
+        self.metrics = ChannelMetrics()
+        self._log_limiter = RateLimiter(LOG_INTERVAL)
+
+    def send(self, contents):
+        """Sends a list of message contents
+
+        :return: the number of messages queued
+        """
+        if not contents:
+            return 0
+
+        pid, now = os.getpid(), current_time_in_nanos()
+        msgs = [Message(pid=pid, time=now, content=content) for content in contents]
+
+        if self.batched:
+            return len(msgs) if self._put(msgs) else 0
+
+        return sum(1 for msg in msgs if self._put([msg]))
+
+    def recv(self, max=5, block=False, timeout=None):
+        """Receives up to max queued transfers (batches, or single messages if the channel is not batched)
+
+        :param block (bool): waits for the first transfer, waking as soon as it arrives (on the ring buffer's
+            semaphore or the queue's pipe) instead of polling
+        :param timeout (float): how long to wait (in seconds); None waits indefinitely
+        :return: the list of received messages that are not stale
+        """
+        # contents received zero-copy in the previous call are no longer in use
+        release = getattr(self.queue, 'release', None)
+        if release is not None:
+            release()
+
+        self.metrics.observe_depth(self.queue)
+
+        msgs = []
+        try:
+            for i in range(max):
+                msgs.extend(self._get(block=block and i == 0, timeout=timeout))
+        except Empty as e:
+            pass
+
+        if not msgs:
+            return msgs
+
+        now = current_time_in_nanos()
+        self.metrics.observe_latency(msgs, now)
+
+        if self.stale_after is not None:
+            fresh = [msg for msg in msgs if now - msg.time <= self.stale_after]
+            if len(fresh) < len(msgs):
+                self._count_drop('dropped_stale', len(msgs) - len(fresh))
+            msgs = fresh
+
+        if self.on_full == KEEP_LATEST and len(msgs) > 1:
+            self.metrics.counts['coalesced'] += len(msgs) - 1
+            msgs = msgs[-1:]
+
+        self.metrics.counts['received'] += len(msgs)
+        return msgs
+
+    def _put(self, msgs):
+        """Puts messages in a single transfer, applying the backpressure policy
+
+        :return: True if the messages were queued
+        """
+        try:
+            if self.on_full == BLOCK:
+                self._put_now(msgs, block=True, timeout=self.timeout)
+            elif self.on_full == DROP_NEWEST:
+                self._put_now(msgs, block=False)
             else:
-                msgs.append(msg)
-    except Empty as e:
-        pass
+                self._put_evicting(msgs)
+        except Full as e:
+            self._count_drop('dropped_full', len(msgs))
+            return False
 
-    return msgs
+        self.metrics.counts['sent'] += len(msgs)
+        self.metrics.observe_depth(self.queue)
+        return True
+
+    def _count_drop(self, reason, n_msgs):
+        self.metrics.counts[reason] += n_msgs
+
+        if logger.isEnabledFor(logging.DEBUG) and self._log_limiter.ready():
+            logger.debug('%s: %s message(s) %s (%s in total)', self.name, n_msgs, reason.replace('_', ' '),
+                         self.metrics.counts[reason])
+
+    def _put_now(self, msgs, block, timeout=None):
+        if not self.batched:
+            self.queue.put(msgs[0], block=block, timeout=timeout)
+        elif hasattr(self.queue, 'put_batch'):
+            self.queue.put_batch(msgs, block=block, timeout=timeout)
+        else:
+            self.queue.put(encode_batch(msgs), block=block, timeout=timeout)
+
+    def _put_evicting(self, msgs):
+        while True:
+            try:
+                return self._put_now(msgs, block=False)
+            except Full as e:
+                # gives up (as DROP_NEWEST) when nothing can be evicted
+                n_evicted = self._evict()
+                if not n_evicted:
+                    raise
+                self.metrics.counts['evicted'] += n_evicted
+
+    def _evict(self):
+        evict = getattr(self.queue, 'evict', None)
+        if evict is not None:
+            return evict()
+
+        try:
+            item = self.queue.get(timeout=EVICT_TIMEOUT)
+        except Empty as e:
+            return 0
+
+        return _BATCH_HEADER.unpack_from(item)[0] if self.batched else 1
+
+    def _get(self, block, timeout):
+        if not self.batched:
+            return [self.queue.get(block=block, timeout=timeout)]
+
+        if hasattr(self.queue, 'get_batch'):
+            return self.queue.get_batch(block=block, timeout=timeout)
+
+        return decode_batch(self.queue.get(block=block, timeout=timeout))
+
+
+class MetricsReporter(object):
+    def __init__(self, channels, interval=METRICS_INTERVAL, stream=None):
+        """Reports the metrics of channels periodically: logged at INFO level and, if a stream is given, dumped to it
+        as JSON lines
+
+        :param channels (list): the channels
+        :param interval (float): least time between reports (in seconds)
+        :param stream: a text stream (e.g., an open file)
+        """
+        self.channels = channels
+        self.stream = stream
+        self._limiter = RateLimiter(interval)
+
+    def poll(self):
+        """Reports if a report is due (called from a process's main loop)"""
+        if self._limiter.ready():
+            self.report()
+
+    def report(self):
+        snapshot = {channel.name: channel.metrics.as_dict() for channel in self.channels}
+
+        for name, metrics in snapshot.items():
+            logger.info('%s: %s, depth %s, latency p50 %s us, p99 %s us', name, metrics['counts'], metrics['depth'],
+                        metrics['latency_us']['p50'], metrics['latency_us']['p99'])
+
+        if self.stream is not None:
+            self.stream.write(json.dumps({'pid': os.getpid(), 'time': current_time_in_nanos(), 'channels': snapshot}))
+            self.stream.write('\n')
+            self.stream.flush()
+
+
+def recv_msgs(queue, max=5, block=False, timeout=None):
+    return Channel(queue, batched=False).recv(max, block, timeout)
 
 
 def send_msgs(queue, msgs):
-    try:
-        for content in msgs:
-            msg = Message(pid=os.getpid(), time=current_time_in_millis(), content=content)
-            queue.put(msg, block=False)
-    except Full as e:
-        print('queue is full')
+    Channel(queue, batched=False).send(msgs)
+
+
+def recv_batch(queue, max=5, block=False, timeout=None):
+    """Receives the messages of up to max batches sent by send_batch (see Channel.recv)"""
+    return Channel(queue).recv(max, block, timeout)
+
+
+def send_batch(queue, msgs):
+    """Sends a list of message contents in a single transfer (see encode_batch)
+
+    A channel is used either with send_batch and recv_batch or with send_msgs and recv_msgs, not both.
+    """
+    Channel(queue).send(msgs)
@@ -1,13 +1,19 @@
+import copy
+import logging
 import multiprocessing
 import pygame
 
 import ipc
-import time
 import random
 
 import sperling
 import lida.modules
 
+logger = logging.getLogger(__name__)
+
+# longest wait for stimuli before the agent's loop polls its metrics anyway (in seconds)
+AGENT_IDLE_TIMEOUT = .5
+
 
 class Agent(object):
     def __init__(self):
@@ -22,50 +28,123 @@ class Agent(object):
         self.tem = None
         self.declare_mem = None
 
-    def sense(self, environment):
-        msgs = environment.receive_stimuli('visual')
-        if msgs:
-            for msg in msgs:
-                print('received stimuli: ', msg)
+    def sense(self, environment, timeout=0):
+        """Receives stimuli, waiting up to timeout seconds for them to arrive (0 does not wait, None waits
+        indefinitely)"""
+        msgs = environment.receive_stimuli('visual', timeout=timeout)
+        for msg in msgs:
+            logger.debug('received stimuli: %s', msg)
+
+        return msgs
 
     def act(self, environment):
         motor_command = random.randint(1, 100)
-        environment.update(motor_command)
+        environment.update([motor_command])
 
 
 class Environment(object):
-    def __init__(self):
-        self._visual_sensory_queue = ipc.get_msg_queue()
-        self._action_queue = ipc.get_msg_queue()
+    def __init__(self, n_agents=1):
+        """The experiment's side of the agents' channels
+
+        Each frame is broadcast once, through shared memory, to every agent; each agent's actions come back on its own
+        channel. An agent's process uses the view of the environment returned by for_agent.
+
+        :param n_agents (int): number of agents seeing the same stimuli
+        """
+        self.n_agents = n_agents
+
+        # a slow agent skips ahead to the latest frame. An agent never waits to act: its newest actions are dropped
+        # while the experiment has not collected the earlier ones, which it does once per frame (see step), so
+        # actions are not dropped as stale.
+        self._visual_sensory_channel = self._visual_channel(ipc.get_ring_buffer(n_subscribers=n_agents), 'visual')
+        self._action_channels = [ipc.Channel(ipc.get_msg_queue(), on_full=ipc.DROP_NEWEST, stale_after=None,
+                                             name='actions {}'.format(i)) for i in range(n_agents)]
+
+        # the agent whose view of the environment this is
+        self.agent_index = 0
+
+    @staticmethod
+    def _visual_channel(ring, name):
+        return ipc.Channel(ring, on_full=ipc.KEEP_LATEST, name=name)
+
+    def for_agent(self, index):
+        """The environment as seen by one agent: the stimuli broadcast to it, and its own action channel"""
+        view = copy.copy(self)
+        view._visual_sensory_channel = self._visual_channel(self._visual_sensory_channel.queue.subscriber(index),
+                                                            'visual {}'.format(index))
+        view.agent_index = index
+        return view
 
     def update(self, actions):
-        ipc.send_msgs(self._action_queue, actions)
+        self._action_channels[self.agent_index].send(actions)
 
-    def receive_stimuli(self, modality):
-        return ipc.recv_msgs(self._visual_sensory_queue)
+    def receive_actions(self):
+        """The actions sent by each agent
+
+        :return: a list of received messages per agent
+        """
+        return [channel.recv() for channel in self._action_channels]
+
+    def send_stimuli(self, frame, item):
+        # the (strided) view of the display is copied straight into a shared memory slot, once for all agents
+        self._visual_sensory_channel.send([frame])
+
+    def receive_stimuli(self, modality, timeout=0):
+        return self._visual_sensory_channel.recv(block=timeout != 0, timeout=timeout)
 
     def step(self):
-        pass
+        """Collects the actions the agents have sent (called by the experiment on every presented frame)
+
+        :return: a list of received messages per agent
+        """
+        actions = self.receive_actions()
+        for i, msgs in enumerate(actions):
+            for msg in msgs:
+                logger.debug('received action from agent %s: %s', i, msg)
+
+        return actions
+
+    def on_frame(self, frame, item):
+        """Broadcasts a presented frame to the agents and collects their actions (see SerialTrialRunner)"""
+        self.send_stimuli(frame, item)
+        self.step()
+
+    @property
+    def channels(self):
+        """This view's channels: the visual stimuli and its agent's actions"""
+        return [self._visual_sensory_channel, self._action_channels[self.agent_index]]
+
+    def close(self):
+        """Detaches from the stimuli's shared memory, which is freed when the environment that created it closes"""
+        self._visual_sensory_channel.queue.close()
 
 
 def launch_agent(agent, environment):
     print('Starting LIDA agent')
     ipc.display_process_info()
 
+    reporter = ipc.MetricsReporter(environment.channels)
+
     while True:
-        agent.receive_stimuli(environment)
-        agent.act(environment)
-        time.sleep(.01)
+        # wakes as soon as a frame arrives and acts on it
+        if agent.sense(environment, timeout=AGENT_IDLE_TIMEOUT):
+            agent.act(environment)
 
+        reporter.poll()
 
-def launch_experiment(environment):
+
+def launch_experiment(environment, headless=False):
+    """Runs the experiment in a window or, when headless, off-screen; either way, its frames are sent to the agents"""
     print('Starting experiment')
     ipc.display_process_info()
 
-    pygame.init()
+    if headless:
+        screen = sperling.headless.init_display((256, 192))
+    else:
+        pygame.init()
 
-    flags = 0
-    screen = pygame.display.set_mode((256, 192), flags)
+        flags = 0
+        screen = pygame.display.set_mode((256, 192), flags)
 
     # hide mouse cursor
     pygame.mouse.set_visible(False)
@@ -84,16 +163,32 @@ def launch_experiment(environment):
 
     try:
         session = sperling.Session('agent', experiments=experiments)
-        session.run()
+        # the agents see the presented frames through the environment
+        session.run(on_frame=environment.on_frame)
     except InterruptedError as exc:
         print(exc)
 
 
-def run(agent, environment):
+def run(agents, environment, headless=False):
+    """Runs the experiment in one process and each agent in its own, all seeing the same stimuli
+
+    :param agents (list): the agents (as many as environment.n_agents), or a single agent
+    :param environment (Environment): the environment
+    :param headless (bool): runs the experiment off-screen (see launch_experiment)
+    """
+    if isinstance(agents, Agent):
+        agents = [agents]
+
+    if len(agents) != environment.n_agents:
+        raise ValueError('{} agents for an environment of {} agents'.format(len(agents), environment.n_agents))
+
+    views = [environment.for_agent(i) for i in range(len(agents))]
+
     try:
         procs = []
-        procs.append(multiprocessing.Process(target=launch_experiment, name='env', args=(environment)))
-        procs.append(multiprocessing.Process(target=launch_agent, name='agent', args=(agent, environment)))
+        procs.append(multiprocessing.Process(target=launch_experiment, name='env', args=(environment, headless)))
+        for i, (agent, view) in enumerate(zip(agents, views)):
+            procs.append(multiprocessing.Process(target=launch_agent, name='agent {}'.format(i), args=(agent, view)))
 
         for proc in procs:
             proc.start()
@@ -104,3 +199,7 @@ def run(agent, environment):
     except Exception as e:
         print(e)
         exit(1)
+    finally:
+        for view in views:
+            view.close()
+        environment.close()
@@ -1,45 +1,64 @@
-from multiprocessing import Process, Queue
+from multiprocessing import Process
+import logging
 import random
 import time
 
 import ipc
 
+logger = logging.getLogger(__name__)
 
-def start_agent(actions_queue, stimuli_queue):
+STIMULUS_INTERVAL = .01  # time between the environment's stimuli (in seconds)
+IDLE_TIMEOUT = .5  # longest wait for a message before the metrics are polled anyway (in seconds)
+
+
+def start_agent(actions_channel, stimuli_channel):
     print('Starting LIDA agent')
     ipc.display_process_info()
 
+    reporter = ipc.MetricsReporter([actions_channel, stimuli_channel])
+
     while True:
-        msgs = ipc.recv_msgs(stimuli_queue)
+        # wakes as soon as stimuli arrive and acts on them
+        msgs = stimuli_channel.recv(block=True, timeout=IDLE_TIMEOUT)
+        for msg in msgs:
+            logger.debug('received stimuli: %s', msg)
+
         if msgs:
-            for msg in msgs:
-                print('received stimuli: ', msg)
+            actions_channel.send([random.randint(1, 10)])
 
-        ipc.send_msgs(actions_queue, msgs=[random.randint(1, 10)])
-        time.sleep(.01)
+        reporter.poll()
 
 
-def start_env(actions_queue, stimuli_queue):
+def start_env(actions_channel, stimuli_channel):
     print('Starting environment')
     ipc.display_process_info()
 
+    reporter = ipc.MetricsReporter([actions_channel, stimuli_channel])
+
+    next_stimulus = time.monotonic()
     while True:
-        msgs = ipc.recv_msgs(actions_queue)
-        if msgs:
-            for msg in msgs:
-                print('received action: ', msg)
+        # actions are handled as they arrive while waiting for the next stimulus
+        msgs = actions_channel.recv(block=True, timeout=max(0, next_stimulus - time.monotonic()))
+        for msg in msgs:
+            logger.debug('received action: %s', msg)
 
-        ipc.send_msgs(stimuli_queue, msgs=[random.randint(1, 10) for n in range(1, 4)])
-        time.sleep(.01)
+        if time.monotonic() >= next_stimulus:
+            stimuli_channel.send([random.randint(1, 10) for n in range(1, 4)])
+            next_stimulus += STIMULUS_INTERVAL
+
+        reporter.poll()
 
 
 if __name__ == '__main__':
-    actions_queue = ipc.get_msg_queue()
-    stimuli_queue = ipc.get_msg_queue()
+    # quiet by default; INFO reports channel metrics every few seconds and DEBUG also logs every message
+    logging.basicConfig(level=logging.WARNING)
+
+    actions_channel = ipc.Channel(ipc.get_msg_queue(), name='actions')
+    stimuli_channel = ipc.Channel(ipc.get_msg_queue(), name='stimuli')
 
     procs = []
-    procs.append(Process(target=start_agent, name='agent', args=(actions_queue, stimuli_queue)))
-    procs.append(Process(target=start_env, name='env', args=(actions_queue, stimuli_queue)))
+    procs.append(Process(target=start_agent, name='agent', args=(actions_channel, stimuli_channel)))
+    procs.append(Process(target=start_env, name='env', args=(actions_channel, stimuli_channel)))
 
     for proc in procs:
         proc.start()
@@ -1,6 +1,5 @@
 import pygame
 import sperling
-import statistics
 
 from sperling.view import find_font
 
@@ -26,7 +25,7 @@ experiments = [
 ]
 
 try:
-    session = sperling.Session('S', experiments=experiments)
+    session = sperling.Session('S', experiments=experiments, results_dir='results')
     session.run()
 except InterruptedError as exc:
     print(exc)
@@ -37,5 +36,5 @@ for experiment in experiments:
         print(result)
 
 # stats
-avg_correct = statistics.mean([sperling.n_correct(result) for result in experiments[0].results])
+avg_correct = sperling.analysis.n_correct(experiments[0].results).mean()
 print('Average correct: {:.2f}'.format(avg_correct))
@@ -1,6 +1,5 @@
 import pygame
 import sperling
-import statistics
 
 from sperling.view import find_font
 
@@ -28,7 +27,7 @@ experiments = [
 ]
 
 try:
-    session = sperling.Session('S', experiments=experiments)
+    session = sperling.Session('S', experiments=experiments, results_dir='results')
     session.run()
 except InterruptedError as exc:
     print(exc)
@@ -40,5 +39,6 @@ for experiment in experiments:
 
 # stats
 if len(experiments[0].results) > 0:
-    avg_correct = statistics.mean([sperling.n_correct(result) for result in experiments[0].results])
+    avg_correct = sperling.analysis.n_correct(experiments[0].results).mean()
     print('Average correct: {:.2f}'.format(avg_correct))
+    print('Letters available: {:.2f}'.format(sperling.analysis.summarize(experiments[0].results).letters_available))
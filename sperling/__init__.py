@@ -1,41 +1,86 @@
 import collections
 import itertools
+import os
+import numpy as np
 import random
-import copy
 import pygame
+import time
 import uuid
 
 import sperling.constants
 import sperling.view
+import sperling.timing
+import sperling.headless
+import sperling.templates
+import sperling.plan
+import sperling.results
+import sperling.analysis
 import sperling.experiments
+import sperling.simulation
+import sperling.sweep
 
 
 class Session(object):
 
-    def __init__(self, subject, experiments):
+    def __init__(self, subject, experiments, results_dir=None):
         self.subject = subject
         self.experiments = experiments
 
+        # trial results are written to <results_dir>/<subject>-<session id>.{jsonl,bin} as the session runs
+        self.results_dir = results_dir
+
         self.session_id = Session._generate_session_id()
 
     @staticmethod
     def _generate_session_id():
         return uuid.uuid4()
 
-    def run(self, fps=sperling.constants.DEFAULT_FPS):
-        for experiment in self.experiments:
-            experiment.run(fps)
+    def run(self, fps=sperling.constants.DEFAULT_FPS, **runner_options):
+        writer = None
+        if self.results_dir is not None:
+            writer = sperling.results.ResultsWriter(self.results_path)
+
+        try:
+            for experiment in self.experiments:
+                experiment.run(fps, writer=writer, **runner_options)
+        finally:
+            if writer is not None:
+                writer.close()
+
+    @property
+    def results_path(self):
+        return os.path.join(self.results_dir, '{}-{}'.format(self.subject, self.session_id))
 
 
 class SerialTrialRunner(object):
-    def __init__(self, trial, clock, surface, fps):
+    presents_frames = True
+
+    def __init__(self, trial, clock, surface, fps, render_mode=sperling.constants.RENDER_FULL, scheduler=None,
+                 idle_wait=False, on_frame=None):
         self.trial = trial
         self.clock = clock
         self.surface = surface
         self.fps = fps
+        self.render_mode = render_mode
+        self.scheduler = scheduler or sperling.timing.ClockScheduler(clock, fps)
+
+        # block on input during long items rather than rendering every frame
+        self.idle_wait = idle_wait
+
+        # called as on_frame(frame, item) with a NumPy view of every presented frame (see sperling.headless)
+        self.on_frame = on_frame
+
+        if self.render_mode not in (constants.RENDER_FULL, constants.RENDER_DIRTY):
+            raise ValueError('Invalid render mode: {}'.format(self.render_mode))
 
         self.times_per_item = collections.OrderedDict()
 
+        # high-resolution presentation timeline for this trial (list of sperling.timing.ItemTiming)
+        self.timeline = []
+
+        # the surface may have been changed outside any renderer (e.g., cleared between trials)
+        self._full_present_pending = True
+
     def run(self):
         elapsed_time = 0
         for item in self.trial:
@@ -50,32 +95,94 @@ class SerialTrialRunner(object):
             except InterruptedError as exc:
                 raise exc
             finally:
-                item.post(time=item_time, elapsed_time=elapsed_time, pre_out=pre_out)
+                item.post(time=item_time, elapsed_time=elapsed_time, pre_out=pre_out, timeline=self.timeline)
 
         return elapsed_time
 
     def _execute_item(self, item, runner):
-        elapsed_time = 0
+        if runner.idle_wait and (item.duration or constants.MAX_DURATION) >= constants.IDLE_WAIT_THRESHOLD:
+            return self._wait_on_item(item)
 
         terminated = False
+        timer = sperling.timing.ItemTimer(item.name)
 
-        while not terminated and elapsed_time <= (item.duration or constants.MAX_DURATION):
+        # first frame of an item is always drawn in full
+        item.invalidate()
+
+        runner.scheduler.begin(item)
+        while not terminated and not runner.scheduler.expired():
             terminated = self._process_events(item)
 
             # Render surface updates
-            item.render(self.surface)
+            if self._present(item):
+                timer.flipped()
 
-            elapsed_time += self.clock.get_time()
+            runner.scheduler.tick()
 
-            # Advance clock
-            self.clock.tick(runner.fps)
+        self.timeline.append(timer.finish())
 
-        return elapsed_time
+        return runner.scheduler.elapsed()
+
+    def _wait_on_item(self, item):
+        """Executes an item by sleeping until input arrives or its duration expires
+
+        Frames are only rendered on wake up; with RENDER_DIRTY they are only presented when an event handler
+        changed what is displayed.
+        """
+        terminated = False
+        timer = sperling.timing.ItemTimer(item.name)
+
+        start_time = time.perf_counter()
+        deadline = start_time + (item.duration or constants.MAX_DURATION) / 1000
+
+        item.invalidate()
+
+        while True:
+            if self._present(item):
+                timer.flipped()
+
+            timeout = deadline - time.perf_counter()
+            if terminated or timeout <= 0:
+                break
+
+            terminated = self._process_events(item, events=view.wait_for_events(timeout * 1000))
+
+        self.timeline.append(timer.finish())
+
+        return int(round((time.perf_counter() - start_time) * 1000))
+
+    def _present(self, item):
+        """Renders and presents a frame for the item
+
+        :return: True if a frame was presented
+        """
+        if self.render_mode == constants.RENDER_DIRTY:
+            dirty_rects = item.draw(self.surface)
+
+            # unchanged frames are not presented
+            if dirty_rects is not None and not dirty_rects:
+                return False
+
+            # (renderers returning None presented themselves)
+            if dirty_rects is not None:
+                if self._full_present_pending:
+                    pygame.display.flip()
+                    self._full_present_pending = False
+                else:
+                    pygame.display.update(dirty_rects)
+        else:
+            item.render(self.surface)
+
+        if self.on_frame is not None:
+            with sperling.headless.frame_view(self.surface) as frame:
+                self.on_frame(frame, item)
+
+        return True
 
-    def _process_events(self, item):
+    def _process_events(self, item, events=None):
         is_terminal_event = False
 
-        for event in pygame.event.get():
+        for event in (pygame.event.get() if events is None else events):
             # global termination events
             if view.is_terminal_event(event):
                 raise InterruptedError('User terminated experiment')
@@ -90,9 +197,75 @@ class SerialTrialRunner(object):
         return is_terminal_event
 
 
+class SimulatedTrialRunner(SerialTrialRunner):
+    # items are never presented, so experiments skip pre-composing their frames
+    presents_frames = False
+
+    def __init__(self, trial, clock, surface, fps, responder, render=False, on_frame=None):
+        """Runs a trial on a virtual clock with input from a programmatic responder instead of the event queue
+
+        Each item's time is advanced straight to the responder's next event or to the item's deadline, so trials
+        take no wall-clock time beyond the work needed to process them.
+
+        :param trial (list): the trial's items
+        :param clock (VirtualClock): virtual clock shared across trials (a new one is created for any other clock)
+        :param surface (pygame.Surface): the surface rendered to when render is True
+        :param fps (int): unused; frames are not paced
+        :param responder (callable): called as responder(item, runner) at the onset of every item (see
+            sperling.simulation.SimulatedSubject); returns an iterable of (delay, event) pairs, with delays (in ms)
+            relative to the item's onset
+        :param render (bool): render items to the surface (without presenting them) so responders can inspect them
+        :param on_frame (callable): called as on_frame(frame, item) with a NumPy view of every rendered frame
+        """
+        if not isinstance(clock, sperling.timing.VirtualClock):
+            clock = sperling.timing.VirtualClock()
+
+        super().__init__(trial, clock, surface, fps, on_frame=on_frame)
+
+        self.responder = responder
+        self.render = render
+
+    def _execute_item(self, item, runner):
+        timer = sperling.timing.ItemTimer(item.name, now_ns=self.clock.now_ns)
+
+        onset = self.clock.now()
+        deadline = onset + (item.duration or constants.MAX_DURATION)
+
+        item.invalidate()
+        self._draw(item, timer)
+
+        terminated = False
+        for delay, event in sorted(self.responder(item, self) or [], key=lambda response: response[0]):
+            if onset + delay > deadline:
+                break
+
+            self.clock.advance_to(onset + delay)
+
+            terminated = self._process_events(item, events=[event])
+            self._draw(item, timer)
+
+            if terminated:
+                break
+
+        if not terminated:
+            self.clock.advance_to(deadline)
+
+        self.timeline.append(timer.finish())
+
+        return self.clock.now() - onset
+
+    def _draw(self, item, timer):
+        if self.render and item.draw(self.surface) != []:
+            timer.flipped()
+
+            if self.on_frame is not None:
+                with sperling.headless.frame_view(self.surface) as frame:
+                    self.on_frame(frame, item)
+
+
 class TrialItem(object):
     def __init__(self, name, renderer, event_processor=sperling.constants.NO_OP, pre=sperling.constants.NO_OP,
-                 post=sperling.constants.NO_OP, duration=constants.MAX_DURATION):
+                 post=sperling.constants.NO_OP, duration=constants.MAX_DURATION, static=False):
         self.name = name
         self.renderer = renderer
         self.event_processor = event_processor
@@ -100,6 +273,9 @@ class TrialItem(object):
         self.post = post
         self.duration = duration
 
+        # static items show the same pixels on every frame and can be pre-composed
+        self.static = static
+
         self._validate()
 
     def _validate(self):
@@ -121,6 +297,25 @@ class TrialItem(object):
     def render(self, *args, **kwargs):
         self.renderer(args, kwargs)
 
+    def draw(self, surface):
+        """Renders pending changes without presenting them
+
+        Renderers without damage tracking (plain callables) present themselves, in which case None is returned.
+
+        :return: list of dirty rects to present, or None
+        """
+        draw = getattr(self.renderer, 'draw', None)
+        if draw is None:
+            self.renderer(surface)
+            return None
+
+        return draw(surface)
+
+    def invalidate(self):
+        invalidate = getattr(self.renderer, 'invalidate', None)
+        if invalidate is not None:
+            invalidate()
+
     def process_event(self, event):
         return self.event_processor(event)
 
@@ -128,8 +323,132 @@ class TrialItem(object):
 GridSpec = collections.namedtuple('GridSpec', ['n_rows', 'n_columns', 'charset', 'allow_repeats'])
 
 
+class Grid(object):
+    __slots__ = ('cells',)
+
+    def __init__(self, cells):
+        """A rectangular grid of characters stored as one byte per cell
+
+        Grids index like the nested lists of characters they replace (grid[i][j], len(grid), iteration over rows),
+        and compare equal to them.
+
+        :param cells (numpy.ndarray): a 2d uint8 array of character codes; used as is, not copied
+        """
+        self.cells = cells
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Creates a grid from a list of rows (lists of characters or strings)"""
+        return cls(np.array([[ord(char) for char in row] for row in rows], dtype=np.uint8))
+
+    @classmethod
+    def full(cls, n_rows, n_columns, char):
+        return cls(np.full((n_rows, n_columns), ord(char), dtype=np.uint8))
+
+    @classmethod
+    def frombytes(cls, data, n_rows, n_columns):
+        """Creates a grid that shares the memory of a bytes-like object (see tobytes)"""
+        return cls(np.frombuffer(data, dtype=np.uint8, count=n_rows * n_columns).reshape(n_rows, n_columns))
+
+    def tobytes(self):
+        return self.cells.tobytes()
+
+    @property
+    def n_rows(self):
+        return self.cells.shape[0]
+
+    @property
+    def n_columns(self):
+        return self.cells.shape[1]
+
+    def row(self, index):
+        """A single row grid sharing this grid's memory (e.g., the cued row of a partial report trial)"""
+        return Grid(self.cells[index:index + 1])
+
+    def matches(self, other):
+        """Element-wise equality with a grid of the same shape
+
+        :return: bool array of shape (n_rows, n_columns)
+        """
+        other = other if isinstance(other, Grid) else Grid.from_rows(other)
+        return self.cells == other.cells
+
+    def tolist(self):
+        return [row.tolist() for row in self]
+
+    def copy(self):
+        return Grid(self.cells.copy())
+
+    def __len__(self):
+        return self.n_rows
+
+    def __getitem__(self, index):
+        # slices are lists of rows, as they were when grids were lists
+        if isinstance(index, slice):
+            return [GridRow(cells) for cells in self.cells[index]]
+
+        return GridRow(self.cells[index])
+
+    def __iter__(self):
+        return (GridRow(cells) for cells in self.cells)
+
+    def __eq__(self, other):
+        if isinstance(other, Grid):
+            return self.cells.shape == other.cells.shape and bool((self.cells == other.cells).all())
+
+        if isinstance(other, list):
+            return self.tolist() == [list(row) for row in other]
+
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return 'Grid({})'.format(self.tolist())
+
+
+class GridRow(object):
+    __slots__ = ('cells',)
+
+    def __init__(self, cells):
+        """A view of a single row of a Grid; assigning a character updates the grid"""
+        self.cells = cells
+
+    def tolist(self):
+        return [chr(code) for code in self.cells]
+
+    def __len__(self):
+        return len(self.cells)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return self.tolist()[index]
+
+        return chr(self.cells[index])
+
+    def __setitem__(self, index, char):
+        self.cells[index] = ord(char)
+
+    def __iter__(self):
+        return iter(self.tolist())
+
+    def __eq__(self, other):
+        if isinstance(other, GridRow):
+            return self.tolist() == other.tolist()
+
+        if isinstance(other, (list, str)):
+            return self.tolist() == list(other)
+
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(self.tolist())
+
+
 class GridGenerator:
-    def __init__(self, n_rows, n_columns, charset, allow_repeats=True):
+    def __init__(self, n_rows, n_columns, charset, allow_repeats=True, seed=None):
         self.n_rows = n_rows
         self.n_columns = n_columns
         self.charset = charset
@@ -141,10 +460,52 @@ class GridGenerator:
         if self.n_columns <= 0:
             raise ValueError('Invalid Number of CharacterGrid Columns: Must be > 0.')
 
+        self.rng = np.random.default_rng(seed)
+
+        # sorted so that the same seed produces the same grids regardless of string hash randomization
+        self._codes = np.array(sorted(ord(char) for char in set(self.charset)), dtype=np.uint8)
+
+        # single grids are served from a pool of pre-generated grids, refilled in bulk when it runs out
+        self._pool = None
+        self._pool_index = 0
+
     def __call__(self, *args, **kwargs):
-        chars = random.choices(list(self.charset), k=self.n_rows * self.n_columns) \
-            if self.allow_repeats else random.sample(self.charset, k=self.n_rows * self.n_columns)
-        return [chars[i * self.n_columns:(i + 1) * self.n_columns] for i in range(self.n_rows)]
+        if self._pool is None or self._pool_index == len(self._pool):
+            self._pool = self.generate_cells(sperling.constants.GRID_POOL_SIZE)
+            self._pool_index = 0
+
+        self._pool_index += 1
+        return Grid(self._pool[self._pool_index - 1])
+
+    def generate(self, n_grids, rng=None):
+        """Generates many grids at once
+
+        :param n_grids (int): the number of grids
+        :param rng (numpy.random.Generator): the random number generator (defaults to the generator's own)
+        :return: list of Grids (views of a single array)
+        """
+        return [Grid(cells) for cells in self.generate_cells(n_grids, rng)]
+
+    def generate_cells(self, n_grids, rng=None):
+        """Generates the character codes of many grids at once
+
+        :param n_grids (int): the number of grids
+        :param rng (numpy.random.Generator): the random number generator (defaults to the generator's own)
+        :return: uint8 array of shape (n_grids, n_rows, n_columns)
+        """
+        rng = rng or self.rng
+        n_cells = self.n_rows * self.n_columns
+
+        if self.allow_repeats:
+            indices = rng.integers(len(self._codes), size=(n_grids, n_cells))
+        else:
+            if n_cells > len(self._codes):
+                raise ValueError('charset is too small for a grid without repeats')
+
+            # the first n_cells of a random permutation of the charset, drawn for every grid at once
+            indices = rng.random((n_grids, len(self._codes))).argsort(axis=1)[:, :n_cells]
+
+        return self._codes[indices].reshape(n_grids, self.n_rows, self.n_columns)
 
     def __str__(self):
         return 'n_rows: {}, n_columns: {}, charset: {}, allow_repeats: {}'.format(self.n_rows,
@@ -172,24 +533,38 @@ class GridGenerator:
         return GridGenerator(n_rows=n_rows, n_columns=n_columns, charset=charset, allow_repeats=allow_repeats)
 
 
+# A single trial's result, as read back from a sperling.results.ResultStore. timeline is the trial's list of
+# sperling.timing.ItemTiming; cue_index is None for whole report trials.
 ResponseEntry = collections.namedtuple('ResponseEntry',
-                                       ['response_time', 'actual_response', 'correct_response', 'durations'])
+                                       ['response_time', 'actual_response', 'correct_response', 'durations',
+                                        'timeline', 'grid_spec', 'cue_index'], defaults=(None, None, None))
 
 
 class ResponseProcessor(object):
-    def __init__(self, correct, actual, experiment):
+    def __init__(self, correct, actual, experiment, grid_spec=None, cue_index=None, durations=None):
         self.correct = correct
         self.actual = actual
         self.experiment = experiment
+        self.grid_spec = grid_spec
+        self.cue_index = cue_index
+
+        # the durations the trial was presented with (its plan's); defaults to the experiment's
+        self.durations = durations
 
     def __call__(self, *args, **kwargs):
-        entry = ResponseEntry(
+        # the grids and durations are copied into the experiment's result columns
+        durations = self.durations if self.durations is not None else self.experiment.durations
+        self.experiment.results.append(
             response_time=kwargs['time'],
-            actual_response=copy.deepcopy(self.actual),
-            correct_response=copy.deepcopy(self.correct),
-            durations=self.experiment.durations
+            actual_response=self.actual,
+            correct_response=self.correct,
+            durations=durations,
+            timeline=kwargs.get('timeline'),
+            grid_spec=self.grid_spec,
+            cue_index=self.cue_index
         )
-        self.experiment.results.append(entry)
+        self.experiment.statistics.update(self.correct, self.actual, durations,
+                                          grid_spec=self.grid_spec, cue_index=self.cue_index)
 
 
 def n_correct(result):
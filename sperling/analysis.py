@@ -0,0 +1,264 @@
+import collections
+import math
+
+import numpy as np
+
+import sperling
+from sperling.results import MISSING
+
+# Summary of a group of trials; accuracy is the mean proportion of reported characters that were correct
+Summary = collections.namedtuple('Summary', ['n_trials', 'accuracy', 'letters_available'])
+
+
+def as_store(results):
+    """Returns results as a ResultStore, copying them into one if they are ResponseEntries"""
+    if isinstance(results, sperling.results.ResultStore):
+        return results
+
+    results = list(results)
+    store = sperling.results.ResultStore(item_names=list(results[0].durations) if results else [],
+                                         capacity=max(1, len(results)))
+    for result in results:
+        store.append(*result)
+
+    return store
+
+
+def correct_mask(results):
+    """Which characters of every trial's response were correct
+
+    :return: bool array of shape (n_trials, rows, columns); False outside each trial's grid
+    """
+    results = as_store(results)
+    correct = results.column('correct')
+    return (correct == results.column('actual')) & (correct != b'')
+
+
+def n_correct(results):
+    """Number of correctly reported characters per trial (vectorized sperling.n_correct)"""
+    return correct_mask(results).sum(axis=(1, 2))
+
+
+def accuracy(results):
+    """Proportion of correctly reported characters per trial"""
+    results = as_store(results)
+    return n_correct(results) / (results.column('n_rows').astype(int) * results.column('n_columns'))
+
+
+def letters_available(results):
+    """Sperling's estimate of the number of letters available to the subject, per trial
+
+    For partial report trials this is the proportion of the cued row reported correctly times the number of
+    letters in the whole stimulus; for whole report trials it is the number of letters reported correctly.
+    """
+    results = as_store(results)
+
+    # letters in the stimulus, falling back on the response grid when the grid spec was not recorded
+    spec_letters = np.array([spec.n_rows * spec.n_columns for spec in results.grid_specs] + [0])
+    n_letters = spec_letters[results.column('spec')].astype(int)
+
+    is_cued = results.column('cue') != MISSING
+    missing_spec = results.column('spec') == MISSING
+    n_letters[missing_spec] = (results.column('n_rows')[missing_spec].astype(int) *
+                               results.column('n_columns')[missing_spec])
+
+    return np.where(is_cued, accuracy(results) * n_letters, n_correct(results))
+
+
+def stimulus_rows(results):
+    """The stimulus row of each row of every trial's response (the cued row, for partial report trials)
+
+    :return: int array of shape (n_trials, rows)
+    """
+    results = as_store(results)
+    rows = np.broadcast_to(np.arange(results.column('correct').shape[1]), results.column('correct').shape[:2])
+
+    cue = results.column('cue').astype(int)[:, np.newaxis]
+    return np.where(cue == MISSING, rows, cue + rows)
+
+
+def position_accuracy(results):
+    """Accuracy at each position of the stimulus, over every trial in which that position was reported
+
+    :return: float array of shape (rows, columns); NaN for positions that were never reported
+    """
+    results = as_store(results)
+    correct = results.column('correct')
+    n_trials, n_rows, n_columns = correct.shape
+
+    reported = correct != b''
+    rows = np.broadcast_to(stimulus_rows(results)[:, :, np.newaxis], correct.shape)
+    positions = rows * n_columns + np.arange(n_columns)
+
+    n_stimulus_rows = int(rows[reported].max()) + 1 if reported.any() else 0
+    size = n_stimulus_rows * n_columns
+
+    n_reported = np.bincount(positions[reported], minlength=size)
+    n_hits = np.bincount(positions[correct_mask(results)], minlength=size)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (n_hits / n_reported).reshape(n_stimulus_rows, n_columns)
+
+
+def row_accuracy(results):
+    """Accuracy of each row of the stimulus, over every trial in which that row was reported
+
+    :return: float array with one entry per stimulus row; NaN for rows that were never reported
+    """
+    results = as_store(results)
+    correct = results.column('correct')
+
+    reported = (correct != b'').sum(axis=2)
+    hits = correct_mask(results).sum(axis=2)
+    rows = stimulus_rows(results)
+
+    has_row = reported > 0
+    n_stimulus_rows = int(rows[has_row].max()) + 1 if has_row.any() else 0
+
+    n_reported = np.bincount(rows[has_row], weights=reported[has_row], minlength=n_stimulus_rows)
+    n_hits = np.bincount(rows[has_row], weights=hits[has_row], minlength=n_stimulus_rows)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return n_hits / n_reported
+
+
+def summarize(results, groups=None):
+    """Summarizes trials, optionally per group
+
+    :param results (ResultStore): the results
+    :param groups (array): a group key per trial
+    :return: a Summary of all trials, or a dict mapping each group key to the Summary of its trials
+    """
+    results = as_store(results)
+    trial_accuracy = accuracy(results)
+    trial_letters = letters_available(results)
+
+    if groups is None:
+        return Summary(n_trials=len(results), accuracy=float(trial_accuracy.mean()),
+                       letters_available=float(trial_letters.mean()))
+
+    keys, inverse = np.unique(groups, return_inverse=True)
+    n_trials = np.bincount(inverse, minlength=len(keys))
+    accuracy_sums = np.bincount(inverse, weights=trial_accuracy, minlength=len(keys))
+    letters_sums = np.bincount(inverse, weights=trial_letters, minlength=len(keys))
+
+    return {key.item(): Summary(n_trials=int(n), accuracy=float(accuracy_sum / n),
+                             letters_available=float(letters_sum / n))
+            for key, n, accuracy_sum, letters_sum in zip(keys, n_trials, accuracy_sums, letters_sums)}
+
+
+def by_spec(results):
+    """Summaries per grid spec
+
+    :return: list of (GridSpec, Summary) pairs (grid specs are not hashable)
+    """
+    results = as_store(results)
+    summaries = summarize(results, results.column('spec'))
+
+    return [(None if spec == MISSING else results.grid_specs[spec], summary) for spec, summary in summaries.items()]
+
+
+def by_duration(results, item_name):
+    """Summaries per duration of an item (e.g., sperling.constants.STIMULUS)
+
+    :return: dict mapping each duration (in ms) to a Summary
+    """
+    results = as_store(results)
+    return summarize(results, results.column('durations')[:, results.item_names.index(item_name)])
+
+
+class RunningStatistic(object):
+    def __init__(self):
+        """Mean and variance of a stream of values, updated in O(1) per value (Welford's algorithm)"""
+        self.n = 0
+        self.mean = 0.0
+        self._sum_of_squares = 0.0
+
+    def update(self, value):
+        self.n += 1
+
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self._sum_of_squares += delta * (value - self.mean)
+
+    @property
+    def variance(self):
+        """The sample variance (NaN for fewer than two values)"""
+        return self._sum_of_squares / (self.n - 1) if self.n > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def sem(self):
+        """The standard error of the mean"""
+        return self.std / math.sqrt(self.n) if self.n > 1 else math.nan
+
+
+class OnlineStatistics(object):
+    def __init__(self):
+        """Running accuracy statistics of a session, queryable while it runs
+
+        Every trial's accuracy (the proportion of reported characters that were correct) is accumulated overall, per
+        grid spec and per duration condition; each reported row's accuracy is accumulated per stimulus row.
+        """
+        self.overall = RunningStatistic()
+        self.by_spec = collections.defaultdict(RunningStatistic)
+        self.by_row = collections.defaultdict(RunningStatistic)
+        self.by_duration = collections.defaultdict(RunningStatistic)
+
+    @staticmethod
+    def spec_key(grid_spec):
+        """The key of a grid spec in by_spec (grid specs hold a charset set and are not hashable)"""
+        return grid_spec._replace(charset=frozenset(grid_spec.charset))
+
+    @staticmethod
+    def duration_key(durations):
+        """The key of a duration condition in by_duration"""
+        return tuple(sorted(durations.items()))
+
+    def update(self, correct, actual, durations, grid_spec=None, cue_index=None):
+        """Adds a trial
+
+        :param correct (list): the expected response grid (list of rows)
+        :param actual (list): the response grid (list of rows)
+        :param durations (dict): item names mapped to their durations (in ms)
+        :param grid_spec (GridSpec): the trial's grid spec
+        :param cue_index (int): the trial's cued row, for partial report trials
+        """
+        if isinstance(correct, sperling.Grid):
+            hits_per_row = correct.matches(actual).sum(axis=1).tolist()
+        else:
+            hits_per_row = [sum(1 for c, a in zip(correct_row, actual_row) if c == a)
+                            for correct_row, actual_row in zip(correct, actual)]
+
+        for i, (row_hits, correct_row) in enumerate(zip(hits_per_row, correct)):
+            self.by_row[i if cue_index is None else cue_index + i].update(row_hits / len(correct_row))
+
+        trial_accuracy = sum(hits_per_row) / sum(len(row) for row in correct)
+
+        self.overall.update(trial_accuracy)
+        self.by_duration[self.duration_key(durations)].update(trial_accuracy)
+        if grid_spec is not None:
+            self.by_spec[self.spec_key(grid_spec)].update(trial_accuracy)
+
+    def clear(self):
+        for statistics in (self.by_spec, self.by_row, self.by_duration):
+            statistics.clear()
+
+        self.overall = RunningStatistic()
+
+
+class Convergence(object):
+    def __init__(self, tolerance, min_trials=sperling.constants.CONVERGENCE_MIN_TRIALS):
+        """A stopping rule for Experiment.run: stops once the standard error of the mean accuracy is small enough
+
+        :param tolerance (float): the largest acceptable standard error
+        :param min_trials (int): the number of trials run before the rule can stop an experiment
+        """
+        self.tolerance = tolerance
+        self.min_trials = min_trials
+
+    def __call__(self, statistics):
+        return statistics.overall.n >= self.min_trials and statistics.overall.sem <= self.tolerance
@@ -11,6 +11,43 @@ YELLOW = 255, 255, 0
 MAX_DURATION = 60000  # ms
 DEFAULT_FPS = 30
 
+# Frame-locked presentation
+DEFAULT_REFRESH_RATE = 60  # Hz; assumed when flips are not vsync-aligned
+REFRESH_RATE_SAMPLES = 30  # flip intervals sampled when measuring the refresh rate
+MIN_REFRESH_INTERVAL = 2  # ms; shorter flip intervals indicate flips are not vsync-aligned
+FRAME_TOLERANCE = 1  # ms
+
+# Items lasting at least this long (ms) block on input instead of polling every frame when idle waiting is enabled
+IDLE_WAIT_THRESHOLD = 1000
+
+# Simulated subjects (in millis)
+SIMULATED_REACTION_TIME = 300
+SIMULATED_KEY_INTERVAL = 100
+
+# Parameter sweeps (display size and font size of each worker's headless display)
+SWEEP_SCREEN_SIZE = 1024, 768
+SWEEP_FONT_SIZE = 48
+
+# Render modes
+RENDER_FULL = 'full'  # redraw and flip the whole display every frame
+RENDER_DIRTY = 'dirty'  # redraw and update only damaged regions
+
+# Headless rendering (SDL video driver without a window, and display depth of captured frames)
+HEADLESS_VIDEO_DRIVER = 'dummy'
+HEADLESS_DEPTH = 32
+
+# Number of trials a result store is allocated for before it first grows
+RESULTS_INITIAL_CAPACITY = 64
+
+# Fewest trials after which a converged experiment may stop early
+CONVERGENCE_MIN_TRIALS = 20
+
+# Number of grids a GridGenerator generates at a time
+GRID_POOL_SIZE = 256
+
+# Maximum number of rasterized glyphs retained by the glyph atlas
+GLYPH_ATLAS_SIZE = 512
+
 FIXATION = 'FIXATION'
 POST_FIXATION_MASK = 'POST_FIXATION_MASK'
 STIMULUS = 'STIMULUS'
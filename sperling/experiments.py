@@ -1,13 +1,15 @@
 import sperling
 import pygame
-import random
 import collections
 
 from sperling.view import Dimensions
 
+# Screen positions (top-left) of a trial's grids; cue_pos is None for whole report trials
+TrialLayout = collections.namedtuple('TrialLayout', ['stimulus_pos', 'cue_pos', 'response_pos'])
+
 
 class Experiment(object):
-    def __init__(self, screen, font, duration_overrides=None, n_trials=1):
+    def __init__(self, screen, font, duration_overrides=None, n_trials=1, template=None, seed=None, plan=None):
         self.screen = screen
         self.font = font
         self.durations = collections.defaultdict(int)
@@ -15,254 +17,256 @@ class Experiment(object):
         self.durations.update(duration_overrides or dict())
         self.n_trials = n_trials
 
-        self.trial_items = list()
-        self.results = list()
-
-    def reset(self):
-        self.results = self.results.clear()
+        # compiled on first use, then only the trial's grid and cue are substituted into it
+        self.template = template
+        self._compiled_template = None
 
-    def _pre_run(self):
-        pass
+        # candidate grid specs; the session plan draws one per session
+        self.grid_specs = []
 
-    def _post_run(self):
-        pass
-
-    def generate_grid(self):
-        pass
-
-    def run(self, fps=sperling.constants.DEFAULT_FPS):
-
-        elapsed_time = 0
-        for trail in range(self.n_trials):
-            self._pre_run()
-
-            runner = sperling.SerialTrialRunner(
-                trial=self.trial_items,
-                clock=pygame.time.Clock(),
-                surface=self.screen,
-                fps=fps)
-
-            try:
-                elapsed_time += runner.run()
-            except InterruptedError as exc:
-                raise exc
-            finally:
-                self._post_run()
-
-        return elapsed_time
+        # every trial's content, compiled up front from the seed on first use unless one is given
+        self.seed = seed
+        self.plan = plan
 
+        self.trial_items = list()
+        self.response_grid = None
 
-class Experiment1(Experiment):
-    def __init__(self, screen, font, grid_spec=None, duration_overrides=None, n_trials=1):
-        super().__init__(screen, font, duration_overrides, n_trials)
+        item_names = [item.name for item in self.template.items] if self.template is not None else []
+        self.results = sperling.results.ResultStore(item_names=item_names)
 
-        self._grid_specs = [
-            # single row with 3-7 consonants
-            *[sperling.GridSpec(n_rows=1, n_columns=n_cols, charset=sperling.constants.CONSONANTS, allow_repeats=True)
-              for n_cols in range(3, 7 + 1)],
+        # accuracy statistics, updated as each trial's response is processed
+        self.statistics = sperling.analysis.OnlineStatistics()
 
-            # 3/3
-            sperling.GridSpec(n_rows=2, n_columns=3, charset=sperling.constants.CONSONANTS, allow_repeats=True),
+        # font metrics are read once, rather than per trial layout
+        self._char_dims = Dimensions(*self.font.size('A'))  # Assumes fixed-size font
 
-            # 4/4
-            sperling.GridSpec(n_rows=2, n_columns=4, charset=sperling.constants.CONSONANTS, allow_repeats=True),
+        self._trial_index = 0
 
-            # 3/3/3
-            sperling.GridSpec(n_rows=3, n_columns=3, charset=sperling.constants.CONSONANTS, allow_repeats=True),
-        ]
+        # (index, plan, items) of the next trial, built while the current trial's feedback is displayed
+        self._next_trial = None
 
-        self._grid_spec = grid_spec or random.choice(self._grid_specs)
-        self._grid_generator = sperling.GridGenerator(n_rows=self._grid_spec.n_rows,
-                                                      n_columns=self._grid_spec.n_columns,
-                                                      charset=self._grid_spec.charset,
-                                                      allow_repeats=self._grid_spec.allow_repeats)
+        # static items are only pre-composed for runners that present frames
+        self._compose_frames = True
 
-    def generate_grid(self):
-        return self._grid_generator()
+    def reset(self):
+        self.results.clear()
+        self.statistics.clear()
 
     def _pre_run(self):
         self.trial_items.clear()
 
-        screen_dims = sperling.view.Dimensions(*self.screen.get_size())
+        # experiments without a template run empty trials
+        if self.template is None:
+            return None
+
+        if self._next_trial is not None and self._next_trial[0] == self._trial_index:
+            _, plan, items = self._next_trial
+        else:
+            plan, items = self._build_trial(self._trial_index)
+        self._next_trial = None
 
         # clear display
         self.screen.fill(sperling.constants.BLACK)
 
-        # 1 - fixation period on crosshairs (advance on ENTER)
-        crosshairs_width = max(screen_dims) // 10
-        crosshairs = sperling.view.CrossHairs(
-            size=crosshairs_width,
-            color=sperling.constants.WHITE)
-
-        crosshairs.rect.x = (screen_dims.width - crosshairs_width) // 2
-        crosshairs.rect.y = (screen_dims.height - crosshairs_width) // 2
-
-        item1 = sperling.TrialItem(
-            name=sperling.constants.FIXATION,
-            renderer=sperling.view.SpriteRenderer(self.screen, crosshairs),
-            event_processor=sperling.view.WaitUntilKeyHandler(pygame.K_RETURN),
-            duration=self.durations[sperling.constants.FIXATION])
-        self.trial_items.append(item1)
-
-        # 2 - pre-stimulus mask
-        item2 = sperling.TrialItem(
-            name=sperling.constants.POST_FIXATION_MASK,
-            renderer=sperling.view.MaskRenderer(self.screen, color=sperling.constants.BLACK),
-            duration=self.durations[sperling.constants.POST_FIXATION_MASK])
-        self.trial_items.append(item2)
-
-        # 3 - grid stimulus
-        stimulus_grid = self.generate_grid()
-
-        char_grid = sperling.view.CharacterGrid(grid=stimulus_grid, font=self.font)
-
-        x = (screen_dims.width - char_grid.image.get_width()) // 2
-        y = (screen_dims.height - char_grid.image.get_height()) // 2
-
-        item3 = sperling.TrialItem(
-            name=sperling.constants.STIMULUS,
-            renderer=sperling.view.GridRenderer(surface=self.screen, grid=char_grid, pos=(x, y)),
-            duration=self.durations[sperling.constants.STIMULUS])
-        self.trial_items.append(item3)
-
-        # 4 = response grid (advance on ENTER)
-        self.response_grid = [['?'] * len(stimulus_grid[0]) for _ in range(len(stimulus_grid))]
-
-        char_grid = sperling.view.CharacterGrid(grid=self.response_grid, font=self.font)
-
-        response_grid_vert_offset = (screen_dims.height - char_grid.image.get_height()) // 2.5
-
-        x = (screen_dims.width - char_grid.image.get_width()) // 2
-        y = (screen_dims.height - char_grid.image.get_height()) // 2 + response_grid_vert_offset
+        self.trial_items.extend(items)
 
-        response_renderer = sperling.view.GridRenderer(surface=self.screen, grid=char_grid, pos=(x, y))
-        response_event_processor = sperling.view.GridEventHandler(
-            grid=char_grid, view=response_renderer, terminal_event=pygame.K_RETURN)
-        response_post_processor = sperling.ResponseProcessor(correct=stimulus_grid, actual=self.response_grid,
-                                                             experiment=self)
+        # the grid the subject's response is typed into
+        self.response_grid = next((item.post.actual for item in self.trial_items
+                                   if isinstance(item.post, sperling.ResponseProcessor)), None)
 
-        item4 = sperling.TrialItem(
-            name=sperling.constants.RESPONSE,
-            renderer=response_renderer, event_processor=response_event_processor, post=response_post_processor,
-            duration=self.durations[sperling.constants.RESPONSE])
-        self.trial_items.append(item4)
+        trial_info = {'grid generator': plan.grid_spec, 'grid': plan.grid}
+        if plan.cue_index is not None:
+            trial_info['cue_index'] = plan.cue_index
 
-        # 5 = feedback grid (advance on ENTER)
-        feedback_renderer = sperling.view.FeedbackGridRenderer(
-            surface=self.screen, grid=char_grid, correct=stimulus_grid,
-            actual=self.response_grid)
+        return trial_info
 
-        item5 = sperling.TrialItem(
-            name=sperling.constants.FEEDBACK,
-            renderer=feedback_renderer,
-            event_processor=sperling.view.WaitUntilKeyHandler(pygame.K_RETURN),
-            duration=self.durations[sperling.constants.FEEDBACK])
-        self.trial_items.append(item5)
-
-        return {'grid generator': self._grid_spec, 'grid': stimulus_grid}
-
-
-class Experiment2(Experiment):
-    def __init__(self, screen, font, duration_overrides=None, n_trials=1):
-        super().__init__(screen, font, duration_overrides, n_trials)
-
-        self._grid_spec = sperling.GridSpec(n_rows=2, n_columns=3, charset=sperling.constants.CONSONANTS,
-                                            allow_repeats=True)
-        self._grid_generator = sperling.GridGenerator(n_rows=self._grid_spec.n_rows,
-                                                      n_columns=self._grid_spec.n_columns,
-                                                      charset=self._grid_spec.charset,
-                                                      allow_repeats=self._grid_spec.allow_repeats)
+    def _post_run(self):
+        pass
 
     def generate_grid(self):
-        return self._grid_generator()
-
-    def _pre_run(self):
-        self.trial_items.clear()
-
-        screen_dims = sperling.view.Dimensions(*self.screen.get_size())
+        """The current trial's grid, drawn from the session plan (None for experiments without grid specs)"""
+        if self.plan is None and not self.grid_specs:
+            return None
+
+        return self._get_plan()[self._trial_index].grid
+
+    def compile_plan(self, seed=None):
+        """Generates the content of every trial up front (see sperling.plan.SessionPlan)"""
+        self.plan = sperling.plan.SessionPlan.compile(self, seed=seed)
+        return self.plan
+
+    def _get_plan(self):
+        if self.plan is None:
+            self.compile_plan(self.seed)
+
+        if len(self.plan) < self.n_trials:
+            raise ValueError('plan has fewer trials ({}) than the experiment ({})'.format(len(self.plan),
+                                                                                         self.n_trials))
+
+        return self.plan
+
+    def _layout_trial(self, plan):
+        screen_dims = Dimensions(*self.screen.get_size())
+
+        def centered(dims):
+            return (screen_dims.width - dims.width) // 2, (screen_dims.height - dims.height) // 2
+
+        n_rows, n_columns = len(plan.grid), len(plan.grid[0])
+
+        stimulus_dims = sperling.view.CharacterGrid.get_dims(n_rows, n_columns, self._char_dims)
+
+        cue_pos = None
+        if plan.cue_index is not None:
+            arrow_dims = sperling.view.CharacterGridWithArrowCues.get_arrow_dims(screen_dims)
+            cue_dims = sperling.view.CharacterGridWithArrowCues.get_dims(stimulus_dims, arrow_dims)
+            cue_pos = centered(cue_dims)
+
+        # partial report trials only ask for the cued row
+        response_dims = sperling.view.CharacterGrid.get_dims(n_rows if plan.cue_index is None else 1, n_columns,
+                                                             self._char_dims)
+        response_x, response_y = centered(response_dims)
+        response_y += (screen_dims.height - response_dims.height) // 2.5
+
+        return TrialLayout(stimulus_pos=centered(stimulus_dims), cue_pos=cue_pos,
+                           response_pos=(response_x, response_y))
+
+    def _prepare_trial(self, index):
+        plan = self._get_plan()[index]
+        return plan, self._layout_trial(plan)
+
+    def _build_trial(self, index):
+        """Creates a trial's items, pre-composing the static ones for runners that present frames"""
+        plan, layout = self._prepare_trial(index)
+        items = self._get_compiled_template().instantiate(plan, layout)
+
+        if self._compose_frames:
+            self._compose_static_items(items)
+
+        return plan, items
+
+    def _prepare_next_trial(self):
+        """Builds the next trial's items ahead of time (the pre hook of feedback items), so that only the items are
+        swapped in between trials"""
+        next_index = self._trial_index + 1
+        if self._next_trial is None and next_index < self.n_trials:
+            self._next_trial = (next_index,) + self._build_trial(next_index)
+
+    def _get_compiled_template(self):
+        if self._compiled_template is None:
+            self._compiled_template = self.template.compile(self)
+
+        return self._compiled_template
+
+    def _compose_static_items(self, items):
+        """Pre-composes each static trial item into an off-screen frame so presenting it is a single blit"""
+        for item in items:
+            if item.static and not isinstance(item.renderer, sperling.view.FrameRenderer):
+                frame = sperling.view.compose_frame(item.renderer, self.screen)
+                item.renderer = sperling.view.FrameRenderer(self.screen, frame)
+
+    def run(self, fps=sperling.constants.DEFAULT_FPS, runner_cls=None, clock=None, writer=None, stop_when=None,
+            **runner_options):
+        """Runs every trial of the experiment
+
+        :param fps (int): frame rate
+        :param runner_cls (class): the trial runner (defaults to SerialTrialRunner)
+        :param clock: the clock passed to the runner (defaults to a new pygame.time.Clock per trial)
+        :param writer (ResultsWriter): receives each trial's result as soon as the trial ends
+        :param stop_when (callable): called as stop_when(statistics) after every trial; the experiment ends early
+            when it returns True (e.g., sperling.analysis.Convergence)
+        :param runner_options: additional keyword arguments for the runner
+        :return: elapsed time
+        """
+        runner_cls = runner_cls or sperling.SerialTrialRunner
+        self._compose_frames = runner_cls.presents_frames
 
-        # clear display
-        self.screen.fill(sperling.constants.BLACK)
-
-        # 1 - fixation period on crosshairs (advance on ENTER)
-        crosshairs_width = max(screen_dims) // 10
-        crosshairs = sperling.view.CrossHairs(
-            size=crosshairs_width,
-            color=sperling.constants.WHITE)
-
-        crosshairs.rect.x = (screen_dims.width - crosshairs_width) // 2
-        crosshairs.rect.y = (screen_dims.height - crosshairs_width) // 2
-
-        item1 = sperling.TrialItem(
-            name=sperling.constants.FIXATION,
-            renderer=sperling.view.SpriteRenderer(self.screen, crosshairs),
-            event_processor=sperling.view.WaitUntilKeyHandler(pygame.K_RETURN),
-            duration=self.durations[sperling.constants.FIXATION])
-        self.trial_items.append(item1)
-
-        # 2 - pre-stimulus mask
-        item2 = sperling.TrialItem(
-            name=sperling.constants.POST_FIXATION_MASK,
-            renderer=sperling.view.MaskRenderer(self.screen, color=sperling.constants.BLACK),
-            duration=self.durations[sperling.constants.POST_FIXATION_MASK])
-        self.trial_items.append(item2)
-
-        # 3 - grid stimulus
-        stimulus_grid = self.generate_grid()
+        elapsed_time = 0
 
-        char_grid = sperling.view.CharacterGrid(grid=stimulus_grid, font=self.font)
+        # all randomness is resolved before the first trial
+        if self.template is not None:
+            self._get_plan()
+
+        if writer is not None:
+            writer.begin_experiment(self)
+
+        try:
+            for trail in range(self.n_trials):
+                self._trial_index = trail
+                self._pre_run()
+
+                runner = runner_cls(
+                    trial=self.trial_items,
+                    clock=clock or pygame.time.Clock(),
+                    surface=self.screen,
+                    fps=fps,
+                    **runner_options)
+
+                n_results = len(self.results)
+                try:
+                    elapsed_time += runner.run()
+                except InterruptedError as exc:
+                    raise exc
+                finally:
+                    # the timeline recorded with the response is completed by the items that followed it
+                    if len(self.results) > n_results:
+                        self.results.set_timeline(len(self.results) - 1, runner.timeline)
+
+                        if writer is not None:
+                            writer.write(trail, self.results[-1])
+
+                    self._post_run()
+
+                if stop_when is not None and stop_when(self.statistics):
+                    break
+        finally:
+            self._trial_index = 0
+            self._next_trial = None
 
-        x = (screen_dims.width - char_grid.image.get_width()) // 2
-        y = (screen_dims.height - char_grid.image.get_height()) // 2
+        return elapsed_time
 
-        item3 = sperling.TrialItem(
-            name=sperling.constants.STIMULUS,
-            renderer=sperling.view.GridRenderer(surface=self.screen, grid=char_grid, pos=(x, y)),
-            duration=self.durations[sperling.constants.STIMULUS])
-        self.trial_items.append(item3)
 
-        # 4 = response grid (advance on ENTER)
-        self.response_grid = [['?'] * len(stimulus_grid[0]) for _ in range(len(stimulus_grid))]
+class Experiment1(Experiment):
+    def __init__(self, screen, font, grid_spec=None, duration_overrides=None, n_trials=1, template=None, seed=None,
+                 plan=None):
+        super().__init__(screen, font, duration_overrides, n_trials,
+                         template=template or sperling.templates.WHOLE_REPORT_TEMPLATE, seed=seed, plan=plan)
 
-        char_grid = sperling.view.CharacterGrid(grid=self.response_grid, font=self.font)
+        self.grid_specs = [
+            # single row with 3-7 consonants
+            *[sperling.GridSpec(n_rows=1, n_columns=n_cols, charset=sperling.constants.CONSONANTS, allow_repeats=True)
+              for n_cols in range(3, 7 + 1)],
 
-        response_grid_vert_offset = (screen_dims.height - char_grid.image.get_height()) // 2.5
+            # 3/3
+            sperling.GridSpec(n_rows=2, n_columns=3, charset=sperling.constants.CONSONANTS, allow_repeats=True),
 
-        x = (screen_dims.width - char_grid.image.get_width()) // 2
-        y = (screen_dims.height - char_grid.image.get_height()) // 2 + response_grid_vert_offset
+            # 4/4
+            sperling.GridSpec(n_rows=2, n_columns=4, charset=sperling.constants.CONSONANTS, allow_repeats=True),
 
-        response_renderer = sperling.view.GridRenderer(surface=self.screen, grid=char_grid, pos=(x, y))
-        response_event_processor = sperling.view.GridEventHandler(
-            grid=char_grid, view=response_renderer, terminal_event=pygame.K_RETURN)
-        response_post_processor = sperling.ResponseProcessor(correct=stimulus_grid, actual=self.response_grid,
-                                                             experiment=self)
+            # 3/3/3
+            sperling.GridSpec(n_rows=3, n_columns=3, charset=sperling.constants.CONSONANTS, allow_repeats=True),
+        ]
 
-        item4 = sperling.TrialItem(
-            name=sperling.constants.RESPONSE,
-            renderer=response_renderer, event_processor=response_event_processor, post=response_post_processor,
-            duration=self.durations[sperling.constants.RESPONSE])
-        self.trial_items.append(item4)
+        if grid_spec is not None:
+            self.grid_specs = [grid_spec]
 
-        # 5 = feedback grid (advance on ENTER)
-        feedback_renderer = sperling.view.FeedbackGridRenderer(
-            surface=self.screen, grid=char_grid, correct=stimulus_grid,
-            actual=self.response_grid)
 
-        item5 = sperling.TrialItem(
-            name=sperling.constants.FEEDBACK,
-            renderer=feedback_renderer,
-            event_processor=sperling.view.WaitUntilKeyHandler(pygame.K_RETURN),
-            duration=self.durations[sperling.constants.FEEDBACK])
-        self.trial_items.append(item5)
+class Experiment2(Experiment):
+    def __init__(self, screen, font, duration_overrides=None, n_trials=1, template=None, seed=None, plan=None):
+        super().__init__(screen, font, duration_overrides, n_trials,
+                         template=template or sperling.templates.WHOLE_REPORT_TEMPLATE, seed=seed, plan=plan)
 
-        return {'grid generator': self._grid_spec, 'grid': stimulus_grid}
+        self.grid_specs = [
+            sperling.GridSpec(n_rows=2, n_columns=3, charset=sperling.constants.CONSONANTS, allow_repeats=True)
+        ]
 
 
 class Experiment3(Experiment):
-    def __init__(self, screen, font, grid_spec=None, duration_overrides=None, n_trials=1):
-        super().__init__(screen, font, duration_overrides, n_trials)
+    def __init__(self, screen, font, grid_spec=None, duration_overrides=None, n_trials=1, template=None, seed=None,
+                 plan=None):
+        super().__init__(screen, font, duration_overrides, n_trials,
+                         template=template or sperling.templates.PARTIAL_REPORT_TEMPLATE, seed=seed, plan=plan)
 
-        self._grid_specs = [
+        self.grid_specs = [
 
             # 3/3
             # sperling.GridSpec(n_rows=2, n_columns=3, charset=sperling.constants.CONSONANTS, allow_repeats=True),
@@ -277,122 +281,5 @@ class Experiment3(Experiment):
             sperling.GridSpec(n_rows=3, n_columns=4, charset=sperling.constants.CONSONANTS, allow_repeats=True),
         ]
 
-        self._grid_spec = grid_spec or random.choice(self._grid_specs)
-        self._grid_generator = sperling.GridGenerator(n_rows=self._grid_spec.n_rows,
-                                                      n_columns=self._grid_spec.n_columns,
-                                                      charset=self._grid_spec.charset,
-                                                      allow_repeats=self._grid_spec.allow_repeats)
-
-    def generate_grid(self):
-        return self._grid_generator()
-
-    def _pre_run(self):
-        self.trial_items.clear()
-
-        # clear display
-        self.screen.fill(sperling.constants.BLACK)
-
-        screen_dims = sperling.view.Dimensions(*self.screen.get_size())
-
-        # 1 - fixation period on crosshairs (advance on ENTER)
-        crosshairs_width = max(screen_dims) // 10
-        crosshairs = sperling.view.CrossHairs(
-            size=crosshairs_width,
-            color=sperling.constants.WHITE)
-
-        crosshairs.rect.x = (screen_dims.width - crosshairs_width) // 2
-        crosshairs.rect.y = (screen_dims.height - crosshairs_width) // 2
-
-        item1 = sperling.TrialItem(
-            name=sperling.constants.FIXATION,
-            renderer=sperling.view.SpriteRenderer(self.screen, crosshairs),
-            event_processor=sperling.view.WaitUntilKeyHandler(pygame.K_RETURN),
-            duration=self.durations[sperling.constants.FIXATION])
-        self.trial_items.append(item1)
-
-        # 2 - pre-stimulus mask
-        item2 = sperling.TrialItem(
-            name=sperling.constants.POST_FIXATION_MASK,
-            renderer=sperling.view.MaskRenderer(self.screen, color=sperling.constants.BLACK),
-            duration=self.durations[sperling.constants.POST_FIXATION_MASK])
-        self.trial_items.append(item2)
-
-        # 3 - grid stimulus
-        stimulus_grid = self.generate_grid()
-
-        char_grid = sperling.view.CharacterGrid(grid=stimulus_grid, font=self.font)
-
-        x = (screen_dims.width - char_grid.image.get_width()) // 2
-        y = (screen_dims.height - char_grid.image.get_height()) // 2
-
-        item3 = sperling.TrialItem(
-            name=sperling.constants.STIMULUS,
-            renderer=sperling.view.GridRenderer(surface=self.screen, grid=char_grid, pos=(x, y)),
-            duration=self.durations[sperling.constants.STIMULUS])
-        self.trial_items.append(item3)
-
-        # 4 = post-stimulus mask
-        item4 = sperling.TrialItem(
-            name=sperling.constants.POST_STIMULUS_MASK,
-            renderer=sperling.view.MaskRenderer(self.screen, color=sperling.constants.BLACK),
-            duration=self.durations[sperling.constants.POST_STIMULUS_MASK])
-        self.trial_items.append(item4)
-
-        # 5 - cue
-        cue_index = random.randint(0, len(stimulus_grid) - 1)
-
-        # arrow_dims = Dimensions(width=50, height=20)
-        arrow_dims = Dimensions(width=screen_dims.width // 8, height=screen_dims.height // 28)
-        arrow_grid = sperling.view.CharacterGridWithArrowCues(char_grid, arrow_dims, cue_row=cue_index)
-
-        x = (screen_dims.width - arrow_grid.image.get_width()) // 2
-        y = (screen_dims.height - arrow_grid.image.get_height()) // 2
-
-        cue_renderer = sperling.view.GridRenderer(surface=self.screen, grid=arrow_grid, pos=(x, y))
-
-        item5 = sperling.TrialItem(
-            name=sperling.constants.CUE,
-            renderer=cue_renderer,
-            event_processor=sperling.view.WaitUntilKeyHandler(pygame.K_RETURN),
-            duration=self.durations[sperling.constants.CUE])
-        self.trial_items.append(item5)
-
-        # 6 = response grid (advance on ENTER)
-        response_grid = [['?'] * len(stimulus_grid[0])]
-
-        char_grid = sperling.view.CharacterGrid(grid=response_grid, font=self.font)
-
-        response_grid_vert_offset = (screen_dims.height - char_grid.image.get_height()) // 2.5
-
-        x = (screen_dims.width - char_grid.image.get_width()) // 2
-        y = (screen_dims.height - char_grid.image.get_height()) // 2 + response_grid_vert_offset
-
-        response_renderer = sperling.view.GridRenderer(surface=self.screen, grid=char_grid, pos=(x, y))
-        response_event_processor = sperling.view.GridEventHandler(
-            grid=char_grid, view=response_renderer, terminal_event=pygame.K_RETURN)
-
-        response_post_processor = sperling.ResponseProcessor(
-            correct=[stimulus_grid[cue_index]],
-            actual=response_grid,
-            experiment=self)
-
-        item6 = sperling.TrialItem(
-            name=sperling.constants.RESPONSE,
-            renderer=response_renderer, event_processor=response_event_processor,
-            post=response_post_processor, duration=self.durations[sperling.constants.RESPONSE])
-        self.trial_items.append(item6)
-
-        # 7 = feedback grid (advance on ENTER)
-        feedback_renderer = sperling.view.FeedbackGridRenderer(
-            surface=self.screen, grid=char_grid,
-            correct=[stimulus_grid[cue_index]],
-            actual=response_grid)
-
-        item7 = sperling.TrialItem(
-            name=sperling.constants.FEEDBACK,
-            renderer=feedback_renderer,
-            event_processor=sperling.view.WaitUntilKeyHandler(pygame.K_RETURN),
-            duration=self.durations[sperling.constants.FEEDBACK])
-        self.trial_items.append(item7)
-
-        return {'grid generator': self._grid_spec, 'grid': stimulus_grid, 'cue_index': cue_index}
+        if grid_spec is not None:
+            self.grid_specs = [grid_spec]
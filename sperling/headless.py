@@ -0,0 +1,46 @@
+import contextlib
+import os
+
+import pygame
+import pygame.surfarray
+
+import sperling.constants
+
+
+def init_display(size, depth=sperling.constants.HEADLESS_DEPTH):
+    """Initializes pygame without a window, using SDL's dummy video driver
+
+    The returned display surface is an ordinary off-screen surface: flips present nothing, but everything rendered
+    to it can be read back (see frame_view).
+
+    :param size (tuple): width and height of the display (in pixels)
+    :param depth (int): bits per pixel; frame views require 24 or 32
+    :return: the display surface (pygame.Surface)
+    """
+    driver = sperling.constants.HEADLESS_VIDEO_DRIVER
+
+    # the video driver is only chosen when the display module is initialized
+    if pygame.display.get_init() and pygame.display.get_driver() != driver:
+        pygame.display.quit()
+
+    os.environ['SDL_VIDEODRIVER'] = driver
+    pygame.init()
+
+    return pygame.display.set_mode(size, 0, depth)
+
+
+@contextlib.contextmanager
+def frame_view(surface):
+    """Exposes a surface's pixels as a NumPy array that shares the surface's memory (no copy is made)
+
+    The array has shape (height, width, 3) and is only valid inside the with block: the surface stays locked, and
+    cannot be drawn to or presented, while any reference to it exists. Copy it to keep a frame.
+
+    :param surface (pygame.Surface): a 24 or 32 bit surface
+    """
+    pixels = pygame.surfarray.pixels3d(surface)
+    try:
+        # surfarray indexes pixels by (x, y)
+        yield pixels.transpose(1, 0, 2)
+    finally:
+        del pixels
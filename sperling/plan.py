@@ -0,0 +1,158 @@
+import array
+import collections
+import json
+import struct
+
+import numpy as np
+
+import sperling.templates
+
+# Content of a single trial; grid is a sperling.Grid, cue_index is None for whole report trials and durations maps
+# item names to millis
+TrialPlan = collections.namedtuple('TrialPlan', ['grid_spec', 'grid', 'cue_index', 'durations'])
+
+# file layout: header length, JSON header, then each array in _ARRAYS order. Arrays are written with fixed size,
+# little-endian types (the in-memory typecode's size and byte order depend on the platform).
+_HEADER_FORMAT = '<I'
+_ARRAYS = (('spec_indices', 'B', '<u1'), ('cue_indices', 'b', '<i1'), ('durations', 'I', '<u4'), ('cells', 'B', '<u1'))
+
+NO_CUE = -1
+
+
+def spec_to_dict(spec):
+    # charsets are sorted so that serialized specs do not depend on string hash randomization
+    return {'n_rows': spec.n_rows, 'n_columns': spec.n_columns, 'charset': ''.join(sorted(spec.charset)),
+            'allow_repeats': spec.allow_repeats}
+
+
+def spec_from_dict(spec):
+    return sperling.GridSpec(n_rows=spec['n_rows'], n_columns=spec['n_columns'], charset=set(spec['charset']),
+                             allow_repeats=spec['allow_repeats'])
+
+
+class SessionPlan(object):
+    def __init__(self, grid_specs, item_names, spec_indices, cue_indices, durations, cells, seed=None):
+        """The content of every trial in a session, stored in flat arrays
+
+        :param grid_specs (list): the GridSpecs referenced by spec_indices
+        :param item_names (list): names of the trial items, in the order of each trial's durations
+        :param spec_indices (array): per trial index into grid_specs
+        :param cue_indices (array): per trial cued row (NO_CUE for whole report trials)
+        :param durations (array): per trial item durations (in ms), len(item_names) per trial
+        :param cells (array): character codes of every trial's grid (row-major), concatenated
+        :param seed: the seed the plan was generated from, if any
+        """
+        self.grid_specs = list(grid_specs)
+        self.item_names = list(item_names)
+        self.spec_indices = spec_indices
+        self.cue_indices = cue_indices
+        self.durations = durations
+        self.cells = cells
+        self.seed = seed
+
+        self._offsets = array.array('I', [0])
+        for spec_index in self.spec_indices:
+            spec = self.grid_specs[spec_index]
+            self._offsets.append(self._offsets[-1] + spec.n_rows * spec.n_columns)
+
+        if self._offsets[-1] != len(self.cells):
+            raise ValueError('plan cells do not match grid specs')
+
+        if len(self.durations) != len(self) * len(self.item_names):
+            raise ValueError('plan durations do not match items')
+
+    def __len__(self):
+        return len(self.spec_indices)
+
+    def __getitem__(self, index):
+        if not 0 <= index < len(self):
+            raise IndexError('trial index out of range')
+
+        spec = self.grid_specs[self.spec_indices[index]]
+
+        # the grid is a read-only view of the plan's cells
+        grid = sperling.Grid.frombytes(memoryview(self.cells)[self._offsets[index]:self._offsets[index + 1]],
+                                       spec.n_rows, spec.n_columns)
+        grid.cells.flags.writeable = False
+
+        n_items = len(self.item_names)
+        durations = dict(zip(self.item_names, self.durations[index * n_items:(index + 1) * n_items]))
+
+        cue_index = self.cue_indices[index]
+
+        return TrialPlan(grid_spec=spec, grid=grid, cue_index=None if cue_index == NO_CUE else cue_index,
+                         durations=durations)
+
+    @classmethod
+    def compile(cls, experiment, n_trials=None, seed=None):
+        """Generates the content of every trial of an experiment up front
+
+        One grid spec is drawn per session from the experiment's candidate specs, as before. Rows are cued when the
+        experiment's template contains a cue item.
+
+        :param experiment (Experiment): the experiment being planned
+        :param n_trials (int): number of trials (defaults to experiment.n_trials)
+        :param seed: seed for the plan's random number generator; the same seed always produces the same plan
+        :return: SessionPlan
+        """
+        rng = np.random.default_rng(seed)
+
+        n_trials = experiment.n_trials if n_trials is None else n_trials
+        grid_specs = experiment.grid_specs
+        if experiment.template is None or not grid_specs:
+            raise ValueError('only experiments with a trial template and grid specs can be planned')
+
+        item_names = [item.name for item in experiment.template.items]
+        is_cued = any(item.kind == sperling.templates.CUE for item in experiment.template.items)
+
+        spec_index = int(rng.integers(len(grid_specs)))
+        spec = grid_specs[spec_index]
+
+        generator = sperling.GridGenerator(spec.n_rows, spec.n_columns, spec.charset, spec.allow_repeats)
+
+        spec_indices = array.array('B', [spec_index] * n_trials)
+        cue_indices = array.array('b', [NO_CUE] * n_trials)
+        durations = array.array('I', [int(experiment.durations[name]) for name in item_names] * n_trials)
+        cells = array.array('B', generator.generate_cells(n_trials, rng).tobytes())
+
+        if is_cued:
+            cue_indices = array.array('b', rng.integers(spec.n_rows, size=n_trials).astype(np.int8).tobytes())
+
+        return cls(grid_specs, item_names, spec_indices, cue_indices, durations, cells, seed=seed)
+
+    def save(self, path):
+        header = {
+            'seed': self.seed,
+            'item_names': self.item_names,
+            'grid_specs': [spec_to_dict(spec) for spec in self.grid_specs],
+            'lengths': {name: len(getattr(self, name)) for name, _, _ in _ARRAYS}
+        }
+        header_bytes = json.dumps(header).encode('utf-8')
+
+        with open(path, 'wb') as plan_file:
+            plan_file.write(struct.pack(_HEADER_FORMAT, len(header_bytes)))
+            plan_file.write(header_bytes)
+
+            for name, _, file_dtype in _ARRAYS:
+                plan_file.write(np.asarray(getattr(self, name)).astype(file_dtype).tobytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as plan_file:
+            header_length, = struct.unpack(_HEADER_FORMAT, plan_file.read(struct.calcsize(_HEADER_FORMAT)))
+            header = json.loads(plan_file.read(header_length).decode('utf-8'))
+
+            arrays = {}
+            for name, typecode, file_dtype in _ARRAYS:
+                file_dtype = np.dtype(file_dtype)
+                length = header['lengths'][name]
+
+                values = np.frombuffer(plan_file.read(length * file_dtype.itemsize), dtype=file_dtype)
+                if len(values) != length:
+                    raise ValueError('plan file is truncated')
+
+                arrays[name] = array.array(typecode, values.tolist())
+
+        grid_specs = [spec_from_dict(spec) for spec in header['grid_specs']]
+
+        return cls(grid_specs, header['item_names'], seed=header['seed'], **arrays)
@@ -0,0 +1,443 @@
+import json
+import os
+import queue
+import struct
+import threading
+
+import numpy as np
+
+import sperling
+
+# missing values of the spec, cue and timeline columns
+MISSING = -1
+
+# timestamps (in ns) kept per trial item; see sperling.timing.ItemTiming
+TIMELINE_FIELDS = ('onset', 'first_flip', 'last_flip', 'offset')
+
+# Binary results files are a sequence of records: a (kind, payload length) header followed by the payload. An
+# experiment record (a JSON payload) precedes the trial records of each experiment. A trial record's payload is the
+# fixed fields, the correct and actual grids (one byte per cell), then the durations, timeline and frame counts of
+# each of the experiment's items.
+_RECORD_HEADER_FORMAT = '<BI'
+_EXPERIMENT_RECORD = 0
+_TRIAL_RECORD = 1
+_TRIAL_FORMAT = '<dhbBB'
+
+
+class ResultStore(object):
+    # per trial columns: name -> (dtype, per trial shape); grid and item dimensions are filled in on allocation
+    _COLUMNS = {
+        'response_time': ('f8', ()),
+        'spec': ('i2', ()),
+        'cue': ('i1', ()),
+        'n_rows': ('u1', ()),
+        'n_columns': ('u1', ()),
+        'correct': ('S1', ('rows', 'columns')),
+        'actual': ('S1', ('rows', 'columns')),
+        'durations': ('u4', ('items',)),
+        'timeline': ('i8', ('items', len(TIMELINE_FIELDS))),
+        'n_frames': ('i4', ('items',)),
+    }
+
+    def __init__(self, item_names, capacity=sperling.constants.RESULTS_INITIAL_CAPACITY):
+        """Append-only, column-oriented storage for trial results
+
+        Each column is a NumPy array with one entry per trial, so results can be analysed without unpacking them.
+        Grids are stored as fixed-width character arrays padded with b''. Indexing or iterating over a store still
+        produces ResponseEntry tuples.
+
+        :param item_names (list): names of the trial items whose durations and timings are stored
+        :param capacity (int): number of trials allocated up front; grows by doubling
+        """
+        self.item_names = list(item_names)
+        self.grid_specs = []
+
+        self._n_trials = 0
+        self._grid_shape = (1, 1)
+        self._columns = self._allocate(capacity, self._grid_shape)
+
+    def __len__(self):
+        return self._n_trials
+
+    def __getitem__(self, index):
+        # slices are lists of entries, as they were when results were lists
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(self._n_trials))]
+
+        if index < 0:
+            index += self._n_trials
+
+        if not 0 <= index < self._n_trials:
+            raise IndexError('result index out of range')
+
+        n_rows, n_columns = self._columns['n_rows'][index], self._columns['n_columns'][index]
+
+        def to_grid(column):
+            return [[char.decode('ascii') for char in row[:n_columns]] for row in self._columns[column][index, :n_rows]]
+
+        spec, cue = self._columns['spec'][index], self._columns['cue'][index]
+
+        timeline = []
+        for i, name in enumerate(self.item_names):
+            timestamps = [None if value == MISSING else int(value) for value in self._columns['timeline'][index, i]]
+            if timestamps[0] is not None:
+                timeline.append(sperling.timing.ItemTiming(name, *timestamps,
+                                                           n_frames=int(self._columns['n_frames'][index, i])))
+
+        return sperling.ResponseEntry(
+            response_time=float(self._columns['response_time'][index]),
+            actual_response=to_grid('actual'),
+            correct_response=to_grid('correct'),
+            durations=dict(zip(self.item_names, self._columns['durations'][index].tolist())),
+            timeline=sorted(timeline, key=lambda timing: timing.onset),
+            grid_spec=None if spec == MISSING else self.grid_specs[spec],
+            cue_index=None if cue == MISSING else int(cue))
+
+    def __iter__(self):
+        return (self[i] for i in range(self._n_trials))
+
+    def __getstate__(self):
+        # only the filled part of each column is pickled
+        state = self.__dict__.copy()
+        state['_columns'] = {name: column[:self._n_trials] for name, column in self._columns.items()}
+        return state
+
+    def column(self, name):
+        """A view of a column's entries for every stored trial (see ResultStore._COLUMNS for the names)"""
+        return self._columns[name][:self._n_trials]
+
+    def append(self, response_time, actual_response, correct_response, durations, timeline=None, grid_spec=None,
+               cue_index=None):
+        """Stores a single trial's result, copying it into the columns
+
+        :param response_time (float): the response time (in ms)
+        :param actual_response (list): the response grid (list of rows)
+        :param correct_response (list): the expected response grid (list of rows)
+        :param durations (dict): item names mapped to their durations (in ms); values are copied
+        :param timeline (list): sperling.timing.ItemTimings of the trial's items
+        :param grid_spec (GridSpec): the trial's grid spec
+        :param cue_index (int): the trial's cued row
+        :return: the index of the trial
+        """
+        n_rows, n_columns = len(correct_response), max(len(row) for row in correct_response)
+        if n_rows > self._grid_shape[0] or n_columns > self._grid_shape[1]:
+            self._resize(len(self._columns['spec']), (max(n_rows, self._grid_shape[0]),
+                                                      max(n_columns, self._grid_shape[1])))
+
+        if self._n_trials == len(self._columns['spec']):
+            self._resize(max(2 * self._n_trials, 1), self._grid_shape)
+
+        index = self._n_trials
+        columns = self._columns
+
+        columns['response_time'][index] = response_time
+        columns['spec'][index] = MISSING if grid_spec is None else self._spec_index(grid_spec)
+        columns['cue'][index] = MISSING if cue_index is None else cue_index
+        columns['n_rows'][index] = n_rows
+        columns['n_columns'][index] = n_columns
+
+        for column, grid in (('correct', correct_response), ('actual', actual_response)):
+            columns[column][index] = b''
+            if isinstance(grid, sperling.Grid):
+                columns[column][index, :grid.n_rows, :grid.n_columns].view(np.uint8)[:] = grid.cells
+                continue
+
+            for i, row in enumerate(grid):
+                columns[column][index, i, :len(row)] = row
+
+        columns['durations'][index] = [durations.get(name, 0) for name in self.item_names]
+
+        self._n_trials += 1
+        self.set_timeline(index, timeline or [])
+
+        return index
+
+    def set_timeline(self, index, timeline):
+        """Replaces a stored trial's timeline (e.g., once items after the response have finished)"""
+        self._columns['timeline'][index] = MISSING
+        self._columns['n_frames'][index] = 0
+
+        positions = {name: i for i, name in enumerate(self.item_names)}
+        for timing in timeline:
+            if timing.name in positions:
+                self._columns['timeline'][index, positions[timing.name]] = [
+                    MISSING if getattr(timing, field) is None else getattr(timing, field) for field in TIMELINE_FIELDS]
+                self._columns['n_frames'][index, positions[timing.name]] = timing.n_frames
+
+    def clear(self):
+        self._n_trials = 0
+        self.grid_specs.clear()
+
+    @classmethod
+    def concatenate(cls, stores):
+        """Merges stores of trials with the same items into a new store
+
+        :param stores (list): ResultStores
+        :return: ResultStore
+        """
+        stores = list(stores)
+        item_names = stores[0].item_names if stores else []
+        if any(store.item_names != item_names for store in stores):
+            raise ValueError('only results of the same trial items can be concatenated')
+
+        merged = cls(item_names, capacity=max(1, sum(len(store) for store in stores)))
+        merged._resize(len(merged._columns['spec']), (max([1] + [store._grid_shape[0] for store in stores]),
+                                                      max([1] + [store._grid_shape[1] for store in stores])))
+
+        for store in stores:
+            start, end = merged._n_trials, merged._n_trials + len(store)
+            rows, columns = store._grid_shape
+
+            for name in cls._COLUMNS:
+                if name in ('correct', 'actual'):
+                    merged._columns[name][start:end, :rows, :columns] = store.column(name)
+                else:
+                    merged._columns[name][start:end] = store.column(name)
+
+            spec = store.column('spec')
+            spec_indices = np.array([merged._spec_index(grid_spec) for grid_spec in store.grid_specs] + [MISSING])
+            merged._columns['spec'][start:end] = spec_indices[spec]
+
+            merged._n_trials = end
+
+        return merged
+
+    def _spec_index(self, grid_spec):
+        # grid specs hold a charset set, so they are looked up by equality rather than hashed
+        for i, spec in enumerate(self.grid_specs):
+            if spec == grid_spec:
+                return i
+
+        self.grid_specs.append(grid_spec)
+        return len(self.grid_specs) - 1
+
+    def _allocate(self, capacity, grid_shape):
+        dims = {'rows': grid_shape[0], 'columns': grid_shape[1], 'items': len(self.item_names)}
+        return {name: np.zeros((capacity,) + tuple(dims.get(dim, dim) for dim in shape), dtype=dtype)
+                for name, (dtype, shape) in self._COLUMNS.items()}
+
+    def _resize(self, capacity, grid_shape):
+        columns = self._allocate(capacity, grid_shape)
+        rows, n_columns = self._grid_shape
+
+        for name, column in self._columns.items():
+            if name in ('correct', 'actual'):
+                columns[name][:self._n_trials, :rows, :n_columns] = column[:self._n_trials]
+            else:
+                columns[name][:self._n_trials] = column[:self._n_trials]
+
+        self._columns = columns
+        self._grid_shape = grid_shape
+
+
+class ResultsWriter(object):
+    def __init__(self, path):
+        """Appends every trial's result to <path>.jsonl and <path>.bin as the session runs
+
+        Records are encoded and written by a background thread, so writing never blocks the presentation loop. Each
+        batch of queued records is flushed and fsynced before the next is written, so a crash or an interrupted
+        session loses at most the trial in progress. If writing fails, the error is raised by the next call to
+        write() or close().
+
+        :param path (str): path of the results files, without extension
+        """
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self._experiment = None
+        self._n_experiments = 0
+
+        # the exception that stopped the writer thread
+        self._error = None
+
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._write_records, name='results writer', daemon=True)
+        self._thread.start()
+
+    def begin_experiment(self, experiment):
+        """Starts the records of an experiment; its trials are written with write()"""
+        self._raise_error()
+
+        self._experiment = experiment
+        self._n_experiments += 1
+
+        self._queue.put((_EXPERIMENT_RECORD, {
+            'experiment': self._n_experiments - 1,
+            'name': type(experiment).__name__,
+            'item_names': list(experiment.results.item_names),
+            'grid_specs': [sperling.plan.spec_to_dict(spec) for spec in experiment.grid_specs]
+        }))
+
+    def write(self, trial, result):
+        """Queues a trial's result
+
+        :param trial (int): the trial's index within the experiment
+        :param result (ResponseEntry): the trial's result
+        """
+        self._raise_error()
+
+        spec = MISSING
+        if result.grid_spec in self._experiment.grid_specs:
+            spec = self._experiment.grid_specs.index(result.grid_spec)
+
+        self._queue.put((_TRIAL_RECORD, (self._n_experiments - 1, trial, spec, self._experiment.results.item_names,
+                                         result)))
+
+    def close(self):
+        """Writes any queued records and stops the writer thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+        self._raise_error()
+
+    def _raise_error(self):
+        if self._error is not None:
+            raise self._error
+
+    def _write_records(self):
+        try:
+            self._write_queued_records()
+        except Exception as exc:
+            self._error = exc
+
+    def _write_queued_records(self):
+        with open(self.path + '.jsonl', 'a') as json_file, open(self.path + '.bin', 'ab') as binary_file:
+            closed = False
+            while not closed:
+                records = [self._queue.get()]
+
+                # everything queued since the last batch is written together
+                while True:
+                    try:
+                        records.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                for record in records:
+                    if record is None:
+                        closed = True
+                        continue
+
+                    kind, content = record
+                    json_file.write(json.dumps(_to_json(kind, content)) + '\n')
+
+                    payload = json.dumps(content).encode('utf-8') if kind == _EXPERIMENT_RECORD \
+                        else _encode_trial(*content[2:])
+                    binary_file.write(struct.pack(_RECORD_HEADER_FORMAT, kind, len(payload)))
+                    binary_file.write(payload)
+
+                for results_file in (json_file, binary_file):
+                    results_file.flush()
+                    os.fsync(results_file.fileno())
+
+
+def _to_json(kind, content):
+    if kind == _EXPERIMENT_RECORD:
+        return dict(content, type='experiment')
+
+    experiment, trial, spec, _, result = content
+    return {
+        'type': 'trial',
+        'experiment': experiment,
+        'trial': trial,
+        'response_time': result.response_time,
+        'actual_response': [''.join(row) for row in result.actual_response],
+        'correct_response': [''.join(row) for row in result.correct_response],
+        'durations': result.durations,
+        'grid_spec': spec,
+        'cue_index': result.cue_index,
+        'timeline': [timing._asdict() for timing in result.timeline]
+    }
+
+
+def _encode_trial(spec, item_names, result):
+    n_rows, n_columns = len(result.correct_response), len(result.correct_response[0])
+    n_items = len(item_names)
+
+    timings = {timing.name: timing for timing in result.timeline}
+    timeline = []
+    for name in item_names:
+        timing = timings.get(name)
+        timeline.extend(MISSING if timing is None or getattr(timing, field) is None else getattr(timing, field)
+                        for field in TIMELINE_FIELDS)
+
+    return b''.join([
+        struct.pack(_TRIAL_FORMAT, result.response_time, spec,
+                    MISSING if result.cue_index is None else result.cue_index, n_rows, n_columns),
+        ''.join(''.join(row) for row in result.correct_response).encode('ascii'),
+        ''.join(''.join(row) for row in result.actual_response).encode('ascii'),
+        struct.pack('<{}I'.format(n_items), *[result.durations.get(name, 0) for name in item_names]),
+        struct.pack('<{}q'.format(n_items * len(TIMELINE_FIELDS)), *timeline),
+        struct.pack('<{}i'.format(n_items), *[timings[name].n_frames if name in timings else 0
+                                              for name in item_names])
+    ])
+
+
+def load_results(path):
+    """Reads the results written by ResultsWriter to <path>.bin
+
+    A record left incomplete by a crash is ignored.
+
+    :param path (str): path of the results files, without extension
+    :return: list of ResultStore, one per experiment
+    """
+    stores = []
+    grid_specs = []
+
+    header_size = struct.calcsize(_RECORD_HEADER_FORMAT)
+    trial_size = struct.calcsize(_TRIAL_FORMAT)
+    n_fields = len(TIMELINE_FIELDS)
+
+    with open(path + '.bin', 'rb') as binary_file:
+        data = binary_file.read()
+
+    offset = 0
+    while offset + header_size <= len(data):
+        kind, length = struct.unpack_from(_RECORD_HEADER_FORMAT, data, offset)
+        offset += header_size
+
+        if offset + length > len(data):
+            break
+
+        payload = data[offset:offset + length]
+        offset += length
+
+        if kind == _EXPERIMENT_RECORD:
+            header = json.loads(payload.decode('utf-8'))
+            grid_specs = [sperling.plan.spec_from_dict(spec) for spec in header['grid_specs']]
+            stores.append(ResultStore(header['item_names']))
+            continue
+
+        store = stores[-1]
+        item_names = store.item_names
+        n_items = len(item_names)
+
+        response_time, spec, cue, n_rows, n_columns = struct.unpack_from(_TRIAL_FORMAT, payload)
+        position = trial_size
+
+        grids = []
+        for _ in range(2):
+            cells = payload[position:position + n_rows * n_columns].decode('ascii')
+            grids.append([list(cells[i * n_columns:(i + 1) * n_columns]) for i in range(n_rows)])
+            position += n_rows * n_columns
+
+        durations = struct.unpack_from('<{}I'.format(n_items), payload, position)
+        position += 4 * n_items
+        timestamps = struct.unpack_from('<{}q'.format(n_items * n_fields), payload, position)
+        position += 8 * n_items * n_fields
+        n_frames = struct.unpack_from('<{}i'.format(n_items), payload, position)
+
+        timeline = []
+        for i, name in enumerate(item_names):
+            values = [None if value == MISSING else value for value in timestamps[i * n_fields:(i + 1) * n_fields]]
+            if values[0] is not None:
+                timeline.append(sperling.timing.ItemTiming(name, *values, n_frames=n_frames[i]))
+
+        store.append(response_time, grids[1], grids[0], dict(zip(item_names, durations)), timeline=timeline,
+                     grid_spec=None if spec == MISSING else grid_specs[spec],
+                     cue_index=None if cue == MISSING else cue)
+
+    return stores
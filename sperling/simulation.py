@@ -0,0 +1,46 @@
+import pygame
+
+import sperling.constants
+
+
+def key_event(char):
+    """Creates a KEYDOWN event for a character key (e.g., 'B') or a pygame key constant"""
+    key = getattr(pygame, 'K_{}'.format(char.lower())) if isinstance(char, str) else char
+    return pygame.event.Event(pygame.KEYDOWN, key=key, mod=0, unicode=char if isinstance(char, str) else '')
+
+
+def correct_answer(item, runner):
+    """An answer for SimulatedSubject that always reports the correct response"""
+    return [''.join(row) for row in item.post.correct]
+
+
+class SimulatedSubject(object):
+    def __init__(self, answer=None, reaction_time=sperling.constants.SIMULATED_REACTION_TIME,
+                 key_interval=sperling.constants.SIMULATED_KEY_INTERVAL,
+                 advance_items=(sperling.constants.FIXATION, sperling.constants.FEEDBACK)):
+        """A scripted responder for sperling.SimulatedTrialRunner
+
+        :param answer (callable): called as answer(item, runner) at the onset of the response item; returns the
+            response as one string per grid row ('?' for unknown characters). Defaults to no response.
+        :param reaction_time (int): delay (in ms) before the first key press of an item
+        :param key_interval (int): delay (in ms) between consecutive key presses
+        :param advance_items (tuple): names of the items ended with ENTER after the reaction time
+        """
+        self.answer = answer
+        self.reaction_time = reaction_time
+        self.key_interval = key_interval
+        self.advance_items = advance_items
+
+    def __call__(self, item, runner):
+        keys = []
+        if item.name == sperling.constants.RESPONSE:
+            for row in (self.answer(item, runner) if self.answer else []):
+                # unknown characters are skipped over, leaving the response grid's '?'
+                keys.extend(pygame.K_RIGHT if char == '?' else char for char in row)
+                keys.append(pygame.K_DOWN)
+        elif item.name not in self.advance_items:
+            return []
+
+        keys.append(pygame.K_RETURN)
+
+        return [(self.reaction_time + i * self.key_interval, key_event(key)) for i, key in enumerate(keys)]
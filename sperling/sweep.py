@@ -0,0 +1,139 @@
+import collections
+import itertools
+import multiprocessing
+import os
+import random
+
+import pygame
+
+import sperling
+
+# A single configuration of a sweep; grid_spec is None when the experiment's own grid specs are used
+SweepCell = collections.namedtuple('SweepCell', ['index', 'experiment_cls', 'duration_overrides', 'grid_spec',
+                                                 'n_trials', 'seed'])
+
+# A single trial's result, tagged with the configuration it was run under
+SweepEntry = collections.namedtuple('SweepEntry', ['cell', 'result'])
+
+# per worker process state, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(responder, stop_when, screen_size, font_name, font_size):
+    # SDL otherwise turns SIGTERM into a QUIT event, and the pool could not terminate its workers
+    os.environ['SDL_NO_SIGNAL_HANDLERS'] = '1'
+
+    _worker['screen'] = sperling.headless.init_display(screen_size)
+    _worker['font'] = pygame.font.SysFont(font_name, size=font_size)
+    _worker['responder'] = responder
+    _worker['stop_when'] = stop_when
+
+
+def run_cell(cell, screen, font, responder, stop_when=None):
+    """Runs a single sweep cell as a simulated session
+
+    A cell ends early when stop_when (see Experiment.run) returns True.
+
+    :return: the experiment's results (sperling.results.ResultStore)
+    """
+    experiment_options = {}
+    if cell.grid_spec is not None:
+        experiment_options['grid_spec'] = cell.grid_spec
+
+    experiment = cell.experiment_cls(screen=screen, font=font, duration_overrides=cell.duration_overrides,
+                                     n_trials=cell.n_trials, seed=cell.seed, **experiment_options)
+    experiment.run(runner_cls=sperling.SimulatedTrialRunner, responder=responder, stop_when=stop_when)
+
+    return experiment.results
+
+
+def _run_cell_in_worker(cell):
+    return cell, run_cell(cell, _worker['screen'], _worker['font'], _worker['responder'], _worker['stop_when'])
+
+
+class Sweep(object):
+    def __init__(self, experiment_cls, responder, durations=None, grid_specs=None, n_trials=1, seed=None,
+                 screen_size=sperling.constants.SWEEP_SCREEN_SIZE, font_name=None,
+                 font_size=sperling.constants.SWEEP_FONT_SIZE, stop_when=None):
+        """A grid of experiment configurations, each run as a headless simulated session in a pool of processes
+
+        Cells are the product of the duration values and grid specs. Every cell gets its own seed, drawn from the
+        sweep's seed, so a sweep is reproducible regardless of how its cells are scheduled.
+
+        :param experiment_cls (class): the experiment run in every cell (e.g., sperling.experiments.Experiment3)
+        :param responder (callable): the simulated subject (see sperling.simulation.SimulatedSubject); it is sent to
+            every worker process, so it must be picklable
+        :param durations (dict): item names mapped to the durations (in ms) swept for that item
+        :param grid_specs (list): GridSpecs swept (defaults to the experiment's own grid specs)
+        :param n_trials (int): number of trials per cell
+        :param seed: seed from which the cells' seeds are drawn
+        :param screen_size (tuple): size of each worker's headless display
+        :param font_name (str): system font used for the grids (defaults to pygame's default font)
+        :param font_size (int): font size used for the grids
+        :param stop_when (callable): ends a cell early (e.g., sperling.analysis.Convergence); must be picklable
+        """
+        self.experiment_cls = experiment_cls
+        self.responder = responder
+        self.durations = durations or dict()
+        self.grid_specs = grid_specs or [None]
+        self.n_trials = n_trials
+        self.seed = seed
+
+        self.screen_size = screen_size
+        self.font_name = font_name
+        self.font_size = font_size
+
+        self.stop_when = stop_when
+
+        self.cells = self._create_cells()
+
+    def _create_cells(self):
+        rng = random.Random(self.seed)
+
+        names = sorted(self.durations)
+        cells = []
+        for grid_spec, values in itertools.product(self.grid_specs,
+                                                   itertools.product(*[self.durations[name] for name in names])):
+            cells.append(SweepCell(index=len(cells), experiment_cls=self.experiment_cls,
+                                   duration_overrides=dict(zip(names, values)), grid_spec=grid_spec,
+                                   n_trials=self.n_trials, seed=rng.getrandbits(32)))
+
+        return cells
+
+    def imap(self, processes=None):
+        """Runs the sweep, yielding each cell's results as soon as the cell completes
+
+        :param processes (int): number of worker processes (defaults to the number of cores)
+        :return: iterator of (SweepCell, ResultStore), in order of completion
+        """
+        # workers are spawned rather than forked so that none inherits the parent's display
+        context = multiprocessing.get_context('spawn')
+        initargs = (self.responder, self.stop_when, self.screen_size, self.font_name, self.font_size)
+        with context.Pool(processes, initializer=_init_worker, initargs=initargs) as pool:
+            yield from pool.imap_unordered(_run_cell_in_worker, self.cells)
+
+    def run(self, processes=None):
+        """Runs the sweep and merges the results of every cell
+
+        :param processes (int): number of worker processes (defaults to the number of cores)
+        :return: list of SweepEntry, ordered by cell and then by trial
+        """
+        results_per_cell = self._run_cells(processes)
+
+        return [SweepEntry(cell=cell, result=result) for cell, results in zip(self.cells, results_per_cell)
+                for result in results]
+
+    def run_merged(self, processes=None):
+        """Runs the sweep and concatenates the results of every cell into a single store
+
+        Each trial's durations and grid spec are stored with it, so the cells stay distinguishable.
+
+        :param processes (int): number of worker processes (defaults to the number of cores)
+        :return: ResultStore, ordered by cell and then by trial
+        """
+        return sperling.results.ResultStore.concatenate(self._run_cells(processes))
+
+    def _run_cells(self, processes):
+        """The results of every cell, in cell order"""
+        results_per_cell = {cell.index: results for cell, results in self.imap(processes)}
+        return [results_per_cell[cell.index] for cell in self.cells]
@@ -0,0 +1,213 @@
+import collections
+import copy
+
+import pygame
+import yaml
+
+import sperling.constants
+import sperling.view
+
+# Trial item kinds
+CROSSHAIRS = 'crosshairs'
+MASK = 'mask'
+STIMULUS = 'stimulus'
+CUE = 'cue'
+RESPONSE = 'response'
+FEEDBACK = 'feedback'
+
+KINDS = (CROSSHAIRS, MASK, STIMULUS, CUE, RESPONSE, FEEDBACK)
+
+# kinds whose pixels do not change while displayed
+STATIC_KINDS = (CROSSHAIRS, MASK, STIMULUS, CUE)
+
+# kinds whose content does not depend on the trial plan
+INVARIANT_KINDS = (CROSSHAIRS, MASK)
+
+# A single item in a trial template. advance_on is the key (pygame key constant) that ends the item early, or None.
+ItemSpec = collections.namedtuple('ItemSpec', ['name', 'kind', 'advance_on'])
+
+
+def load_config(path):
+    with open(path) as config_file:
+        return yaml.safe_load(config_file)
+
+
+class TrialTemplate(object):
+    def __init__(self, items):
+        """A declarative description of the items presented in every trial of an experiment
+
+        :param items (list): ItemSpecs, in presentation order
+        """
+        self.items = list(items)
+
+        self._validate()
+
+    def _validate(self):
+        if not self.items:
+            raise ValueError('a trial template must contain at least one item')
+
+        for item in self.items:
+            if item.kind not in KINDS:
+                raise ValueError('Invalid item kind: {}'.format(item.kind))
+
+        kinds = [item.kind for item in self.items]
+        if FEEDBACK in kinds and RESPONSE not in kinds[:kinds.index(FEEDBACK)]:
+            raise ValueError('feedback items must be preceded by a response item')
+
+        if CUE in kinds and STIMULUS not in kinds[:kinds.index(CUE)]:
+            raise ValueError('cue items must be preceded by a stimulus item')
+
+    @classmethod
+    def from_config(cls, config):
+        """Creates a template from the 'trial' section of a configuration file (see config.yml)
+
+        :param config (list): dicts with 'name', 'kind' and (optionally) 'advance_on' (a pygame key name, e.g. RETURN)
+        :return: TrialTemplate
+        """
+        items = []
+        for item in config:
+            advance_on = item.get('advance_on')
+            if advance_on is not None:
+                key_name = 'K_{}'.format(advance_on)
+                if not hasattr(pygame, key_name):
+                    raise ValueError('Invalid key: {}'.format(advance_on))
+
+                advance_on = getattr(pygame, key_name)
+
+            items.append(ItemSpec(name=item['name'], kind=item['kind'], advance_on=advance_on))
+
+        return cls(items)
+
+    def compile(self, experiment):
+        return CompiledTrialTemplate(self, experiment)
+
+
+class CompiledTrialTemplate(object):
+    def __init__(self, template, experiment):
+        """A trial template bound to an experiment's screen, font and durations
+
+        Items whose content does not depend on the trial (fixation crosshairs and masks) are created and
+        pre-composed once, here. instantiate() only builds the items that show the trial's grid or cue.
+
+        :param template (TrialTemplate): the template being compiled
+        :param experiment (Experiment): the experiment whose trials are instantiated from the template
+        """
+        self.template = template
+        self.experiment = experiment
+
+        self.screen = experiment.screen
+        self.font = experiment.font
+        self.durations = {item.name: experiment.durations[item.name] for item in template.items}
+
+        self._invariant_items = {item.name: self._build_invariant_item(item)
+                                 for item in template.items if item.kind in INVARIANT_KINDS}
+
+    def instantiate(self, plan, layout):
+        """Creates the items of a single trial
+
+        :param plan (TrialPlan): the trial's grid, cue and durations
+        :param layout (TrialLayout): the screen positions of the trial's grids
+        :return: list of TrialItems
+        """
+        trial_items = []
+
+        stimulus_grid = None
+        response = None
+        for item in self.template.items:
+            if item.kind in INVARIANT_KINDS:
+                # copied, since the next trial is instantiated while this one is presented
+                invariant_item = copy.copy(self._invariant_items[item.name])
+                invariant_item.duration = plan.durations[item.name]
+
+                trial_items.append(invariant_item)
+                continue
+
+            if item.kind == STIMULUS:
+                stimulus_grid = sperling.view.CharacterGrid(grid=plan.grid, font=self.font)
+                renderer = sperling.view.GridRenderer(surface=self.screen, grid=stimulus_grid,
+                                                      pos=layout.stimulus_pos)
+                trial_items.append(self._item(item, renderer, plan.durations[item.name]))
+
+            elif item.kind == CUE:
+                arrow_dims = sperling.view.CharacterGridWithArrowCues.get_arrow_dims(self.screen.get_size())
+                arrow_grid = sperling.view.CharacterGridWithArrowCues(stimulus_grid, arrow_dims,
+                                                                      cue_row=plan.cue_index)
+                renderer = sperling.view.GridRenderer(surface=self.screen, grid=arrow_grid, pos=layout.cue_pos)
+                trial_items.append(self._item(item, renderer, plan.durations[item.name]))
+
+            elif item.kind == RESPONSE:
+                response = self._build_response(item, plan, layout)
+                trial_items.append(response)
+
+            elif item.kind == FEEDBACK:
+                response_processor = response.post
+                renderer = sperling.view.FeedbackGridRenderer(
+                    surface=self.screen, grid=response.renderer.grid, correct=response_processor.correct,
+                    actual=response_processor.actual)
+                trial_items.append(self._item(item, renderer, plan.durations[item.name],
+                                              pre=self.experiment._prepare_next_trial))
+
+        return trial_items
+
+    def _build_invariant_item(self, item):
+        screen_dims = sperling.view.Dimensions(*self.screen.get_size())
+
+        if item.kind == CROSSHAIRS:
+            crosshairs_width = max(screen_dims) // 10
+            crosshairs = sperling.view.CrossHairs(size=crosshairs_width, color=sperling.constants.WHITE)
+
+            crosshairs.rect.x = (screen_dims.width - crosshairs_width) // 2
+            crosshairs.rect.y = (screen_dims.height - crosshairs_width) // 2
+
+            renderer = sperling.view.SpriteRenderer(self.screen, crosshairs)
+        else:
+            renderer = sperling.view.MaskRenderer(self.screen, color=sperling.constants.BLACK)
+
+        frame = sperling.view.compose_frame(renderer, self.screen)
+        return self._item(item, sperling.view.FrameRenderer(self.screen, frame), self.durations[item.name])
+
+    def _build_response(self, item, plan, layout):
+        # partial report trials only ask for the cued row
+        correct = plan.grid if plan.cue_index is None else plan.grid.row(plan.cue_index)
+        response_grid = sperling.Grid.full(correct.n_rows, correct.n_columns, '?')
+
+        char_grid = sperling.view.CharacterGrid(grid=response_grid, font=self.font)
+
+        renderer = sperling.view.GridRenderer(surface=self.screen, grid=char_grid, pos=layout.response_pos)
+        event_processor = sperling.view.GridEventHandler(grid=char_grid, view=renderer,
+                                                         terminal_event=item.advance_on or pygame.K_RETURN)
+        post_processor = sperling.ResponseProcessor(correct=correct, actual=response_grid, experiment=self.experiment,
+                                                    grid_spec=plan.grid_spec, cue_index=plan.cue_index,
+                                                    durations=plan.durations)
+
+        return sperling.TrialItem(name=item.name, renderer=renderer, event_processor=event_processor,
+                                  post=post_processor, duration=plan.durations[item.name])
+
+    def _item(self, item, renderer, duration, pre=sperling.constants.NO_OP):
+        event_processor = sperling.constants.NO_OP
+        if item.advance_on is not None:
+            event_processor = sperling.view.WaitUntilKeyHandler(item.advance_on)
+
+        return sperling.TrialItem(name=item.name, renderer=renderer, event_processor=event_processor, pre=pre,
+                                  duration=duration, static=item.kind in STATIC_KINDS)
+
+
+# Whole report (Experiments 1 and 2)
+WHOLE_REPORT_TEMPLATE = TrialTemplate([
+    ItemSpec(name=sperling.constants.FIXATION, kind=CROSSHAIRS, advance_on=pygame.K_RETURN),
+    ItemSpec(name=sperling.constants.POST_FIXATION_MASK, kind=MASK, advance_on=None),
+    ItemSpec(name=sperling.constants.STIMULUS, kind=STIMULUS, advance_on=None),
+    ItemSpec(name=sperling.constants.RESPONSE, kind=RESPONSE, advance_on=pygame.K_RETURN),
+    ItemSpec(name=sperling.constants.FEEDBACK, kind=FEEDBACK, advance_on=pygame.K_RETURN),
+])
+
+# Partial report with a cued row (Experiment 3)
+PARTIAL_REPORT_TEMPLATE = TrialTemplate([
+    ItemSpec(name=sperling.constants.FIXATION, kind=CROSSHAIRS, advance_on=pygame.K_RETURN),
+    ItemSpec(name=sperling.constants.POST_FIXATION_MASK, kind=MASK, advance_on=None),
+    ItemSpec(name=sperling.constants.STIMULUS, kind=STIMULUS, advance_on=None),
+    ItemSpec(name=sperling.constants.POST_STIMULUS_MASK, kind=MASK, advance_on=None),
+    ItemSpec(name=sperling.constants.CUE, kind=CUE, advance_on=pygame.K_RETURN),
+    ItemSpec(name=sperling.constants.RESPONSE, kind=RESPONSE, advance_on=pygame.K_RETURN),
+    ItemSpec(name=sperling.constants.FEEDBACK, kind=FEEDBACK, advance_on=pygame.K_RETURN),
+])
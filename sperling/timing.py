@@ -0,0 +1,172 @@
+import collections
+import logging
+import statistics
+import time
+
+import pygame
+
+import sperling.constants
+
+logger = logging.getLogger(__name__)
+
+# Presentation timestamps (time.perf_counter_ns) for a single trial item. first_flip/last_flip are None if no frame
+# was presented.
+ItemTiming = collections.namedtuple('ItemTiming', ['name', 'onset', 'first_flip', 'last_flip', 'offset', 'n_frames'])
+
+
+class ItemTimer(object):
+    def __init__(self, name, now_ns=time.perf_counter_ns):
+        """Collects presentation timestamps for a trial item, starting at its onset
+
+        :param name (str): the item's name
+        :param now_ns (callable): returns the current time in nanoseconds
+        """
+        self.name = name
+        self.now_ns = now_ns
+        self.onset = now_ns()
+        self.first_flip = None
+        self.last_flip = None
+        self.n_frames = 0
+
+    def flipped(self):
+        self.last_flip = self.now_ns()
+        if self.first_flip is None:
+            self.first_flip = self.last_flip
+        self.n_frames += 1
+
+    def finish(self):
+        return ItemTiming(name=self.name, onset=self.onset, first_flip=self.first_flip, last_flip=self.last_flip,
+                          offset=self.now_ns(), n_frames=self.n_frames)
+
+
+class VirtualClock(object):
+    def __init__(self):
+        """A clock that only moves when told to, for running trials without waiting on wall-clock time"""
+        self._now = 0  # ms
+
+    def now(self):
+        """The current virtual time (in ms)"""
+        return self._now
+
+    def now_ns(self):
+        return int(self._now * 1000000)
+
+    def advance_to(self, timestamp):
+        if timestamp < self._now:
+            raise ValueError('a virtual clock cannot move backwards')
+
+        self._now = timestamp
+
+    def advance(self, delta):
+        self.advance_to(self._now + delta)
+
+
+def measure_refresh_rate(n_samples=sperling.constants.REFRESH_RATE_SAMPLES,
+                         fallback=sperling.constants.DEFAULT_REFRESH_RATE):
+    """Estimates the display refresh rate from the median interval between consecutive flips
+
+    Only meaningful when flips are synchronized to the vertical blank (e.g., set_mode(..., vsync=1)). If they are
+    not, flips return immediately and the fallback rate is used instead.
+
+    :param n_samples (int): number of flip intervals sampled
+    :param fallback (float): refresh rate (Hz) used when flips are not vsync-aligned
+    :return: refresh rate in Hz
+    """
+    pygame.display.flip()
+
+    timestamps = []
+    for _ in range(n_samples + 1):
+        pygame.display.flip()
+        timestamps.append(time.perf_counter())
+
+    interval = statistics.median(t2 - t1 for t1, t2 in zip(timestamps, timestamps[1:]))
+    if interval * 1000 < sperling.constants.MIN_REFRESH_INTERVAL:
+        logger.warning('display flips are not vsync-aligned; assuming a refresh rate of %s Hz', fallback)
+        return fallback
+
+    return 1.0 / interval
+
+
+class ClockScheduler(object):
+    def __init__(self, clock, fps):
+        """Paces frames with pygame.time.Clock at a fixed frame rate, running each item until its duration elapses
+
+        :param clock (pygame.time.Clock): the clock used to limit the frame rate
+        :param fps (int): the maximum frame rate
+        """
+        self.clock = clock
+        self.fps = fps
+
+        self._duration = 0
+        self._elapsed = 0
+
+    def begin(self, item):
+        self._duration = item.duration or sperling.constants.MAX_DURATION
+        self._elapsed = 0
+
+        # restart the frame clock so time spent between items is not charged to this one
+        self.clock.tick()
+
+    def expired(self):
+        return self._elapsed > self._duration
+
+    def tick(self):
+        # Advance clock, then charge the frame that just ended
+        self.clock.tick(self.fps)
+        self._elapsed += self.clock.get_time()
+
+    def elapsed(self):
+        return self._elapsed
+
+
+class FrameLockedScheduler(object):
+    def __init__(self, refresh_rate=None, tolerance=sperling.constants.FRAME_TOLERANCE):
+        """Presents each item for a whole number of display refresh intervals
+
+        Item durations are converted to frame counts, and frames are paced with a busy-waiting clock at the
+        display's refresh rate. Durations that are not a multiple of the refresh interval are logged once per item.
+
+        :param refresh_rate (float): display refresh rate in Hz; measured from the display if not given
+        :param tolerance (float): maximum difference (in ms) between requested and presented durations before a
+            warning is logged
+        """
+        self.refresh_rate = refresh_rate or measure_refresh_rate()
+        self.frame_duration = 1000.0 / self.refresh_rate
+        self.tolerance = tolerance
+
+        self.clock = pygame.time.Clock()
+
+        self._n_frames = 0
+        self._frames_shown = 0
+        self._start_time = 0
+        self._warned = set()
+
+    def n_frames(self, duration):
+        """The number of frames closest to the requested duration (in ms); at least one"""
+        return max(1, int(round(duration / self.frame_duration)))
+
+    def begin(self, item):
+        duration = item.duration or sperling.constants.MAX_DURATION
+
+        self._n_frames = self.n_frames(duration)
+        self._frames_shown = 0
+
+        presented_duration = self._n_frames * self.frame_duration
+        if abs(presented_duration - duration) > self.tolerance and (item.name, duration) not in self._warned:
+            self._warned.add((item.name, duration))
+            logger.warning('%s: requested duration of %s ms cannot be met at %.2f Hz; presenting %s frame(s) '
+                           '(%.2f ms)', item.name, duration, self.refresh_rate, self._n_frames, presented_duration)
+
+        # restart the frame clock so time spent between items is not charged to the first frame
+        self.clock.tick_busy_loop()
+        self._start_time = time.perf_counter()
+
+    def expired(self):
+        return self._frames_shown >= self._n_frames
+
+    def tick(self):
+        self._frames_shown += 1
+        self.clock.tick_busy_loop(self.refresh_rate)
+
+    def elapsed(self):
+        return int(round((time.perf_counter() - self._start_time) * 1000))
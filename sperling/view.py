@@ -23,6 +23,33 @@ def terminate():
     pygame.quit()
 
 
+# posted to wake up wait_for_events at its deadline
+WAKEUP_EVENT = pygame.USEREVENT + 1
+
+
+def wait_for_events(timeout):
+    """Blocks until at least one event arrives or the timeout expires
+
+    :param timeout (int): maximum time to wait (in ms)
+    :return: list of pending events; empty if the timeout expired
+    """
+    pygame.time.set_timer(WAKEUP_EVENT, max(1, int(timeout)))
+    try:
+        events = [pygame.event.wait()]
+    finally:
+        pygame.time.set_timer(WAKEUP_EVENT, 0)
+
+    events.extend(pygame.event.get())
+
+    return [event for event in events if event.type != WAKEUP_EVENT]
+
+
+# Spacing (in pixels) of character grids and arrow cues
+GRID_MARGIN = (0, 0)
+GRID_CHAR_SPACER = (5, 0)
+ARROW_SPACER = (10, 10)
+
+
 class ArrowCue(pygame.sprite.Sprite):
     def __init__(self, dims, color):
         super().__init__()
@@ -65,20 +92,71 @@ class CrossHairs(pygame.sprite.Sprite):
         pygame.draw.line(self.image, self.color, (self.size // 2, 0), (self.size // 2, self.size), 5)
 
 
+class GlyphAtlas(object):
+    def __init__(self, max_size=sperling.constants.GLYPH_ATLAS_SIZE):
+        """A bounded LRU cache of rasterized glyphs keyed by (font, char, color)
+
+        :param max_size (int): number of glyph surfaces retained before the least recently used one is evicted
+        """
+        if max_size <= 0:
+            raise ValueError('max_size must be > 0')
+
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        self._glyphs = collections.OrderedDict()
+
+    def get(self, font, char, color):
+        key = (font, char, tuple(color))
+
+        glyph = self._glyphs.get(key)
+        if glyph is None:
+            self.misses += 1
+
+            glyph = font.render(char, 1, color)
+            self._glyphs[key] = glyph
+
+            if len(self._glyphs) > self.max_size:
+                self._glyphs.popitem(last=False)
+        else:
+            self.hits += 1
+            self._glyphs.move_to_end(key)
+
+        return glyph
+
+    def clear(self):
+        self._glyphs.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._glyphs)
+
+    def __contains__(self, key):
+        font, char, color = key
+        return (font, char, tuple(color)) in self._glyphs
+
+
+# atlas shared by all character sprites for the lifetime of the process
+glyph_atlas = GlyphAtlas()
+
+
 class Character(pygame.sprite.Sprite):
-    def __init__(self, char, pos, font, color):
+    def __init__(self, char, pos, font, color, atlas=None):
         super().__init__()
 
         self.char = char
         self.pos = pos
         self.font = font
         self.color = color
+        self.atlas = atlas if atlas is not None else glyph_atlas
 
-        self.image = self.font.render(self.char, 1, self.color)
+        self.image = self.atlas.get(self.font, self.char, self.color)
         self.rect = self.image.get_rect()
 
     def update(self):
-        self.image = self.font.render(self.char, 1, self.color)
+        self.image = self.atlas.get(self.font, self.char, self.color)
         self.rect = self.image.get_rect()
 
         self.rect.x, self.rect.y = self.pos
@@ -98,7 +176,7 @@ class CharacterGridWithArrowCues(pygame.sprite.Sprite):
         self.cue_row = cue_row
         self.grid_visible = grid_visible
 
-        self._x_arrow_spacer, self._y_arrow_spacer = (10, 10)
+        self._x_arrow_spacer, self._y_arrow_spacer = ARROW_SPACER
 
         self._grid_dims = Dimensions(*self._get_grid_dims())
 
@@ -109,12 +187,28 @@ class CharacterGridWithArrowCues(pygame.sprite.Sprite):
         self.sprites_group.add(self._create_sprites())
 
     def _get_grid_dims(self):
-        width = self._x_arrow_spacer + self.arrow_dims.width + self.grid._grid_dims.width
+        return CharacterGridWithArrowCues.get_dims(self.grid._grid_dims, self.arrow_dims)
+
+    @staticmethod
+    def get_arrow_dims(screen_dims):
+        """The size of each arrow cue, scaled to the screen size"""
+        width, height = screen_dims
+        return Dimensions(width=width // 8, height=height // 28)
+
+    @staticmethod
+    def get_dims(grid_dims, arrow_dims):
+        """Computes the size of a cued grid without creating it
+
+        :param grid_dims (Dimensions): size of the character grid being cued
+        :param arrow_dims (Dimensions): size of each arrow cue
+        :return: Dimensions
+        """
+        width = ARROW_SPACER[0] + arrow_dims.width + grid_dims.width
 
         # column arrow cues not supported yet, so this is just the grid height
-        height = self.grid._grid_dims.height
+        height = grid_dims.height
 
-        return width, height
+        return Dimensions(width, height)
 
     def update(self):
         self.image.fill(sperling.constants.BLACK)
@@ -149,7 +243,7 @@ class CharacterGridWithArrowCues(pygame.sprite.Sprite):
 
 
 class CharacterGrid(pygame.sprite.Sprite):
-    def __init__(self, grid, font, color_grid=None):
+    def __init__(self, grid, font, color_grid=None, atlas=None):
         super().__init__()
 
         self.grid = grid
@@ -157,10 +251,11 @@ class CharacterGrid(pygame.sprite.Sprite):
         self.n_columns = len(grid[0])
 
         self.font = font
+        self.atlas = atlas if atlas is not None else glyph_atlas
         self.color_grid = color_grid or [[sperling.constants.WHITE] * self.n_columns for _ in range(self.n_rows)]
 
-        self._x_margin, self._y_margin = (0, 0)
-        self._x_char_spacer, self._y_char_spacer = (5, 0)
+        self._x_margin, self._y_margin = GRID_MARGIN
+        self._x_char_spacer, self._y_char_spacer = GRID_CHAR_SPACER
         self._char_dims = Dimensions(*self.font.size('A'))  # Assumes fixed-size font
         self._grid_dims = self._get_grid_dims()
 
@@ -170,13 +265,27 @@ class CharacterGrid(pygame.sprite.Sprite):
 
         self.rect = self.image.get_rect()
 
+        self._sprites = self._create_sprites()
         self._sprite_group = pygame.sprite.Group()
-        self._sprite_group.add(self._create_sprites())
+        self._sprite_group.add(self._sprites)
 
     def _get_grid_dims(self):
-        width = 2 * self._x_margin + (
-                self.n_columns - 1) * self._x_char_spacer + self.n_columns * self._char_dims.width
-        height = 2 * self._y_margin + (self.n_rows - 1) * self._y_char_spacer + self.n_rows * self._char_dims.height
+        return CharacterGrid.get_dims(self.n_rows, self.n_columns, self._char_dims)
+
+    @staticmethod
+    def get_dims(n_rows, n_columns, char_dims):
+        """Computes the size of a character grid without creating it
+
+        :param n_rows (int): number of grid rows
+        :param n_columns (int): number of grid columns
+        :param char_dims (Dimensions): size of a single (fixed-size) character
+        :return: Dimensions
+        """
+        x_margin, y_margin = GRID_MARGIN
+        x_char_spacer, y_char_spacer = GRID_CHAR_SPACER
+
+        width = 2 * x_margin + (n_columns - 1) * x_char_spacer + n_columns * char_dims.width
+        height = 2 * y_margin + (n_rows - 1) * y_char_spacer + n_rows * char_dims.height
 
         return Dimensions(width, height)
 
@@ -190,7 +299,8 @@ class CharacterGrid(pygame.sprite.Sprite):
                     j * (self._char_dims.width + self._x_char_spacer) + self._x_margin,
                     i * (self._char_dims.height + self._y_char_spacer) + self._y_margin
                 )
-                char_sprite = Character(char, pos=char_pos, font=self.font, color=self.color_grid[i][j])
+                char_sprite = Character(char, pos=char_pos, font=self.font, color=self.color_grid[i][j],
+                                        atlas=self.atlas)
                 sprites.append(char_sprite)
 
         return sprites
@@ -201,38 +311,98 @@ class CharacterGrid(pygame.sprite.Sprite):
         self._sprite_group.draw(self.image)
 
     def refresh(self):
-        self._sprite_group = pygame.sprite.Group()
-        self._sprite_group.add(self._create_sprites())
+        # re-point existing sprites at their (possibly changed) character and color; glyphs come from the atlas
+        for i, row in enumerate(self.grid):
+            for j, char in enumerate(row):
+                sprite = self._sprites[i * self.n_columns + j]
+                sprite.char = char
+                sprite.color = self.color_grid[i][j]
 
 
-class GridRenderer:
-    def __init__(self, surface, pos, grid):
+class Renderer(object):
+    def __init__(self, surface):
+        """Base class for renderers that track which regions of the display they have damaged
+
+        Calling a renderer redraws everything and flips the display. draw() only renders pending changes and
+        returns the dirty rects, leaving presentation (pygame.display.update) to the caller.
+
+        :param surface (pygame.Surface): the surface rendered to when draw() is not given a target
+        """
         self.surface = surface
+        self._damaged = True
+
+    def __call__(self, *args, **kwargs):
+        self.invalidate()
+        self.draw()
+        pygame.display.flip()
+
+    def draw(self, surface=None):
+        """Renders any pending changes
+
+        :param surface (pygame.Surface): optional render target (defaults to the renderer's surface)
+        :return: list of dirty rects; empty if nothing changed since the last draw
+        """
+        if not self._damaged:
+            return []
+
+        self._damaged = False
+        return self._draw(surface or self.surface)
+
+    def invalidate(self):
+        """Forces a full redraw on the next call to draw()"""
+        self._damaged = True
+
+    def _draw(self, surface):
+        raise NotImplementedError
+
+
+class GridRenderer(Renderer):
+    def __init__(self, surface, pos, grid):
+        super().__init__(surface)
+
         self.pos = pos
         self.grid = grid
 
-    def __call__(self, *args, **kwargs):
-        # clear previously rendered letters
-        self.surface.fill(sperling.constants.BLACK)
+        self._grid_only = False
 
+    def _draw(self, surface):
         self.grid.rect.topleft = self.pos
+
+        # clear previously rendered letters
+        if self._grid_only:
+            surface.fill(sperling.constants.BLACK, self.grid.rect)
+        else:
+            surface.fill(sperling.constants.BLACK)
+
         self.grid.update()
+        surface.blit(self.grid.image, self.grid.rect)
 
-        self.surface.blit(self.grid.image, self.grid.rect)
-        pygame.display.flip()
+        dirty_rect = self.grid.rect.copy() if self._grid_only else surface.get_rect()
+        self._grid_only = False
+
+        return [dirty_rect]
+
+    def invalidate(self):
+        super().invalidate()
+        self._grid_only = False
 
     def refresh(self):
         self.grid.refresh()
 
+        # only the grid changed; a pending full redraw still takes precedence
+        self._grid_only = not self._damaged
+        self._damaged = True
+
 
-class FeedbackGridRenderer:
+class FeedbackGridRenderer(Renderer):
     def __init__(self, surface, grid, correct, actual):
-        self.surface = surface
+        super().__init__(surface)
+
         self.grid = grid
         self.correct = correct
         self.actual_response = actual
 
-    def __call__(self, *args, **kwargs):
+    def _draw(self, surface):
         n_rows = len(self.correct)
         n_cols = len(self.correct[0])
 
@@ -240,13 +410,14 @@ class FeedbackGridRenderer:
             for j in range(n_cols):
                 self.grid.color_grid[i][j] = self._color(self.correct[i][j], self.actual_response[i][j])
 
+        self.grid.refresh()
+
         self.grid.image.fill(sperling.constants.BLACK)
         self.grid.update()
 
-        self.surface.blit(self.grid.image, self.grid.rect)
+        surface.blit(self.grid.image, self.grid.rect)
 
-        self.grid.refresh()
-        pygame.display.flip()
+        return [self.grid.rect.copy()]
 
     def _color(self, correct, actual):
         correct_color = sperling.constants.GREEN
@@ -255,25 +426,63 @@ class FeedbackGridRenderer:
         return correct_color if actual == correct else incorrect_color
 
 
-class SpriteRenderer(object):
+class SpriteRenderer(Renderer):
     def __init__(self, screen, sprite):
+        super().__init__(screen)
+
         self.screen = screen
         self.sprite = sprite
 
-    def __call__(self, *args, **kwargs):
+    def _draw(self, surface):
         self.sprite.update()
-        self.screen.blit(self.sprite.image, self.sprite.rect)
-        pygame.display.flip()
+        surface.blit(self.sprite.image, self.sprite.rect)
+
+        return [self.sprite.rect.copy()]
 
 
-class MaskRenderer(object):
+class MaskRenderer(Renderer):
     def __init__(self, screen, color):
+        super().__init__(screen)
+
         self.screen = screen
         self.color = color
 
-    def __call__(self, *args, **kwargs):
-        self.screen.fill(self.color)
-        pygame.display.flip()
+    def _draw(self, surface):
+        surface.fill(self.color)
+
+        return [surface.get_rect()]
+
+
+class FrameRenderer(Renderer):
+    def __init__(self, screen, frame):
+        """Presents a pre-composed, full-screen frame with a single blit
+
+        :param screen (pygame.Surface): the display surface
+        :param frame (pygame.Surface): an off-screen surface the size of the screen (see compose_frame)
+        """
+        super().__init__(screen)
+
+        self.screen = screen
+        self.frame = frame
+
+    def _draw(self, surface):
+        return [surface.blit(self.frame, (0, 0))]
+
+
+def compose_frame(renderer, screen):
+    """Renders the output of a renderer once into an off-screen surface in the screen's pixel format
+
+    :param renderer (Renderer): a damage-tracking renderer whose output does not change between frames
+    :param screen (pygame.Surface): the display surface whose size and pixel format is used for the frame
+    :return: the composed frame (pygame.Surface)
+    """
+    frame = pygame.Surface(screen.get_size(), 0, screen)
+    frame.fill(sperling.constants.BLACK)
+
+    renderer.invalidate()
+    renderer.draw(frame)
+
+    return frame
 
 
 class WaitUntilKeyHandler(object):
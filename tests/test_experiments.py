@@ -1,4 +1,11 @@
 import itertools
+import json
+import os
+import pickle
+import random
+import struct
+import tempfile
+import time
 from unittest import TestCase
 from unittest.mock import patch, MagicMock, Mock
 
@@ -7,8 +14,7 @@ import pygame
 
 import sperling.constants
 
-pygame.init()
-screen = pygame.display.set_mode((32, 24))
+screen = sperling.headless.init_display((32, 24))
 font = pygame.font.SysFont("consolas", size=1)
 
 
@@ -48,6 +54,76 @@ class TestSerialTrialRunner(TestCase):
         except Exception as exc:
             self.fail('Unexpected exception: {}'.format(exc))
 
+    @patch('pygame.display.flip')
+    @patch('pygame.display.update')
+    def test_dirty_render_mode_skips_unchanged_frames(self, update, flip):
+        renderer = sperling.view.MaskRenderer(screen, color=sperling.constants.BLACK)
+        items = [sperling.TrialItem(name='', renderer=renderer, duration=50) for _ in range(2)]
+
+        runner = sperling.SerialTrialRunner(trial=items, clock=pygame.time.Clock(), surface=screen, fps=100,
+                                            render_mode=sperling.constants.RENDER_DIRTY)
+        runner.run()
+
+        # one full presentation at trial start, then one damaged-region update per item onset
+        flip.assert_called_once()
+        update.assert_called_once_with([screen.get_rect()])
+
+    def test_run_records_timeline(self):
+        runner, _ = self._execute_basic_runner()
+
+        self.assertEqual(len(runner.timeline), len(self._items))
+        for timing in runner.timeline:
+            self.assertGreater(timing.n_frames, 0)
+            self.assertTrue(timing.onset <= timing.first_flip <= timing.last_flip <= timing.offset)
+
+        for item in self._items:
+            self.assertIs(item.post.call_args.kwargs['timeline'], runner.timeline)
+
+    def test_idle_wait_wakes_on_input(self):
+        renderer = sperling.view.MaskRenderer(screen, color=sperling.constants.BLACK)
+        renderer.draw = MagicMock(wraps=renderer.draw)
+        item = sperling.TrialItem(name='', renderer=renderer,
+                                  event_processor=sperling.view.WaitUntilKeyHandler(pygame.K_RETURN))
+
+        runner = sperling.SerialTrialRunner(trial=[item], clock=pygame.time.Clock(), surface=screen, fps=100,
+                                            render_mode=sperling.constants.RENDER_DIRTY, idle_wait=True)
+
+        pygame.event.clear()
+        pygame.event.post(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN))
+        runner.run()
+
+        # drawn once on onset and once after waking; only the first draw changed anything
+        self.assertEqual(renderer.draw.call_count, 2)
+        self.assertEqual(runner.timeline[0].n_frames, 1)
+        self.assertLess(runner.times_per_item[''], sperling.constants.IDLE_WAIT_THRESHOLD)
+
+    def test_wait_for_events_times_out(self):
+        pygame.event.clear()
+        self.assertListEqual(sperling.view.wait_for_events(10), [])
+
+    def test_presented_frames_captured(self):
+        item = sperling.TrialItem(name='mask', renderer=sperling.view.MaskRenderer(screen, sperling.constants.RED),
+                                  duration=30)
+
+        frames = []
+        runner = sperling.SerialTrialRunner(trial=[item], clock=pygame.time.Clock(), surface=screen, fps=100,
+                                            on_frame=lambda frame, item: frames.append((frame.shape, frame[0, 0].copy(),
+                                                                                        item.name)))
+        runner.run()
+
+        self.assertEqual(len(frames), runner.timeline[0].n_frames)
+        self.assertTupleEqual(frames[0][0], (24, 32, 3))
+        self.assertListEqual(list(frames[0][1]), list(sperling.constants.RED))
+        self.assertEqual(frames[0][2], 'mask')
+
+        # frame views are released after the callback
+        self.assertFalse(screen.get_locked())
+
+    def test_invalid_render_mode(self):
+        with self.assertRaises(ValueError):
+            sperling.SerialTrialRunner(trial=self._items, clock=pygame.time.Clock(), surface=screen, fps=100,
+                                       render_mode='invalid')
+
     def _execute_basic_runner(self):
         runner = sperling.SerialTrialRunner(trial=self._items,
                                             clock=pygame.time.Clock(),
@@ -147,9 +223,16 @@ class TestGridGenerator(TestCase):
             spec = sperling.GridGenerator(n_rows, n_columns, charset_id)
             grid = spec()
 
-            self.assertIsInstance(grid, list)
             self.assertEqual(len(grid), n_rows)
 
+            # grids still behave like the lists of rows they replaced
+            rows = grid.tolist()
+            self.assertEqual(grid, rows)
+            self.assertListEqual(list(grid), rows)
+            self.assertListEqual(grid[0:2], rows[0:2])
+            self.assertListEqual(grid[::-1], rows[::-1])
+            self.assertEqual(grid[-1][0], rows[-1][0])
+
             for row in grid:
                 self.assertEqual(len(row), n_columns)
 
@@ -162,6 +245,34 @@ class TestGridGenerator(TestCase):
         except Exception as exc:
             self.fail('Raised unexpected exception: {}'.format(exc))
 
+    def test_bulk_generation(self):
+        generator = sperling.GridGenerator(n_rows=3, n_columns=4, charset=sperling.constants.CONSONANTS,
+                                           allow_repeats=False, seed=11)
+        cells = generator.generate_cells(500)
+
+        self.assertEqual(cells.shape, (500, 3, 4))
+        self.assertTrue(all(len(set(grid.flatten())) == 12 for grid in cells))
+        self.assertTrue(set(map(chr, cells.flatten())) <= sperling.constants.CONSONANTS)
+
+        same_generator = sperling.GridGenerator(n_rows=3, n_columns=4, charset=sperling.constants.CONSONANTS,
+                                                allow_repeats=False, seed=11)
+        self.assertListEqual(same_generator.generate(500), [sperling.Grid(grid) for grid in cells])
+
+        with self.assertRaises(ValueError):
+            sperling.GridGenerator(n_rows=2, n_columns=4, charset=sperling.constants.VOWELS,
+                                   allow_repeats=False).generate(1)
+
+    def test_single_grids_served_from_pool(self):
+        generator = sperling.GridGenerator(n_rows=2, n_columns=3, charset=sperling.constants.CONSONANTS, seed=2)
+        grids = [generator() for _ in range(sperling.constants.GRID_POOL_SIZE + 1)]
+
+        # grids are views of the pool, which is refilled once exhausted
+        self.assertIs(grids[0].cells.base, grids[1].cells.base)
+        self.assertIsNot(grids[0].cells.base, grids[-1].cells.base)
+
+        same_generator = sperling.GridGenerator(n_rows=2, n_columns=3, charset=sperling.constants.CONSONANTS, seed=2)
+        self.assertListEqual(grids[:10], same_generator.generate(10))
+
     def test_randomized_spec(self):
         generate_grid = sperling.GridGenerator.get_random_spec(
             range_rows=(1, 1),
@@ -199,6 +310,45 @@ class TestGridGenerator(TestCase):
         self.assertEqual(str(generator), expected_string)
 
 
+class TestGrid(TestCase):
+
+    def test_list_compatible(self):
+        rows = [['B', 'C', 'D'], ['F', 'G', 'H']]
+        grid = sperling.Grid.from_rows(rows)
+
+        self.assertEqual((grid.n_rows, grid.n_columns), (2, 3))
+        self.assertEqual(len(grid), 2)
+        self.assertEqual(len(grid[0]), 3)
+        self.assertEqual(grid[1][2], 'H')
+        self.assertEqual(grid, rows)
+        self.assertListEqual([''.join(row) for row in grid], ['BCD', 'FGH'])
+
+        grid[0][1] = 'X'
+        self.assertEqual(grid.tolist(), [['B', 'X', 'D'], ['F', 'G', 'H']])
+
+    def test_row_views_share_memory(self):
+        grid = sperling.Grid.from_rows(['BCD', 'FGH'])
+        row = grid.row(1)
+
+        self.assertEqual(row, [['F', 'G', 'H']])
+        grid[1][0] = 'Z'
+        self.assertEqual(row[0][0], 'Z')
+
+    def test_matches(self):
+        grid = sperling.Grid.from_rows(['BCD', 'FGH'])
+        response = sperling.Grid.from_rows(['B?D', 'FGX'])
+
+        self.assertListEqual(grid.matches(response).tolist(), [[True, False, True], [True, True, False]])
+        self.assertListEqual(grid.matches([['B', 'C', 'D'], ['?', '?', '?']]).sum(axis=1).tolist(), [3, 0])
+
+    def test_serialization(self):
+        grid = sperling.Grid.from_rows(['BCD', 'FGH'])
+
+        self.assertEqual(sperling.Grid.frombytes(grid.tobytes(), 2, 3), grid)
+        self.assertEqual(pickle.loads(pickle.dumps(grid)), grid)
+        self.assertNotEqual(grid, sperling.Grid.from_rows(['BCD']))
+
+
 class TestSession(TestCase):
 
     @classmethod
@@ -238,6 +388,55 @@ class TestSession(TestCase):
         except Exception as exc:
             self.fail('Unexpected exception: {}'.format(exc))
 
+    def test_results_written_before_interruption(self):
+        subject = sperling.simulation.SimulatedSubject(answer=sperling.simulation.correct_answer)
+        n_fixations = []
+
+        def responder(item, runner):
+            if item.name == sperling.constants.FIXATION:
+                n_fixations.append(item)
+
+                # the subject presses ESC during the fourth trial
+                if len(n_fixations) == 4:
+                    return [(10, pygame.event.Event(pygame.KEYDOWN, key=pygame.K_ESCAPE))]
+
+            return subject(item, runner)
+
+        experiment = sperling.experiments.Experiment3(screen, font, n_trials=5, seed=4)
+
+        with tempfile.TemporaryDirectory() as directory:
+            session = sperling.Session(self.subject, experiments=[experiment], results_dir=directory)
+            with self.assertRaises(InterruptedError):
+                session.run(runner_cls=sperling.SimulatedTrialRunner, responder=responder)
+
+            stores = sperling.results.load_results(session.results_path)
+            with open(session.results_path + '.jsonl') as json_file:
+                records = [json.loads(line) for line in json_file]
+
+        self.assertEqual(len(stores), 1)
+        self.assertListEqual(list(stores[0]), list(experiment.results))
+        self.assertEqual(len(stores[0]), 3)
+
+        self.assertListEqual([record['type'] for record in records], ['experiment', 'trial', 'trial', 'trial'])
+        self.assertEqual(records[1]['correct_response'], [''.join(experiment.results[0].correct_response[0])])
+
+    def test_write_errors_raised(self):
+        experiment = sperling.experiments.Experiment1(screen, font)
+        result = sperling.ResponseEntry(response_time=100, actual_response=[['\u00e9']], correct_response=[['B']],
+                                        durations={}, timeline=[])
+
+        with tempfile.TemporaryDirectory() as directory:
+            writer = sperling.results.ResultsWriter(os.path.join(directory, 'results'))
+            writer.begin_experiment(experiment)
+
+            # results are encoded as ascii by the writer thread
+            writer.write(0, result)
+            with self.assertRaises(UnicodeEncodeError):
+                writer.close()
+
+            with self.assertRaises(UnicodeEncodeError):
+                writer.write(1, result)
+
 
 class TestExperiment(TestCase):
 
@@ -252,3 +451,524 @@ class TestExperiment(TestCase):
 
         except Exception as exc:
             self.fail('Unexpected exception: {}'.format(exc))
+
+    def test_create_without_template(self):
+        experiment = sperling.experiments.Experiment(screen, font)
+
+        self.assertIsNone(experiment.generate_grid())
+        self.assertIsNone(experiment.response_grid)
+        self.assertEqual(len(experiment.results), 0)
+
+    def test_run_without_template(self):
+        experiment = sperling.experiments.Experiment(screen, font, n_trials=2)
+
+        with patch('sperling.SerialTrialRunner.run', return_value=0) as run:
+            experiment.run()
+
+        self.assertEqual(run.call_count, 2)
+        self.assertListEqual(experiment.trial_items, [])
+
+        with self.assertRaises(ValueError):
+            experiment.compile_plan()
+
+        experiment.template = sperling.templates.WHOLE_REPORT_TEMPLATE
+        with self.assertRaises(ValueError):
+            experiment.compile_plan()
+
+    def test_generate_grid_and_response_grid(self):
+        experiment = sperling.experiments.Experiment1(screen, font, seed=1)
+        experiment._pre_run()
+
+        grid = experiment.generate_grid()
+        self.assertEqual(grid, experiment.plan[0].grid)
+        self.assertEqual(len(experiment.response_grid), len(grid))
+        self.assertTrue(all(char == '?' for row in experiment.response_grid for char in row))
+
+    def test_pre_run_composes_static_items(self):
+        experiment = sperling.experiments.Experiment3(screen, font)
+        experiment._pre_run()
+
+        for item in experiment.trial_items:
+            if item.static:
+                self.assertIsInstance(item.renderer, sperling.view.FrameRenderer)
+                self.assertEqual(item.renderer.frame.get_size(), screen.get_size())
+                self.assertEqual(item.renderer.frame.get_bitsize(), screen.get_bitsize())
+            else:
+                self.assertNotIsInstance(item.renderer, sperling.view.FrameRenderer)
+
+        static_names = [item.name for item in experiment.trial_items if item.static]
+        self.assertListEqual(static_names, [sperling.constants.FIXATION, sperling.constants.POST_FIXATION_MASK,
+                                            sperling.constants.STIMULUS, sperling.constants.POST_STIMULUS_MASK,
+                                            sperling.constants.CUE])
+
+    def test_next_trial_prepared_before_feedback_ends(self):
+        experiment = sperling.experiments.Experiment3(screen, font, n_trials=3)
+
+        # the index of the trial that is ready when each trial's feedback ends
+        ready = []
+        pre_run = experiment._pre_run
+
+        def record_pre_run():
+            trial_info = pre_run()
+
+            feedback = experiment.trial_items[-1]
+            post = feedback.post
+
+            def record_post(*args, **kwargs):
+                ready.append(experiment._next_trial[0] if experiment._next_trial is not None else None)
+                return post(*args, **kwargs)
+
+            feedback.post = record_post
+            return trial_info
+
+        experiment._pre_run = record_pre_run
+        experiment.run(runner_cls=sperling.SimulatedTrialRunner, responder=sperling.simulation.SimulatedSubject())
+
+        self.assertListEqual(ready, [1, 2, None])
+        self.assertIsNone(experiment._next_trial)
+
+    def test_next_trial_composed_ahead(self):
+        experiment = sperling.experiments.Experiment3(screen, font, n_trials=2)
+        experiment._pre_run()
+
+        feedback = experiment.trial_items[-1]
+        self.assertEqual(feedback.name, sperling.constants.FEEDBACK)
+        feedback.pre()
+
+        index, plan, items = experiment._next_trial
+        self.assertEqual(index, 1)
+        self.assertTrue(all(isinstance(item.renderer, sperling.view.FrameRenderer) for item in items if item.static))
+
+        # only the prepared items are swapped in
+        experiment._trial_index = 1
+        with patch.object(experiment, '_build_trial') as build_trial:
+            experiment._pre_run()
+
+        build_trial.assert_not_called()
+        self.assertListEqual(experiment.trial_items, items)
+
+    def test_layout_matches_rendered_grids(self):
+        experiment = sperling.experiments.Experiment3(screen, font)
+        plan = experiment.compile_plan()[0]
+        layout = experiment._layout_trial(plan)
+
+        char_grid = sperling.view.CharacterGrid(grid=plan.grid, font=font)
+        self.assertEqual(layout.stimulus_pos, ((screen.get_width() - char_grid.image.get_width()) // 2,
+                                               (screen.get_height() - char_grid.image.get_height()) // 2))
+        self.assertIsNotNone(layout.cue_pos)
+        self.assertTrue(0 <= plan.cue_index < len(plan.grid))
+
+
+class TestClockScheduler(TestCase):
+
+    def test_item_frames_counted_from_its_own_onset(self):
+        renderer = MagicMock()
+        items = [sperling.TrialItem(name=sperling.constants.POST_FIXATION_MASK, renderer=MagicMock(), duration=100,
+                                    pre=lambda: time.sleep(.2)),
+                 sperling.TrialItem(name=sperling.constants.STIMULUS, renderer=renderer, duration=50,
+                                    pre=lambda: time.sleep(.2))]
+
+        runner = sperling.SerialTrialRunner(trial=items, clock=pygame.time.Clock(), surface=screen, fps=30)
+        runner.run()
+
+        # at 30 fps, 50 ms is two frames; the gap before the item is not charged to it
+        self.assertEqual(renderer.call_count, 2)
+        self.assertLess(runner.times_per_item[sperling.constants.STIMULUS], 100)
+
+
+class TestFrameLockedScheduler(TestCase):
+
+    def test_durations_converted_to_frames(self):
+        scheduler = sperling.timing.FrameLockedScheduler(refresh_rate=100)
+
+        self.assertEqual(scheduler.n_frames(50), 5)
+        self.assertEqual(scheduler.n_frames(1), 1)
+        self.assertEqual(scheduler.n_frames(500), 50)
+
+    def test_runner_presents_whole_frames(self):
+        renderer = MagicMock()
+        items = [sperling.TrialItem(name=sperling.constants.STIMULUS, renderer=renderer, duration=50),
+                 sperling.TrialItem(name=sperling.constants.POST_STIMULUS_MASK, renderer=renderer, duration=1)]
+
+        runner = sperling.SerialTrialRunner(trial=items, clock=pygame.time.Clock(), surface=screen, fps=100,
+                                            scheduler=sperling.timing.FrameLockedScheduler(refresh_rate=100))
+
+        with self.assertLogs('sperling.timing', level='WARNING') as logs:
+            runner.run()
+
+        self.assertEqual(renderer.call_count, 5 + 1)
+
+        # only the unattainable duration is reported
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn(sperling.constants.POST_STIMULUS_MASK, logs.output[0])
+
+    def test_unsynchronized_display_uses_fallback_rate(self):
+        with patch('pygame.display.flip'), self.assertLogs('sperling.timing', level='WARNING'):
+            self.assertEqual(sperling.timing.measure_refresh_rate(n_samples=3, fallback=75), 75)
+
+
+class TestTrialTemplate(TestCase):
+
+    def test_from_config(self):
+        config = sperling.templates.load_config(os.path.join(os.path.dirname(__file__), '..', 'config.yml'))
+        template = sperling.templates.TrialTemplate.from_config(config['trial'])
+
+        self.assertListEqual(template.items, sperling.templates.WHOLE_REPORT_TEMPLATE.items)
+
+    def test_invalid_templates(self):
+        with self.assertRaises(ValueError):
+            sperling.templates.TrialTemplate.from_config([{'name': 'X', 'kind': 'invalid'}])
+
+        with self.assertRaises(ValueError):
+            sperling.templates.TrialTemplate.from_config([{'name': 'X', 'kind': 'mask', 'advance_on': 'INVALID'}])
+
+        with self.assertRaises(ValueError):
+            sperling.templates.TrialTemplate.from_config([{'name': 'X', 'kind': 'feedback'}])
+
+    def test_invariant_items_compiled_once(self):
+        experiment = sperling.experiments.Experiment3(screen, font)
+
+        experiment._pre_run()
+        first_trial = list(experiment.trial_items)
+        experiment._pre_run()
+
+        for first, second in zip(first_trial, experiment.trial_items):
+            if first.name in (sperling.constants.FIXATION, sperling.constants.POST_FIXATION_MASK,
+                              sperling.constants.POST_STIMULUS_MASK):
+                # each trial gets its own item (with its own duration), presenting the same pre-composed frame
+                self.assertIs(first.renderer, second.renderer)
+            else:
+                self.assertIsNot(first.renderer, second.renderer)
+
+
+class TestSessionPlan(TestCase):
+
+    def test_plan_reproducible_from_seed(self):
+        plan = sperling.experiments.Experiment3(screen, font, n_trials=20, seed=42).compile_plan(seed=42)
+        same_plan = sperling.experiments.Experiment3(screen, font, n_trials=20).compile_plan(seed=42)
+
+        self.assertEqual(len(plan), 20)
+        self.assertListEqual([plan[i] for i in range(len(plan))], [same_plan[i] for i in range(len(same_plan))])
+
+        for i in range(len(plan)):
+            trial = plan[i]
+            self.assertIn(trial.grid_spec, sperling.experiments.Experiment3(screen, font).grid_specs)
+            self.assertTrue(0 <= trial.cue_index < trial.grid_spec.n_rows)
+            self.assertEqual(trial.durations[sperling.constants.STIMULUS],
+                             sperling.constants.DEFAULT_DURATIONS[sperling.constants.STIMULUS])
+
+    def test_whole_report_trials_not_cued(self):
+        grid_spec = sperling.GridSpec(n_rows=2, n_columns=3, charset=sperling.constants.ALPHA, allow_repeats=False)
+        plan = sperling.experiments.Experiment1(screen, font, grid_spec=grid_spec, n_trials=5).compile_plan()
+
+        for i in range(len(plan)):
+            self.assertIsNone(plan[i].cue_index)
+            self.assertEqual(plan[i].grid_spec, grid_spec)
+            self.assertEqual(len(set(itertools.chain.from_iterable(plan[i].grid))), 6)
+
+    def test_save_and_load(self):
+        plan = sperling.experiments.Experiment3(screen, font, n_trials=10).compile_plan(seed=7)
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'session.plan')
+            plan.save(path)
+            loaded = sperling.plan.SessionPlan.load(path)
+
+            with open(path, 'rb') as plan_file:
+                data = plan_file.read()
+
+        self.assertEqual(loaded.seed, 7)
+        self.assertListEqual([loaded[i] for i in range(len(loaded))], [plan[i] for i in range(len(plan))])
+
+        # durations are stored as 4 byte little-endian ints, after the one byte spec and cue indices
+        header_length, = struct.unpack('<I', data[:4])
+        offset = 4 + header_length + 2 * len(plan)
+        self.assertListEqual(list(struct.unpack('<{}I'.format(len(plan.durations)),
+                                                data[offset:offset + 4 * len(plan.durations)])),
+                             list(plan.durations))
+
+    def test_experiment_replays_plan(self):
+        plan = sperling.experiments.Experiment1(screen, font, n_trials=3).compile_plan(seed=1)
+        experiment = sperling.experiments.Experiment1(screen, font, n_trials=3, plan=plan)
+
+        grids = []
+        with patch('sperling.SerialTrialRunner.run', autospec=True,
+                   side_effect=lambda runner: grids.append(runner.trial[3].post.correct) or 0):
+            experiment.run()
+
+        self.assertListEqual(grids, [plan[i].grid for i in range(len(plan))])
+
+        with self.assertRaises(ValueError):
+            sperling.experiments.Experiment1(screen, font, n_trials=4, plan=plan).run()
+
+    def test_replay_records_plan_durations(self):
+        stimulus = sperling.constants.STIMULUS
+        plan = sperling.experiments.Experiment1(screen, font, n_trials=2,
+                                                duration_overrides={stimulus: 200}).compile_plan(seed=1)
+
+        # replayed by an experiment with the default durations
+        experiment = sperling.experiments.Experiment1(screen, font, n_trials=2, plan=plan)
+        experiment.run(runner_cls=sperling.SimulatedTrialRunner, responder=sperling.simulation.SimulatedSubject())
+
+        self.assertNotEqual(experiment.durations[stimulus], 200)
+        for result in experiment.results:
+            self.assertEqual(result.durations[stimulus], 200)
+
+        self.assertListEqual(list(experiment.statistics.by_duration),
+                             [sperling.analysis.OnlineStatistics.duration_key(plan[0].durations)])
+
+
+class TestSimulatedTrialRunner(TestCase):
+
+    def test_virtual_clock(self):
+        clock = sperling.timing.VirtualClock()
+        clock.advance(250)
+        clock.advance_to(300)
+
+        self.assertEqual(clock.now(), 300)
+        self.assertEqual(clock.now_ns(), 300000000)
+
+        with self.assertRaises(ValueError):
+            clock.advance_to(299)
+
+    def test_simulated_subject_responds_in_virtual_time(self):
+        subject = sperling.simulation.SimulatedSubject(
+            answer=lambda item, runner: [''.join(row) for row in item.post.correct])
+        experiment = sperling.experiments.Experiment3(screen, font, n_trials=20, seed=3)
+
+        clock = sperling.timing.VirtualClock()
+        experiment.run(runner_cls=sperling.SimulatedTrialRunner, clock=clock, responder=subject)
+
+        self.assertEqual(len(experiment.results), 20)
+        for result in experiment.results:
+            self.assertEqual(sperling.n_correct(result), len(result.correct_response[0]))
+
+            # the RETURN key follows the last character and the end of the row
+            n_keys = len(result.correct_response[0]) + 2
+            self.assertEqual(result.response_time,
+                             subject.reaction_time + (n_keys - 1) * subject.key_interval)
+
+        # fixation and feedback are ended after the reaction time; the other items run to their deadlines
+        durations = sperling.constants.DEFAULT_DURATIONS
+        trial_time = (2 * subject.reaction_time + experiment.results[0].response_time +
+                      sum(durations[name] for name in (sperling.constants.POST_FIXATION_MASK,
+                                                       sperling.constants.STIMULUS,
+                                                       sperling.constants.POST_STIMULUS_MASK,
+                                                       sperling.constants.CUE)))
+        self.assertEqual(clock.now(), 20 * trial_time)
+
+    def test_static_items_not_composed(self):
+        experiment = sperling.experiments.Experiment1(screen, font, n_trials=1)
+
+        with patch('sperling.view.compose_frame', wraps=sperling.view.compose_frame) as compose_frame:
+            experiment.run(runner_cls=sperling.SimulatedTrialRunner, responder=sperling.simulation.SimulatedSubject())
+
+        # only the template's invariant items (fixation and mask) are composed
+        self.assertEqual(compose_frame.call_count, 2)
+
+
+class TestSweep(TestCase):
+
+    def setUp(self):
+        self.sweep = sperling.sweep.Sweep(
+            sperling.experiments.Experiment3, sperling.simulation.SimulatedSubject(
+                answer=sperling.simulation.correct_answer),
+            durations={sperling.constants.STIMULUS: [50, 500], sperling.constants.CUE: [0, 100, 300]},
+            n_trials=2, seed=5, screen_size=(256, 192), font_size=16)
+
+    def test_cells(self):
+        self.assertEqual(len(self.sweep.cells), 6)
+        self.assertEqual(len({cell.seed for cell in self.sweep.cells}), 6)
+        self.assertIn({sperling.constants.STIMULUS: 500, sperling.constants.CUE: 100},
+                      [cell.duration_overrides for cell in self.sweep.cells])
+
+        same_sweep = sperling.sweep.Sweep(sperling.experiments.Experiment3, None, durations=self.sweep.durations,
+                                          n_trials=2, seed=5)
+        self.assertListEqual([cell.seed for cell in same_sweep.cells], [cell.seed for cell in self.sweep.cells])
+
+    def test_run_merges_cells(self):
+        entries = self.sweep.run(processes=2)
+
+        self.assertEqual(len(entries), 12)
+        self.assertListEqual([entry.cell.index for entry in entries], [i // 2 for i in range(12)])
+
+        for entry in entries:
+            self.assertEqual(entry.result.durations[sperling.constants.CUE],
+                             entry.cell.duration_overrides[sperling.constants.CUE])
+            self.assertEqual(sperling.n_correct(entry.result), len(entry.result.correct_response[0]))
+
+    def test_run_merged(self):
+        store = self.sweep.run_merged(processes=2)
+
+        self.assertIsInstance(store, sperling.results.ResultStore)
+        self.assertEqual(len(store), 12)
+        self.assertListEqual([result.durations[sperling.constants.CUE] for result in store][::2],
+                             [cell.duration_overrides[sperling.constants.CUE] for cell in self.sweep.cells])
+
+
+class TestResultStore(TestCase):
+
+    def setUp(self):
+        self.item_names = [sperling.constants.STIMULUS, sperling.constants.RESPONSE]
+        self.spec = sperling.GridSpec(n_rows=2, n_columns=3, charset=sperling.constants.CONSONANTS,
+                                      allow_repeats=True)
+
+    def test_append_and_read_back(self):
+        store = sperling.results.ResultStore(self.item_names, capacity=1)
+        durations = {sperling.constants.STIMULUS: 50, sperling.constants.RESPONSE: 1000}
+        timeline = [sperling.timing.ItemTiming(sperling.constants.STIMULUS, 10, 11, 12, 13, 2)]
+
+        store.append(120, [['B', 'C']], [['B', 'D']], durations, timeline=timeline, grid_spec=self.spec, cue_index=1)
+        store.append(250, [['F', '?', 'G'], ['H', 'J', 'K']], [['F', 'X', 'G'], ['H', 'J', 'K']], durations)
+
+        # durations are snapshots
+        durations[sperling.constants.STIMULUS] = 500
+
+        self.assertEqual(len(store), 2)
+        self.assertEqual(store[0], sperling.ResponseEntry(
+            response_time=120, actual_response=[['B', 'C']], correct_response=[['B', 'D']],
+            durations={sperling.constants.STIMULUS: 50, sperling.constants.RESPONSE: 1000}, timeline=timeline,
+            grid_spec=self.spec, cue_index=1))
+        self.assertListEqual(store[-1].actual_response, [['F', '?', 'G'], ['H', 'J', 'K']])
+        self.assertIsNone(store[1].cue_index)
+        self.assertListEqual([sperling.n_correct(result) for result in store], [1, 5])
+
+        self.assertEqual(store.column('correct').shape, (2, 2, 3))
+        self.assertListEqual(store.column('response_time').tolist(), [120, 250])
+
+        self.assertListEqual(store[0:1], [store[0]])
+        self.assertListEqual(store[::-1], [store[1], store[0]])
+        self.assertListEqual(store[5:], [])
+
+        store.clear()
+        self.assertEqual(len(store), 0)
+
+    def test_entry_created_with_baseline_fields(self):
+        entry = sperling.ResponseEntry(120, [['B']], [['B']], {sperling.constants.STIMULUS: 50})
+        self.assertTupleEqual((entry.timeline, entry.grid_spec, entry.cue_index), (None, None, None))
+
+    def test_concatenate(self):
+        other_spec = self.spec._replace(n_rows=1)
+        durations = {sperling.constants.STIMULUS: 50}
+
+        store = sperling.results.ResultStore(self.item_names)
+        store.append(100, [['B']], [['B']], durations, grid_spec=self.spec)
+
+        other = sperling.results.ResultStore(self.item_names)
+        other.append(200, [['C', 'D']], [['C', 'F']], durations, grid_spec=other_spec)
+        other.append(300, [['G']], [['G']], durations, grid_spec=self.spec)
+
+        merged = sperling.results.ResultStore.concatenate([store, pickle.loads(pickle.dumps(other))])
+
+        self.assertListEqual([result.response_time for result in merged], [100, 200, 300])
+        self.assertListEqual([result.grid_spec for result in merged], [self.spec, other_spec, self.spec])
+        self.assertListEqual(merged[1].actual_response, [['C', 'D']])
+
+        with self.assertRaises(ValueError):
+            sperling.results.ResultStore.concatenate([store, sperling.results.ResultStore(['other'])])
+
+    def test_experiment_results(self):
+        experiment = sperling.experiments.Experiment3(screen, font, n_trials=3, seed=2)
+        experiment.run(runner_cls=sperling.SimulatedTrialRunner, responder=sperling.simulation.SimulatedSubject())
+
+        plan = experiment.plan
+        for i, result in enumerate(experiment.results):
+            self.assertEqual(result.grid_spec, plan[i].grid_spec)
+            self.assertEqual(result.cue_index, plan[i].cue_index)
+            self.assertListEqual(result.correct_response, [plan[i].grid[plan[i].cue_index]])
+
+            # the timeline is completed by the items after the response
+            self.assertListEqual([timing.name for timing in result.timeline],
+                                 [item.name for item in experiment.template.items])
+
+        experiment.reset()
+        self.assertEqual(len(experiment.results), 0)
+
+
+class TestAnalysis(TestCase):
+
+    def setUp(self):
+        self.spec = sperling.GridSpec(n_rows=3, n_columns=2, charset=sperling.constants.CONSONANTS,
+                                      allow_repeats=True)
+
+        self.results = sperling.results.ResultStore([sperling.constants.STIMULUS])
+        short, long = {sperling.constants.STIMULUS: 50}, {sperling.constants.STIMULUS: 500}
+
+        # partial report: the cued row only
+        self.results.append(100, [['B', '?']], [['B', 'C']], short, grid_spec=self.spec, cue_index=2)
+        self.results.append(100, [['D', 'F']], [['D', 'F']], long, grid_spec=self.spec, cue_index=0)
+
+        # whole report
+        self.results.append(100, [['B', 'C'], ['D', '?'], ['?', '?']], [['B', 'C'], ['D', 'F'], ['G', 'H']], long,
+                            grid_spec=self.spec)
+
+    def test_scores_match_n_correct(self):
+        self.assertListEqual(sperling.analysis.n_correct(self.results).tolist(),
+                             [sperling.n_correct(result) for result in self.results])
+        self.assertListEqual(sperling.analysis.n_correct(list(self.results)).tolist(), [1, 2, 3])
+        self.assertListEqual(sperling.analysis.accuracy(self.results).tolist(), [0.5, 1.0, 0.5])
+
+    def test_letters_available(self):
+        # partial report: proportion of the cued row correct times the letters in the stimulus
+        self.assertListEqual(sperling.analysis.letters_available(self.results).tolist(), [3.0, 6.0, 3.0])
+
+    def test_position_and_row_accuracy(self):
+        positions = sperling.analysis.position_accuracy(self.results)
+        self.assertListEqual(positions.tolist(), [[1.0, 1.0], [1.0, 0.0], [0.5, 0.0]])
+
+        self.assertListEqual(sperling.analysis.row_accuracy(self.results).tolist(), [1.0, 0.5, 0.25])
+
+    def test_breakdowns(self):
+        by_duration = sperling.analysis.by_duration(self.results, sperling.constants.STIMULUS)
+        self.assertEqual(by_duration[50], sperling.analysis.Summary(n_trials=1, accuracy=0.5, letters_available=3.0))
+        self.assertEqual(by_duration[500], sperling.analysis.Summary(n_trials=2, accuracy=0.75, letters_available=4.5))
+
+        (spec, summary), = sperling.analysis.by_spec(self.results)
+        self.assertEqual(spec, self.spec)
+        self.assertEqual(summary.n_trials, 3)
+
+
+class TestOnlineStatistics(TestCase):
+
+    def test_running_statistic(self):
+        values = [0.5, 1.0, 0.25, 0.75, 0.0]
+
+        statistic = sperling.analysis.RunningStatistic()
+        for value in values:
+            statistic.update(value)
+
+        self.assertEqual(statistic.n, 5)
+        self.assertAlmostEqual(statistic.mean, 0.5)
+        self.assertAlmostEqual(statistic.variance, 0.15625)
+        self.assertAlmostEqual(statistic.sem, (0.15625 / 5) ** 0.5)
+
+    def test_matches_analysis_of_results(self):
+        rng = random.Random(3)
+
+        def answer(item, runner):
+            return [''.join(char if rng.random() < 0.5 else '?' for char in row) for row in item.post.correct]
+
+        experiment = sperling.experiments.Experiment3(screen, font, n_trials=30, seed=3)
+        experiment.run(runner_cls=sperling.SimulatedTrialRunner,
+                       responder=sperling.simulation.SimulatedSubject(answer=answer))
+
+        statistics = experiment.statistics
+        self.assertEqual(statistics.overall.n, 30)
+        self.assertAlmostEqual(statistics.overall.mean, sperling.analysis.accuracy(experiment.results).mean())
+
+        row_accuracy = sperling.analysis.row_accuracy(experiment.results)
+        for row, statistic in statistics.by_row.items():
+            self.assertAlmostEqual(statistic.mean, row_accuracy[row])
+
+        spec_key = statistics.spec_key(experiment.grid_specs[0])
+        self.assertEqual(statistics.by_spec[spec_key].n, 30)
+        self.assertEqual(statistics.by_duration[statistics.duration_key(experiment.plan[0].durations)].n, 30)
+
+    def test_converged_experiment_stops_early(self):
+        experiment = sperling.experiments.Experiment1(screen, font, n_trials=100)
+        experiment.run(runner_cls=sperling.SimulatedTrialRunner,
+                       responder=sperling.simulation.SimulatedSubject(answer=sperling.simulation.correct_answer),
+                       stop_when=sperling.analysis.Convergence(tolerance=0.01, min_trials=10))
+
+        # every answer is correct, so the accuracy has no variance
+        self.assertEqual(len(experiment.results), 10)
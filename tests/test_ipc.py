@@ -0,0 +1,461 @@
+import io
+import json
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from unittest import TestCase
+
+import numpy as np
+
+import benchmarks.transport
+import ipc
+
+
+def _echo(ring, replies):
+    msg = ring.get(timeout=10)
+    replies.put((msg.pid, msg.content.sum(), msg.content.shape))
+
+
+class TestRingBuffer(TestCase):
+
+    def setUp(self):
+        self.ring = ipc.RingBuffer(n_slots=2, slot_size=1024)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_contents_round_trip(self):
+        frame = np.arange(24, dtype=np.uint16).reshape(2, 3, 4)
+        ipc.send_msgs(self.ring, [frame, b'motor command'])
+
+        array_msg, bytes_msg = ipc.recv_msgs(self.ring)
+
+        self.assertEqual(array_msg.pid, os.getpid())
+        self.assertTrue(np.array_equal(array_msg.content, frame))
+        self.assertEqual(array_msg.content.dtype, frame.dtype)
+        self.assertIsInstance(bytes_msg.content, memoryview)
+        self.assertEqual(bytes(bytes_msg.content), b'motor command')
+
+        # both slots are in use until the next receive releases them
+        del array_msg, bytes_msg
+        self.ring.release()
+
+        ipc.send_msgs(self.ring, [{'action': 3}])
+        self.assertEqual(ipc.recv_msgs(self.ring)[0].content, {'action': 3})
+
+    def test_unpackable_arrays_pickled(self):
+        contents = [np.array([1, 'a'], dtype=object), np.zeros((1, 2, 1, 2, 1)),
+                    np.array([(1, 2.5)], dtype=[('a', np.int32), ('b', np.float64)])]
+
+        for content in contents:
+            self.ring.put(ipc.Message(pid=0, time=0, content=content), block=False)
+
+            received = self.ring.get(block=False).content
+            self.assertEqual(received.dtype, content.dtype)
+            self.assertTrue(np.array_equal(received, content))
+
+            del received
+            self.ring.release()
+
+    def test_strided_array(self):
+        frame = np.arange(24, dtype=np.uint8).reshape(2, 3, 4).transpose(1, 0, 2)
+        self.ring.put(ipc.Message(pid=0, time=0, content=frame), block=False)
+
+        received = self.ring.get(block=False).content
+        self.assertTrue(np.array_equal(received, frame))
+
+        del received
+        self.ring.release()
+
+    def test_slots_freed_on_release(self):
+        msg = ipc.Message(pid=0, time=ipc.current_time_in_nanos(), content=b'x')
+        self.ring.put(msg, block=False)
+        self.ring.put(msg, block=False)
+
+        with self.assertRaises(queue.Full):
+            self.ring.put(msg, block=False)
+
+        # received contents are views of their slots until released
+        self.ring.get(block=False)
+        with self.assertRaises(queue.Full):
+            self.ring.put(msg, block=False)
+
+        self.ring.release()
+        self.ring.put(msg, block=False)
+        self.assertEqual(self.ring.qsize(), 2)
+
+        with self.assertRaises(ValueError):
+            self.ring.put(ipc.Message(pid=0, time=0, content=bytes(2048)), block=False)
+
+    def test_empty(self):
+        with self.assertRaises(queue.Empty):
+            self.ring.get(block=False)
+
+        self.assertListEqual(ipc.recv_msgs(self.ring), [])
+
+    def test_shared_with_another_process(self):
+        context = multiprocessing.get_context('spawn')
+        ring = ipc.RingBuffer(n_slots=2, slot_size=64 * 64 * 3, context=context)
+        replies = context.Queue()
+
+        try:
+            process = context.Process(target=_echo, args=(ring, replies))
+            process.start()
+
+            frame = np.ones((64, 64, 3), dtype=np.uint8)
+            ring.put(ipc.Message(pid=os.getpid(), time=0, content=frame), timeout=10)
+
+            self.assertEqual(replies.get(timeout=10), (os.getpid(), frame.sum(), frame.shape))
+            process.join()
+        finally:
+            ring.close()
+
+
+class TestBatch(TestCase):
+
+    def setUp(self):
+        self.contents = [7, -2.5, 'left', b'motor command', np.arange(12, dtype=np.float32).reshape(3, 4), {'key': 'B'}]
+
+    def assertContentsEqual(self, msgs, contents):
+        self.assertEqual(len(msgs), len(contents))
+        for msg, content in zip(msgs, contents):
+            if isinstance(content, np.ndarray):
+                self.assertTrue(np.array_equal(msg.content, content))
+                self.assertEqual(msg.content.dtype, content.dtype)
+            elif isinstance(content, bytes):
+                self.assertEqual(bytes(msg.content), content)
+            else:
+                self.assertEqual(msg.content, content)
+
+    def test_encode_batch(self):
+        msgs = [ipc.Message(pid=os.getpid(), time=n, content=content) for n, content in enumerate(self.contents)]
+        decoded = ipc.decode_batch(ipc.encode_batch(msgs))
+
+        self.assertContentsEqual(decoded, self.contents)
+        self.assertListEqual([msg.time for msg in decoded], list(range(len(self.contents))))
+        self.assertTrue(all(msg.pid == os.getpid() for msg in decoded))
+
+        # ints are packed, not pickled
+        self.assertEqual(len(ipc.encode_batch(msgs[:1])), 4 + 17 + 8)
+        self.assertListEqual(ipc.decode_batch(ipc.encode_batch([])), [])
+
+    def test_queue(self):
+        msg_queue = multiprocessing.Queue()
+        try:
+            ipc.send_batch(msg_queue, self.contents)
+            ipc.send_batch(msg_queue, [1, 2])
+
+            # the queue holds one item per batch
+            msgs = []
+            for _ in range(100):
+                msgs.extend(ipc.recv_batch(msg_queue))
+                if len(msgs) == len(self.contents) + 2:
+                    break
+
+                time.sleep(.01)
+
+            self.assertContentsEqual(msgs, self.contents + [1, 2])
+        finally:
+            msg_queue.close()
+
+    def test_ring_buffer(self):
+        ring = ipc.RingBuffer(n_slots=2, slot_size=1024)
+        try:
+            ipc.send_batch(ring, self.contents)
+            self.assertEqual(ring.qsize(), 1)
+
+            msgs = ipc.recv_batch(ring)
+            self.assertContentsEqual(msgs, self.contents)
+            self.assertIsInstance(msgs[3].content, memoryview)
+
+            # a single message put on a ring buffer is received as a batch of one
+            ring.put(ipc.Message(pid=0, time=ipc.current_time_in_nanos(), content=3), block=False)
+            self.assertListEqual([msg.content for msg in ipc.recv_batch(ring)], [3])
+        finally:
+            del msgs
+            ring.close()
+
+
+class TestChannel(TestCase):
+
+    def setUp(self):
+        self.ring = ipc.RingBuffer(n_slots=2, slot_size=1024)
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_drop_newest(self):
+        channel = ipc.Channel(self.ring)
+        for n in range(4):
+            channel.send([n, n])
+
+        self.assertListEqual([msg.content for msg in channel.recv()], [0, 0, 1, 1])
+        self.assertEqual(channel.metrics.counts['sent'], 4)
+        self.assertEqual(channel.metrics.counts['dropped_full'], 4)
+        self.assertEqual(channel.metrics.counts['received'], 4)
+
+    def test_drop_oldest(self):
+        channel = ipc.Channel(self.ring, on_full=ipc.DROP_OLDEST, batched=False)
+        self.assertEqual(channel.send([0, 1, 2, 3]), 4)
+
+        self.assertListEqual([msg.content for msg in channel.recv()], [2, 3])
+        self.assertEqual(channel.metrics.counts['evicted'], 2)
+
+        # slots still holding received contents are not evicted
+        self.ring.release()
+        channel.send([4, 5])
+        self.ring.get(block=False)
+        channel.send([6])
+        self.assertEqual(channel.metrics.counts['dropped_full'], 1)
+
+    def test_keep_latest(self):
+        channel = ipc.Channel(self.ring, on_full=ipc.KEEP_LATEST)
+        for n in range(5):
+            channel.send([n])
+
+        self.assertListEqual([msg.content for msg in channel.recv()], [4])
+        self.assertEqual(channel.metrics.counts['evicted'], 3)
+        self.assertEqual(channel.metrics.counts['coalesced'], 1)
+
+    def test_block(self):
+        channel = ipc.Channel(self.ring, on_full=ipc.BLOCK, timeout=.01)
+        channel.send([0])
+        channel.send([1])
+
+        start = time.monotonic()
+        self.assertEqual(channel.send([2]), 0)
+        self.assertGreaterEqual(time.monotonic() - start, .01)
+        self.assertEqual(channel.metrics.counts['dropped_full'], 1)
+
+    def test_stale(self):
+        channel = ipc.Channel(self.ring, stale_after=None)
+        self.ring.put_batch([ipc.Message(pid=0, time=ipc.current_time_in_nanos() - 10 ** 9, content=0)])
+        self.assertEqual(len(channel.recv()), 1)
+        self.ring.release()
+
+        channel = ipc.Channel(self.ring, stale_after=ipc.STALE_AFTER)
+        self.ring.put_batch([ipc.Message(pid=0, time=ipc.current_time_in_nanos() - 10 ** 9, content=0)])
+        channel.send([1])
+
+        self.assertListEqual([msg.content for msg in channel.recv()], [1])
+        self.assertEqual(channel.metrics.counts['dropped_stale'], 1)
+
+    def test_is_stale_msg(self):
+        msg = ipc.Message(pid=0, time=ipc.current_time_in_nanos() - 10 ** 9, content=0)
+
+        self.assertTrue(ipc.is_stale_msg(msg))
+        self.assertTrue(ipc.is_stale_msg(msg, threshold_in_millis=20))
+        self.assertFalse(ipc.is_stale_msg(msg, threshold_in_millis=60000))
+        self.assertFalse(ipc.is_stale_msg(msg, threshold_in_nanos=60 * 10 ** 9))
+        self.assertLessEqual(msg.time // 1000000, ipc.current_time_in_millis())
+
+    def test_queue_eviction(self):
+        msg_queue = multiprocessing.Queue(maxsize=2)
+        try:
+            channel = ipc.Channel(msg_queue, on_full=ipc.DROP_OLDEST)
+            for n in range(4):
+                channel.send([n, n])
+
+            self.assertEqual(channel.metrics.counts['evicted'], 4)
+
+            msgs = []
+            for _ in range(100):
+                msgs.extend(channel.recv())
+                if len(msgs) == 4:
+                    break
+
+                time.sleep(.01)
+
+            self.assertListEqual([msg.content for msg in msgs], [2, 2, 3, 3])
+        finally:
+            msg_queue.close()
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            ipc.Channel(self.ring, on_full='drop everything')
+
+
+class TestChannelMetrics(TestCase):
+
+    def setUp(self):
+        self.ring = ipc.RingBuffer(n_slots=2, slot_size=1024)
+        self.channel = ipc.Channel(self.ring, name='stimuli')
+
+    def tearDown(self):
+        self.ring.close()
+
+    def test_histogram(self):
+        histogram = ipc.Histogram(n_buckets=4)
+        for value in [0, 1, 2, 3, 5, 100]:
+            histogram.add(value)
+
+        self.assertListEqual(histogram.counts, [1, 1, 2, 2])
+        self.assertEqual(histogram.percentile(50), 3)
+        self.assertEqual(histogram.percentile(100), 4)
+        self.assertIsNone(ipc.Histogram().percentile(50))
+
+    def test_metrics(self):
+        self.channel.send([1, 2])
+        self.channel.send([3])
+        self.channel.send([4])
+
+        metrics = self.channel.metrics
+        self.assertEqual(metrics.depth, 2)
+
+        self.assertEqual(len(self.channel.recv()), 3)
+        self.assertEqual(metrics.as_dict()['counts'], {'sent': 3, 'dropped_full': 1, 'received': 3})
+        self.assertEqual(sum(metrics.latency.counts), 3)
+        self.assertEqual(metrics.max_depth, 2)
+
+    def test_drops_logged_at_debug_level(self):
+        with self.assertLogs('ipc', level='DEBUG') as logs:
+            for _ in range(4):
+                self.channel.send([0])
+
+        # rate limited
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('stimuli', logs.output[0])
+
+    def test_reporter(self):
+        stream = io.StringIO()
+        reporter = ipc.MetricsReporter([self.channel], interval=60, stream=stream)
+
+        self.channel.send([0])
+        reporter.poll()
+        reporter.poll()
+
+        lines = stream.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['channels']['stimuli']['counts'], {'sent': 1})
+
+
+class TestBlockingRecv(TestCase):
+
+    def _send_later(self, channel, contents, delay):
+        sender = threading.Timer(delay, channel.send, args=(contents,))
+        sender.start()
+        return sender
+
+    def test_ring_buffer(self):
+        ring = ipc.RingBuffer(n_slots=2, slot_size=1024)
+        channel = ipc.Channel(ring)
+        try:
+            sender = self._send_later(channel, [1, 2], .05)
+
+            # woken by the arrival, well before the timeout
+            start = time.monotonic()
+            msgs = channel.recv(block=True, timeout=10)
+            self.assertListEqual([msg.content for msg in msgs], [1, 2])
+            self.assertLess(time.monotonic() - start, 5)
+            sender.join()
+
+            start = time.monotonic()
+            self.assertListEqual(channel.recv(block=True, timeout=.02), [])
+            self.assertGreaterEqual(time.monotonic() - start, .02)
+        finally:
+            del msgs
+            ring.close()
+
+    def test_queue(self):
+        msg_queue = multiprocessing.Queue()
+        channel = ipc.Channel(msg_queue)
+        try:
+            sender = self._send_later(channel, ['left'], .05)
+            self.assertListEqual([msg.content for msg in channel.recv(block=True, timeout=10)], ['left'])
+            sender.join()
+        finally:
+            msg_queue.close()
+
+
+class TestTransportBenchmark(TestCase):
+
+    def test_run(self):
+        results = benchmarks.transport.run(sizes=[1024], n_round_trips=5, throughput_bytes=1024)
+
+        self.assertListEqual([result['transport'] for result in results], benchmarks.transport.TRANSPORTS)
+        for result in results:
+            self.assertLessEqual(result['one_way_us']['p50'], result['one_way_us']['p99'])
+            self.assertGreater(result['round_trip_us']['p50'], 0)
+            self.assertGreater(result['msgs_per_sec'], 0)
+
+
+def _receive_frame(ring, replies):
+    msgs = ipc.Channel(ring, stale_after=None).recv(block=True, timeout=10)
+    replies.put((ring.index, [(msg.content.sum(), msg.content.shape) for msg in msgs]))
+
+
+class TestBroadcast(TestCase):
+
+    def setUp(self):
+        self.ring = ipc.RingBuffer(n_slots=2, slot_size=1024, n_subscribers=2)
+        self.subscribers = [self.ring.subscriber(i) for i in range(2)]
+
+    def tearDown(self):
+        for subscriber in self.subscribers:
+            subscriber.close()
+        self.ring.close()
+
+    def test_every_subscriber_receives(self):
+        frame = np.arange(12, dtype=np.uint8).reshape(3, 4)
+        ipc.send_batch(self.ring, [frame, 'cue'])
+
+        for subscriber in self.subscribers:
+            self.assertEqual(subscriber.qsize(), 1)
+
+            msgs = ipc.recv_batch(subscriber)
+            self.assertTrue(np.array_equal(msgs[0].content, frame))
+            self.assertEqual(msgs[1].content, 'cue')
+
+        with self.assertRaises(IndexError):
+            self.ring.subscriber(2)
+
+    def test_slots_freed_by_every_subscriber(self):
+        ipc.send_batch(self.ring, [0])
+        ipc.send_batch(self.ring, [1])
+
+        self.subscribers[0].get_batch(block=False)
+        self.subscribers[0].release()
+
+        # the second subscriber has not received either message
+        with self.assertRaises(queue.Full):
+            self.ring.put_batch([ipc.Message(pid=0, time=0, content=2)], block=False)
+
+        self.subscribers[1].get_batch(block=False)
+        self.subscribers[1].release()
+        self.ring.put_batch([ipc.Message(pid=0, time=0, content=2)], block=False)
+
+    def test_lagging_subscriber_evicted(self):
+        channel = ipc.Channel(self.ring, on_full=ipc.KEEP_LATEST)
+        receivers = [ipc.Channel(subscriber, on_full=ipc.KEEP_LATEST) for subscriber in self.subscribers]
+
+        for n in range(3):
+            channel.send([n])
+            receivers[0].recv()
+
+        # only the subscriber that fell behind loses messages
+        self.assertEqual(channel.metrics.counts['evicted'], 1)
+        self.assertListEqual([msg.content for msg in receivers[1].recv()], [2])
+        self.assertEqual(receivers[1].metrics.counts['coalesced'], 1)
+
+    def test_subscriber_processes(self):
+        context = multiprocessing.get_context('spawn')
+        ring = ipc.RingBuffer(n_slots=2, slot_size=64 * 64 * 3 + 1024, context=context, n_subscribers=3)
+        replies = context.Queue()
+
+        try:
+            processes = [context.Process(target=_receive_frame, args=(ring.subscriber(i), replies)) for i in range(3)]
+            for process in processes:
+                process.start()
+
+            frame = np.ones((64, 64, 3), dtype=np.uint8)
+            ipc.Channel(ring, on_full=ipc.BLOCK, timeout=10).send([frame])
+
+            replies = sorted(replies.get(timeout=10) for _ in processes)
+            self.assertListEqual(replies, [(i, [(frame.sum(), frame.shape)]) for i in range(3)])
+
+            for process in processes:
+                process.join()
+        finally:
+            ring.close()
@@ -0,0 +1,96 @@
+import multiprocessing.shared_memory
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+import numpy as np
+
+import lida
+
+
+class TestEnvironment(TestCase):
+
+    def setUp(self):
+        self.environment = lida.Environment(n_agents=2)
+        self.agents = [self.environment.for_agent(i) for i in range(2)]
+
+    def tearDown(self):
+        for view in self.agents + [self.environment]:
+            view.close()
+
+    def test_stimuli_broadcast(self):
+        frame = np.zeros((24, 32, 3), dtype=np.uint8)
+        self.environment.send_stimuli(frame, item=None)
+
+        for agent in self.agents:
+            msgs = agent.receive_stimuli('visual', timeout=10)
+            self.assertEqual(len(msgs), 1)
+            self.assertTrue(np.array_equal(msgs[0].content, frame))
+            del msgs
+
+    def test_actions_per_agent(self):
+        self.agents[0].update([3])
+        self.agents[1].update([7, 8])
+
+        actions = [[] for _ in self.agents]
+        for _ in range(100):
+            for i, msgs in enumerate(self.environment.receive_actions()):
+                actions[i].extend(msg.content for msg in msgs)
+            if sum(map(len, actions)) == 3:
+                break
+
+            time.sleep(.01)
+
+        self.assertListEqual(actions, [[3], [7, 8]])
+
+    def test_actions_never_block(self):
+        start = time.monotonic()
+        for action in range(8):
+            self.agents[0].update([action])
+        self.assertLess(time.monotonic() - start, .05)
+
+        # actions that did not fit are dropped, newest first; the rest are all collected
+        n_sent = 8 - self.agents[0].channels[1].metrics.counts['dropped_full']
+        actions = []
+        for _ in range(100):
+            actions.extend(msg.content for msg in self.environment.step()[0])
+            if len(actions) == n_sent:
+                break
+
+            time.sleep(.01)
+
+        self.assertListEqual(actions, list(range(n_sent)))
+
+    def test_actions_collected_on_every_frame(self):
+        frame = np.zeros((24, 32, 3), dtype=np.uint8)
+        with patch.object(self.environment, 'step') as step:
+            self.environment.on_frame(frame, item=None)
+
+        step.assert_called_once_with()
+        self.assertEqual(len(self.agents[0].receive_stimuli('visual', timeout=10)), 1)
+
+    @patch('pygame.display.set_mode')
+    @patch('pygame.mouse.set_visible')
+    @patch('sperling.view.find_font')
+    @patch('sperling.experiments.Experiment1')
+    @patch('sperling.Session')
+    def test_windowed_experiment_sends_frames(self, session, *_):
+        lida.launch_experiment(self.environment)
+
+        self.assertEqual(session.return_value.run.call_args.kwargs['on_frame'], self.environment.on_frame)
+
+    def test_run_needs_an_agent_per_subscriber(self):
+        with self.assertRaises(ValueError):
+            lida.run([lida.Agent()], self.environment)
+
+    @patch('multiprocessing.Process')
+    def test_run_frees_shared_memory(self, process):
+        environment = lida.Environment(n_agents=2)
+        name = environment.channels[0].queue.name
+
+        lida.run([lida.Agent(), lida.Agent()], environment, headless=True)
+
+        self.assertEqual(process.call_args_list[0].kwargs['args'], (environment, True))
+        self.assertEqual(process.return_value.join.call_count, 3)
+        with self.assertRaises(FileNotFoundError):
+            multiprocessing.shared_memory.SharedMemory(name=name)
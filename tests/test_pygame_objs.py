@@ -4,8 +4,7 @@ import pygame
 
 import sperling.constants
 
-pygame.init()
-screen = pygame.display.set_mode((32, 24))
+screen = sperling.headless.init_display((32, 24))
 
 
 class TestPygameGrid(unittest.TestCase):
@@ -27,3 +26,76 @@ class TestPygameGrid(unittest.TestCase):
 
         except Exception as exc:
             self.fail('Unexpected exception: {}'.format(exc))
+
+    def test_refresh_reuses_sprites(self):
+        font = pygame.font.SysFont("courier", size=20)
+        grid_values = [['B', 'C'], ['D', 'F']]
+        char_grid = sperling.view.CharacterGrid(grid=grid_values, font=font)
+
+        sprites = list(char_grid._sprites)
+        grid_values[1][0] = 'X'
+        char_grid.color_grid[1][0] = sperling.constants.YELLOW
+        char_grid.refresh()
+
+        self.assertListEqual(char_grid._sprites, sprites)
+        self.assertEqual(char_grid._sprites[2].char, 'X')
+        self.assertEqual(char_grid._sprites[2].color, sperling.constants.YELLOW)
+
+
+class TestGridRenderer(unittest.TestCase):
+    def test_damage_tracking(self):
+        font = pygame.font.SysFont("courier", size=10)
+        char_grid = sperling.view.CharacterGrid(grid=[['B', 'C']], font=font)
+        renderer = sperling.view.GridRenderer(surface=screen, grid=char_grid, pos=(1, 1))
+
+        # first draw covers the whole surface, later draws only report changes
+        self.assertListEqual(renderer.draw(), [screen.get_rect()])
+        self.assertListEqual(renderer.draw(), [])
+
+        renderer.refresh()
+        self.assertListEqual(renderer.draw(), [char_grid.rect])
+
+        renderer.invalidate()
+        self.assertListEqual(renderer.draw(), [screen.get_rect()])
+
+
+class TestGlyphAtlas(unittest.TestCase):
+    def setUp(self):
+        self.font = pygame.font.SysFont("courier", size=20)
+
+    def test_glyphs_rasterized_once(self):
+        atlas = sperling.view.GlyphAtlas(max_size=8)
+
+        glyph = atlas.get(self.font, 'B', sperling.constants.WHITE)
+        self.assertIs(atlas.get(self.font, 'B', sperling.constants.WHITE), glyph)
+        self.assertEqual((atlas.hits, atlas.misses), (1, 1))
+
+        # characters sharing an atlas share glyph surfaces
+        char_grid = sperling.view.CharacterGrid(grid=[['B', 'B']], font=self.font, atlas=atlas)
+        char_grid.update()
+        self.assertEqual(atlas.misses, 1)
+
+    def test_lru_eviction(self):
+        atlas = sperling.view.GlyphAtlas(max_size=2)
+
+        atlas.get(self.font, 'B', sperling.constants.WHITE)
+        atlas.get(self.font, 'C', sperling.constants.WHITE)
+        atlas.get(self.font, 'B', sperling.constants.WHITE)
+        atlas.get(self.font, 'D', sperling.constants.WHITE)
+
+        self.assertEqual(len(atlas), 2)
+        self.assertIn((self.font, 'B', sperling.constants.WHITE), atlas)
+        self.assertNotIn((self.font, 'C', sperling.constants.WHITE), atlas)
+
+    def test_empty_atlas_used(self):
+        # an empty atlas is falsy, but is still used instead of the shared one
+        atlas = sperling.view.GlyphAtlas(max_size=8)
+
+        char = sperling.view.Character('B', (0, 0), self.font, sperling.constants.WHITE, atlas=atlas)
+        self.assertIs(char.atlas, atlas)
+        self.assertIs(sperling.view.CharacterGrid(grid=[['B']], font=self.font, atlas=atlas).atlas, atlas)
+        self.assertEqual(atlas.misses, 1)
+
+    def test_invalid_size(self):
+        with self.assertRaises(ValueError):
+            sperling.view.GlyphAtlas(max_size=0)